@@ -0,0 +1,314 @@
+"""
+ASGI entry point. Job submission, status and history are served by async
+handlers; every other route falls through to the Flask app, mounted
+underneath, so the API is the same as under `flask run`.
+
+    uvicorn asgi:app --app-dir app --host 0.0.0.0 --port 5000
+
+The async handlers answer exactly like their Flask counterparts in
+routes.py. MySQL and Redis round trips are awaited on the event loop;
+validation, upload ingest and the Celery publish (kombu has no asyncio
+producer) run in the thread pool.
+"""
+import functools
+import time
+
+import anyio
+from celery import group
+from sqlalchemy import insert, select
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import FileStorage
+
+from config import Config
+from db.database import async_session, dispose_async_engine
+from db.models import Generation
+from main import create_app
+from routes import (
+    _REJECTED, _STATUS_COLUMNS, _canvas_cost, _check_image_batch, _job_response, _json_params,
+    _prepare_canvas_job, _prepare_image_batch, _prepare_image_job, _prepare_text_batch, _prepare_text_job,
+    _queued_cost, _rejection, _row_state, _text_batch
+)
+from services import events, history, metrics, scheduler, usage
+from services.ingest import UploadRejected
+
+flask_app = create_app()
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+
+def _error(message, status_code):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+def _int_arg(args, name):
+    # Like Flask's request.args.get(name, type=int)
+    try:
+        return int(args[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def _user_id(request, params):
+    user_id = params.get("user_id")
+    request.state.user_id = int(user_id) if user_id not in (None, "") else None
+    return request.state.user_id
+
+
+def _endpoint(rule):
+    """
+    Wrap an async handler with the request timing and usage logging that
+    the Flask app applies to its routes, labelled with the Flask `rule`.
+    Unhandled errors become a 500 with the error message, as in routes.py.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            started = time.perf_counter()
+            try:
+                response = await handler(request)
+            except HTTPException as e:
+                # e.g. Starlette rejecting a malformed multipart body
+                response = _error(e.detail, e.status_code)
+            except Exception as e:
+                response = _error(str(e), 500)
+            metrics.HTTP_SECONDS.labels(rule, request.method, response.status_code).observe(
+                time.perf_counter() - started
+            )
+            user_id = getattr(request.state, "user_id", None)
+            usage.record(
+                user_id if user_id is not None else _int_arg(request.query_params, "user_id"),
+                rule, request.method, request.client.host if request.client else None,
+                request.headers.get("user-agent")
+            )
+            return response
+        return wrapper
+    return decorator
+
+
+async def _in_app(fn, *args):
+    """
+    Run sync route code in the thread pool, inside a Flask app context.
+    """
+    def run():
+        with flask_app.app_context():
+            return fn(*args)
+    return await anyio.to_thread.run_sync(run)
+
+
+async def _admit(request, params, cost):
+    """
+    routes._admit() for the async handlers: raises QuotaExceeded.
+    """
+    user_id = _user_id(request, params)
+    subject = user_id if user_id is not None else f"ip:{request.client.host if request.client else None}"
+    await anyio.to_thread.run_sync(scheduler.admit, subject, cost)
+
+
+def _rejected(e, batch=False):
+    body, status_code, headers = _rejection(e, batch)
+    return JSONResponse(body, status_code=status_code, headers=headers)
+
+
+async def _json(request):
+    # None for a malformed body, like Flask's request.get_json(silent=True)
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def _check_length(request):
+    length = request.headers.get("content-length")
+    try:
+        too_large = length is not None and int(length) > Config.MAX_CONTENT_LENGTH
+    except ValueError:
+        raise UploadRejected("Invalid Content-Length")
+    if too_large:
+        raise UploadRejected(f"Request body is larger than {Config.MAX_CONTENT_LENGTH} bytes", 413)
+
+
+def _file_storage(upload):
+    # The werkzeug interface ingest_upload() reads from
+    return FileStorage(stream=upload.file, filename=upload.filename, content_type=upload.content_type)
+
+
+def _uploaded(form, name):
+    upload = form.get(name)
+    if not isinstance(upload, UploadFile) or not upload.filename:
+        return None
+    return _file_storage(upload)
+
+
+async def _submit(jobs, grouped=False):
+    """
+    Insert the jobs' rows, publish their state and queue the ones that
+    weren't served from cache. Returns the number queued.
+    """
+    rows = [row for row, _ in jobs]
+    async with async_session() as session:
+        await session.execute(insert(Generation), rows)
+        await session.commit()
+    await events.publish_async([_row_state(row) for row in rows])
+    await history.invalidate_async([row.get("user_id") for row in rows])
+
+    signatures = [signature for _, signature in jobs if signature is not None]
+    if signatures:
+        publish = group(signatures).apply_async if grouped else signatures[0].apply_async
+        await anyio.to_thread.run_sync(publish)
+    return len(signatures)
+
+
+# ----------------------------
+# Routes
+# ----------------------------
+
+@_endpoint("/generate/text")
+async def generate_from_text(request):
+    try:
+        params = _json_params(await _json(request))
+        row, signature = await _in_app(_prepare_text_job, params)
+        await _admit(request, params, _queued_cost([(row, signature)]))
+    except _REJECTED as e:
+        return _rejected(e)
+
+    await _submit([(row, signature)])
+    return JSONResponse(_job_response(row, "Text generation started"))
+
+
+@_endpoint("/generate/image")
+async def generate_from_image(request):
+    try:
+        _check_length(request)
+    except UploadRejected as e:
+        return _rejected(e)
+    async with request.form() as form:
+        image = _uploaded(form, "image")
+        if not image:
+            return _error("Image is required", 400)
+
+        try:
+            row, signature = await _in_app(_prepare_image_job, image, form)
+            await _admit(request, form, _queued_cost([(row, signature)]))
+        except _REJECTED as e:
+            return _rejected(e)
+
+    await _submit([(row, signature)])
+    return JSONResponse(_job_response(row, "Image generation started"))
+
+
+@_endpoint("/generate/canvas")
+async def generate_canvas(request):
+    try:
+        _check_length(request)
+    except UploadRejected as e:
+        return _rejected(e)
+    async with request.form() as form:
+        image = _uploaded(form, "image")
+        if not image:
+            return _error("Image is required", 400)
+
+        try:
+            cost = _canvas_cost(form)
+            row, signature = await _in_app(_prepare_canvas_job, image, form)
+            await _admit(request, form, cost)
+        except _REJECTED as e:
+            return _rejected(e)
+
+    await _submit([(row, signature)])
+    return JSONResponse(_job_response(row, "Canvas generation started"))
+
+
+async def _prepare_batch(request):
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        _check_length(request)
+        async with request.form() as form:
+            images = [_file_storage(f) for f in form.getlist("images") if isinstance(f, UploadFile) and f.filename]
+            if images:
+                _check_image_batch(images, form)
+                jobs = await _in_app(_prepare_image_batch, images, form)
+                await _admit(request, form, _queued_cost(jobs))
+                return jobs
+
+    defaults, items = _text_batch(_json_params(await _json(request)))
+    jobs = await _in_app(_prepare_text_batch, items)
+    await _admit(request, defaults, _queued_cost(jobs))
+    return jobs
+
+
+@_endpoint("/generate/batch")
+async def generate_batch(request):
+    try:
+        jobs = await _prepare_batch(request)
+    except _REJECTED as e:
+        return _rejected(e, batch=True)
+
+    if not jobs:
+        return _error("No items to generate", 400)
+
+    queued = await _submit(jobs, grouped=True)
+    rows = [row for row, _ in jobs]
+    return JSONResponse({
+        "jobs": [_job_response(row, "Generation started") for row in rows],
+        "job_ids": [row["id"] for row in rows],
+        "queued": queued,
+        "cached": len(rows) - queued
+    })
+
+
+@_endpoint("/generation/<job_id>/status")
+async def get_generation_status(request):
+    job_id = request.path_params["job_id"]
+    state = await events.get_state_async(job_id)
+    if state is not None:
+        state.pop("step", None)
+        return JSONResponse(state)
+
+    async with async_session() as session:
+        generation = (await session.execute(
+            select(*_STATUS_COLUMNS).where(Generation.id == job_id)
+        )).first()
+    if not generation:
+        return _error("Job not found", 404)
+    # Same fields and date format as the Flask route's jsonify()
+    return JSONResponse(events.job_state(*generation))
+
+
+@_endpoint("/history")
+async def get_history(request):
+    args = request.query_params
+    try:
+        async with async_session() as session:
+            body = await history.fetch_history_async(
+                session,
+                user_id=_int_arg(args, "user_id"),
+                status=args.get("status"),
+                style_type=args.get("style_type"),
+                cursor=args.get("cursor"),
+                limit=_int_arg(args, "limit")
+            )
+    except ValueError as e:
+        return _error(str(e), 400)
+    return Response(body, media_type="application/json")
+
+
+app = Starlette(routes=[
+    Route("/generate/text", generate_from_text, methods=["POST"]),
+    Route("/generate/image", generate_from_image, methods=["POST"]),
+    Route("/generate/canvas", generate_canvas, methods=["POST"]),
+    Route("/generate/batch", generate_batch, methods=["POST"]),
+    Route("/generation/{job_id}/status", get_generation_status, methods=["GET"]),
+    Route("/history", get_history, methods=["GET"]),
+    Mount("/", app=WSGIMiddleware(flask_app)),
+], middleware=[
+    # Flask-CORS's defaults, as applied by main.create_app
+    Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+], on_shutdown=[dispose_async_engine])
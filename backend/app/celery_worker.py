@@ -1,12 +1,54 @@
-from celery import Celery
-from services.generate import generate_from_text
-from main import app
+from celery import Celery, Task
+from celery.signals import worker_init, worker_process_init
+from services.metrics import WORKER_CAPACITY
 
-celery = Celery(__name__)
+# Imported by the worker only. The web process sends tasks by name, so it
+# never loads the pipeline (or, through it, the inference runtime).
+TASK_MODULES = ["services.generate"]
+
+_flask_app = None
+
+
+def flask_app():
+    # Created lazily: main imports routes, which imports the tasks defined here
+    global _flask_app
+    if _flask_app is None:
+        from main import create_app
+        _flask_app = create_app(process_type="worker")
+    return _flask_app
+
+
+class ContextTask(Task):
+    def __call__(self, *args, **kwargs):
+        with flask_app().app_context():
+            return self.run(*args, **kwargs)
+
+
+celery = Celery(__name__, task_cls=ContextTask, include=TASK_MODULES)
 celery.config_from_object('config.Config')
 
-@celery.task()
-def process_text_generation(text, style, resolution):
-    with app.app_context():
-        result = generate_from_text(text, style, resolution)
-        return result
+
+@worker_process_init.connect
+def preload_models(**kwargs):
+    # Each prefork child loads and warms the models once, before taking jobs
+    from models.registry import registry
+    registry.preload()
+
+
+@worker_init.connect
+def preload_models_in_worker(sender=None, **kwargs):
+    # Threads/solo pools run tasks in this process, so there is no child to do it.
+    # Threads are the recommended pool: concurrent jobs then share micro-batches.
+    pool = getattr(sender, "pool_cls", None)
+    if "prefork" not in str(getattr(pool, "__module__", pool)):
+        from models.registry import registry
+        registry.preload()
+
+
+@worker_init.connect
+def start_metrics_server(sender=None, **kwargs):
+    from prometheus_client import start_http_server
+    from config import Config
+
+    WORKER_CAPACITY.set(getattr(sender, "concurrency", 1) or 1)
+    start_http_server(Config.WORKER_METRICS_PORT)
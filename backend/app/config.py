@@ -4,12 +4,186 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (pool_size, max_overflow) per process type. Web handlers hold a connection
+# only briefly; worker threads each hold one for the length of a job.
+DB_POOL_DEFAULTS = {
+    "web": (5, 10),
+    "worker": (8, 2),
+}
+
+
+def engine_options(process_type):
+    pool_size, max_overflow = DB_POOL_DEFAULTS.get(process_type, DB_POOL_DEFAULTS["web"])
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", pool_size)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", max_overflow)),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": True,
+    }
+
+
+def queue_settings(value):
+    # "interactive=30,bulk=600" -> {"interactive": 30.0, "bulk": 600.0}
+    return {name.strip(): float(n) for name, n in (item.split("=") for item in value.split(",") if item)}
+
+
 class Config:
     SQLALCHEMY_DATABASE_URI = (
         f"mysql+pymysql://{os.getenv('MYSQL_USER')}:{os.getenv('MYSQL_PASSWORD')}"
         f"@{os.getenv('MYSQL_HOST')}:{os.getenv('MYSQL_PORT')}/{os.getenv('MYSQL_DB')}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    PROCESS_TYPE = os.getenv("PROCESS_TYPE", "web")  # web or worker
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(PROCESS_TYPE)
+    REDIS_URL = os.getenv("REDIS_URL")
     CELERY_BROKER_URL = os.getenv("REDIS_URL")
     CELERY_RESULT_BACKEND = os.getenv("REDIS_URL")
+    BROKER_URL = os.getenv("REDIS_URL")  # the name Celery reads alongside CELERY_RESULT_BACKEND
     DEBUG = True
+
+    # Models
+    MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(BASE_DIR, "models"))
+    TEXT_MODEL_PATH = os.getenv("TEXT_MODEL_PATH", os.path.join(MODEL_DIR, "ModelPixelArt.keras"))
+    IMAGE_MODEL_PATH = os.getenv("IMAGE_MODEL_PATH", os.path.join(MODEL_DIR, "MB5.keras"))
+    MODEL_INPUT_SHAPE = (1, 32, 32, 3)
+    MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() == "true"
+    MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "false").lower() == "true"
+    # Inference backend per model: keras, tflite or onnx (converted with
+    # convert_models.py), with quantization none, float16 or int8
+    TEXT_MODEL_BACKEND = os.getenv("TEXT_MODEL_BACKEND", "keras")
+    TEXT_MODEL_QUANTIZATION = os.getenv("TEXT_MODEL_QUANTIZATION", "none")
+    IMAGE_MODEL_BACKEND = os.getenv("IMAGE_MODEL_BACKEND", "keras")
+    IMAGE_MODEL_QUANTIZATION = os.getenv("IMAGE_MODEL_QUANTIZATION", "none")
+    MODEL_NUM_THREADS = int(os.getenv("MODEL_NUM_THREADS", 0)) or None  # tflite/onnx; unset = runtime default
+
+    # In-worker micro-batching
+    BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 32))
+    BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 10))
+
+    # Process pools for CPU-bound decode and postprocess work; 0 = inline
+    PIPELINE_DECODE_PROCESSES = int(os.getenv("PIPELINE_DECODE_PROCESSES", 1))
+    PIPELINE_ENCODE_PROCESSES = int(os.getenv("PIPELINE_ENCODE_PROCESSES", os.cpu_count() or 1))
+    PIPELINE_QUEUE_DEPTH = int(os.getenv("PIPELINE_QUEUE_DEPTH", 2))  # pending jobs per process
+
+    # Upload ingestion
+    MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+    MAX_CONTENT_LENGTH = MAX_UPLOAD_BYTES + 64 * 1024  # leave room for form fields
+    MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", 64_000_000))
+
+    # Large-canvas mode: tiled inference over a memory-mapped source
+    CANVAS_MAX_SIDE = int(os.getenv("CANVAS_MAX_SIDE", 4096))  # cells
+    CANVAS_MAX_CELL_SIZE = int(os.getenv("CANVAS_MAX_CELL_SIZE", 16))  # output pixels per cell side
+    CANVAS_TILE_OVERLAP = int(os.getenv("CANVAS_TILE_OVERLAP", 8))  # pixels blended between tiles
+    CANVAS_WORK_DIR = os.getenv("CANVAS_WORK_DIR", "static/canvas-work")
+    CANVAS_PROGRESS_INTERVAL = float(os.getenv("CANVAS_PROGRESS_INTERVAL", 1.0))  # seconds between updates
+
+    # Content-addressed result cache
+    RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "static/cache")
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+    RESULT_CACHE_REDIS_URL = os.getenv("RESULT_CACHE_REDIS_URL")  # unset = disk only
+    RESULT_CACHE_REDIS_TTL = int(os.getenv("RESULT_CACHE_REDIS_TTL", 86400))
+
+    # Palette quantization
+    PALETTE_LUT_BITS = int(os.getenv("PALETTE_LUT_BITS", 5))
+    PALETTE_DITHER = os.getenv("PALETTE_DITHER", "none")  # none, ordered, floyd-steinberg
+
+    # Style presets and palettes from the database: cached per process,
+    # usage_count written in batches
+    PRESET_CACHE_TTL = float(os.getenv("PRESET_CACHE_TTL", 300))
+    PRESET_CACHE_MAX_ENTRIES = int(os.getenv("PRESET_CACHE_MAX_ENTRIES", 1024))
+    PRESET_USAGE_FLUSH_SECONDS = float(os.getenv("PRESET_USAGE_FLUSH_SECONDS", 10))
+
+    # Output deliverables
+    OUTPUT_SIZES = tuple(int(s) for s in os.getenv("OUTPUT_SIZES", "16,32,64,128").split(","))
+    PREVIEW_SIZE = int(os.getenv("PREVIEW_SIZE", 512))
+
+    # Job progress events (Redis pub/sub + last-known state)
+    JOB_STATE_TTL = int(os.getenv("JOB_STATE_TTL", 86400))
+
+    # Metrics
+    CELERY_QUEUE_NAMES = ("interactive", "bulk")
+    WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", 9100))
+
+    # Export artifacts
+    EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", "static/exports")
+    EXPORT_MAX_SCALE = int(os.getenv("EXPORT_MAX_SCALE", 32))
+    EXPORT_GIF_FRAME_MS = int(os.getenv("EXPORT_GIF_FRAME_MS", 200))
+    EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+    # Larger exports are png/spritesheet only, streamed to disk a row at a time
+    EXPORT_MAX_MEMORY_PIXELS = int(os.getenv("EXPORT_MAX_MEMORY_PIXELS", 2048 * 2048))
+
+    # Generation history
+    HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 200))
+    HISTORY_CACHE_TTL = int(os.getenv("HISTORY_CACHE_TTL", 30))
+
+    # Text conditioning and the prompt embedding cache
+    TEXT_ENCODER = os.getenv("TEXT_ENCODER", "hashing")  # or a Hugging Face model name
+    EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", 256))  # hashing encoder only
+    EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "static/embeddings")
+    EMBEDDING_SIMILARITY = float(os.getenv("EMBEDDING_SIMILARITY", 0.8))  # min cosine for similar prompts
+    SIMILAR_MAX_GENERATIONS = int(os.getenv("SIMILAR_MAX_GENERATIONS", 10))  # newest, per similar prompt
+    TEXT_CONDITIONING_NOISE = float(os.getenv("TEXT_CONDITIONING_NOISE", 0.25))
+
+    # Object storage for uploads and outputs
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")  # local or s3
+    STORAGE_ROOT = os.getenv("STORAGE_ROOT", "static/storage")  # local backend
+    STORAGE_BASE_URL = os.getenv("STORAGE_BASE_URL", "/files")
+    STORAGE_LOCAL_CACHE_DIR = os.getenv("STORAGE_LOCAL_CACHE_DIR", "static/storage-cache")  # s3 read-through
+    STORAGE_LOCAL_CACHE_MAX_BYTES = int(os.getenv("STORAGE_LOCAL_CACHE_MAX_BYTES", 5 * 1024 * 1024 * 1024))
+    STORAGE_UPLOAD_THREADS = int(os.getenv("STORAGE_UPLOAD_THREADS", 8))
+    S3_BUCKET = os.getenv("S3_BUCKET", "pixelart")
+    S3_PREFIX = os.getenv("S3_PREFIX", "")
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://minio:9000
+    S3_REGION = os.getenv("S3_REGION")
+    S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL")  # unset = presigned URLs
+    S3_URL_TTL = int(os.getenv("S3_URL_TTL", 3600))
+
+    # API usage logging: buffered in-process, flushed in bulk by a background thread
+    USAGE_LOG_ENABLED = os.getenv("USAGE_LOG_ENABLED", "true").lower() == "true"
+    USAGE_SINK = os.getenv("USAGE_SINK", "db")  # db, or redis for usage_consumer.py
+    USAGE_BUFFER_SIZE = int(os.getenv("USAGE_BUFFER_SIZE", 10000))  # events; more are dropped
+    USAGE_FLUSH_SIZE = int(os.getenv("USAGE_FLUSH_SIZE", 500))
+    USAGE_FLUSH_MS = float(os.getenv("USAGE_FLUSH_MS", 1000))
+    USAGE_REDIS_KEY = "pixelart:usage-events"
+    USAGE_REDIS_MAX_LEN = int(os.getenv("USAGE_REDIS_MAX_LEN", 1_000_000))
+    USAGE_EXCLUDE = ("/metrics", "/files/<path:key>")
+
+    # Scheduling: interactive and bulk queues, per-user token buckets, fair share
+    INTERACTIVE_QUEUE = "interactive"
+    BULK_QUEUE = "bulk"
+    MAX_BATCH_COUNT = int(os.getenv("MAX_BATCH_COUNT", 10))  # images per job
+    INTERACTIVE_MAX_BATCH = int(os.getenv("INTERACTIVE_MAX_BATCH", 4))
+    INTERACTIVE_MAX_PIXELS = int(os.getenv("INTERACTIVE_MAX_PIXELS", 64 * 64))
+    USER_BURST = int(os.getenv("USER_BURST", 64))  # images
+    USER_RATE_PER_MINUTE = float(os.getenv("USER_RATE_PER_MINUTE", 120))
+    FAIR_SHARE_WINDOW = int(os.getenv("FAIR_SHARE_WINDOW", 3600))
+    FAIR_SHARE_STEP = int(os.getenv("FAIR_SHARE_STEP", 500))  # requests per priority step
+    FAIR_SHARE_MAX_DEMOTION = int(os.getenv("FAIR_SHARE_MAX_DEMOTION", 3))
+    CELERY_DEFAULT_QUEUE = INTERACTIVE_QUEUE
+    # Jobs are long and CPU-bound: take one at a time and ack when done, so a
+    # busy worker never sits on queued jobs another worker could start
+    CELERYD_PREFETCH_MULTIPLIER = 1
+    CELERY_ACKS_LATE = True
+    BROKER_TRANSPORT_OPTIONS = {
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",  # drain queues in the order given to -Q
+        "visibility_timeout": 3600,
+    }
+
+    # Admission control: a queue's expected wait is its depth x the mean
+    # processing time of its recent jobs / the worker slots serving it.
+    # Past the SLO new jobs are degraded (degrade mode) or refused with 429;
+    # past SLO x ADMISSION_SHED_FACTOR they are refused in either mode.
+    ADMISSION_MODE = os.getenv("ADMISSION_MODE", "degrade")  # degrade, reject or off
+    ADMISSION_SLO_SECONDS = queue_settings(os.getenv("ADMISSION_SLO_SECONDS", "interactive=30,bulk=900"))
+    ADMISSION_SHED_FACTOR = float(os.getenv("ADMISSION_SHED_FACTOR", 2))
+    ADMISSION_WORKER_SLOTS = queue_settings(os.getenv("ADMISSION_WORKER_SLOTS", "interactive=12,bulk=4"))
+    ADMISSION_SAMPLES = int(os.getenv("ADMISSION_SAMPLES", 100))  # recent processing times kept per queue
+    ADMISSION_DEFAULT_JOB_SECONDS = float(os.getenv("ADMISSION_DEFAULT_JOB_SECONDS", 2))  # before any samples
+    ADMISSION_REFRESH_SECONDS = float(os.getenv("ADMISSION_REFRESH_SECONDS", 1))
+    ADMISSION_DEGRADED_MAX_BATCH = int(os.getenv("ADMISSION_DEGRADED_MAX_BATCH", 1))
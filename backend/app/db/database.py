@@ -21,3 +21,51 @@ def init_db(app):
 
     with app.app_context():
         db.create_all()
+
+
+# ----------------------------
+# Async access (ASGI front end)
+# ----------------------------
+
+_ASYNC_DRIVERS = {"mysql+pymysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
+
+_async_engine = None
+_async_sessionmaker = None
+
+
+def async_database_uri(uri):
+    """
+    The asyncio-driver equivalent of a SQLALCHEMY_DATABASE_URI.
+    """
+    scheme, sep, rest = uri.partition("://")
+    if scheme not in _ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {scheme} databases")
+    return _ASYNC_DRIVERS[scheme] + sep + rest
+
+
+def async_session():
+    """
+    A new AsyncSession on the same database as `db`, with its own
+    connection pool sized like the web tier's. Use as `async with`.
+    """
+    global _async_engine, _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+        from config import Config, engine_options
+
+        # Pooled for SQLite files too, where SQLAlchemy defaults to a connection per session
+        _async_engine = create_async_engine(async_database_uri(Config.SQLALCHEMY_DATABASE_URI),
+                                            poolclass=AsyncAdaptedQueuePool, **engine_options("web"))
+        _async_sessionmaker = async_sessionmaker(_async_engine, expire_on_commit=False)
+    return _async_sessionmaker()
+
+
+async def dispose_async_engine():
+    """
+    Close the async pool's connections; the server calls this on shutdown.
+    """
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_sessionmaker = None
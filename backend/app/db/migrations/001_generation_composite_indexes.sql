@@ -0,0 +1,13 @@
+-- Composite indexes for the generations access patterns:
+--   history by user, newest first:   WHERE user_id = ? ORDER BY created_at DESC, id DESC
+--   status sweeps, oldest first:     WHERE status = ?  ORDER BY created_at
+-- InnoDB appends the primary key (id) to every secondary index, so the
+-- history index also covers its id tiebreak.
+-- New databases get these from db.create_all(); run this on existing ones.
+
+CREATE INDEX ix_generations_user_id_created_at ON generations (user_id, created_at);
+CREATE INDEX ix_generations_status_created_at ON generations (status, created_at);
+
+-- Rollback:
+-- DROP INDEX ix_generations_user_id_created_at ON generations;
+-- DROP INDEX ix_generations_status_created_at ON generations;
@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, Text, DateTime, Boolean, Float, JSON, ForeignKey
+    Column, Integer, String, Text, DateTime, Boolean, Float, JSON, ForeignKey, Index
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -38,6 +38,13 @@ class User(Base):
 
 class Generation(Base):
     __tablename__ = "generations"
+    __table_args__ = (
+        # Same columns, in the same order, as db/migrations/001_generation_composite_indexes.sql:
+        #   history by user, newest first:   WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        #   status sweeps, oldest first:     WHERE status = ?  ORDER BY created_at
+        Index("ix_generations_user_id_created_at", "user_id", "created_at"),
+        Index("ix_generations_status_created_at", "status", "created_at"),
+    )
 
     id = Column(String(36), primary_key=True, index=True)  # UUID
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -1,18 +1,52 @@
 from flask import Flask
-from routes import main  # ✅ This must match the filename (routes.py)
 
-def create_app():
+from services.startup import StartupReport
+
+
+def create_app(process_type=None):
     app = Flask(__name__)
 
     # DB setup here if needed
     app.config.from_object("config.Config")
+    if process_type:
+        from config import engine_options
+        app.config["PROCESS_TYPE"] = process_type
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(process_type)
+    startup = StartupReport(app.config["PROCESS_TYPE"])
+
+    with startup.phase("db"):
+        from db.database import db
+        db.init_app(app)
+        from services import presets  # noqa: F401 (publishes preset/palette changes on commit)
 
-    from db.database import db
-    db.init_app(app)
+    # Configures the Celery app that the routes' apply_async calls publish to
+    with startup.phase("celery"):
+        import celery_worker  # noqa: F401
 
     # Register blueprint
-    app.register_blueprint(main)  # ✅ Register routes from routes.py
+    with startup.phase("routes"):
+        from routes import main  # ✅ This must match the filename (routes.py)
+        app.register_blueprint(main)  # ✅ Register routes from routes.py
+        # Flask-CORS's defaults; asgi.py applies the same policy
+        from flask_cors import CORS
+        CORS(app)
+
+    with startup.phase("metrics"):
+        from services import metrics
+        metrics.init_app(app)
+
+    with startup.phase("usage"):
+        from services import usage
+        usage.init_app(app)
+
+    # Warm the shared model registry at boot instead of on the first request.
+    # Never in the web tier: it only enqueues jobs and must not load the runtimes.
+    if app.config.get("MODEL_PRELOAD") and app.config["PROCESS_TYPE"] != "web":
+        with startup.phase("models"):
+            from models.registry import registry
+            registry.preload()
 
+    app.config["STARTUP_REPORT"] = startup.finish()
     return app
 
 
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from models import runtime
+
+
+def _rss_bytes() -> int:
+    """
+    Current resident set size of this process, or 0 if it can't be read.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of the models.
+
+    Each model is deserialized once per process (Flask app or Celery worker),
+    then warmed up with a dummy predict so graph tracing happens at boot
+    instead of on the first real job. `backends` picks, per model, a
+    (backend, quantization) pair from models.runtime; models without an
+    entry run through Keras.
+    """
+
+    def __init__(self, paths: Dict[str, str], input_shape=Config.MODEL_INPUT_SHAPE,
+                 warmup: bool = Config.MODEL_WARMUP,
+                 backends: Optional[Dict[str, Tuple[str, str]]] = None,
+                 num_threads: Optional[int] = None):
+        self._paths = dict(paths)
+        self._backends = dict(backends or {})
+        self._num_threads = num_threads
+        self._input_shape = tuple(input_shape)
+        self._warmup = warmup
+        self._models: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = self._load(name)
+            return self._models[name]
+
+    def preload(self, names: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        for name in names or self._paths:
+            self.get(name)
+        return self.stats()
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def source_path(self, name: str) -> str:
+        if name not in self._paths:
+            raise KeyError(f"Unknown model: {name}")
+        return self._paths[name]
+
+    def backend(self, name: str) -> Tuple[str, str]:
+        return self._backends.get(name, ("keras", "none"))
+
+    def path(self, name: str) -> str:
+        # The artifact actually loaded: the .keras file or its converted variant
+        return runtime.artifact_path(self.source_path(name), *self.backend(name))
+
+    def version(self, name: str) -> str:
+        # Recorded on Generation.model_version and part of the result cache key,
+        # so each backend/quantization variant caches its own outputs
+        return os.path.basename(self.path(name))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def _load(self, name: str):
+        path = self.path(name)
+        backend, quantization = self.backend(name)
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        try:
+            model = runtime.load(path, backend, self._num_threads)
+        except Exception as e:
+            print(f"Failed to load {name} model:", e)
+            raise
+        load_time = time.perf_counter() - started
+
+        warmup_time = None
+        if self._warmup:
+            started = time.perf_counter()
+            model.predict(np.zeros(self._input_shape, dtype=np.float32), verbose=0)
+            warmup_time = time.perf_counter() - started
+
+        self._stats[name] = {
+            "path": path,
+            "backend": backend,
+            "quantization": quantization,
+            "load_time": load_time,
+            "warmup_time": warmup_time,
+            # Converted artifacts are essentially their (possibly quantized) weights
+            "param_bytes": int(model.count_params()) * 4 if backend == "keras" else os.path.getsize(path),
+            "rss_delta_bytes": max(_rss_bytes() - rss_before, 0),
+        }
+        print(
+            f"Loaded {name} model ({backend}, {quantization}) in {load_time:.2f}s "
+            f"(warm-up {warmup_time or 0:.2f}s, "
+            f"~{self._stats[name]['rss_delta_bytes'] / 2**20:.1f} MiB)"
+        )
+        return model
+
+
+registry = ModelRegistry(
+    {
+        "text": Config.TEXT_MODEL_PATH,
+        "image": Config.IMAGE_MODEL_PATH,
+    },
+    backends={
+        "text": (Config.TEXT_MODEL_BACKEND, Config.TEXT_MODEL_QUANTIZATION),
+        "image": (Config.IMAGE_MODEL_BACKEND, Config.IMAGE_MODEL_QUANTIZATION),
+    },
+    num_threads=Config.MODEL_NUM_THREADS,
+)
@@ -0,0 +1,103 @@
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+BACKENDS = ("keras", "tflite", "onnx")
+QUANTIZATIONS = ("none", "float16", "int8")
+
+_EXTENSIONS = {"tflite": "tflite", "onnx": "onnx"}
+
+
+def artifact_path(source_path: str, backend: str, quantization: str = "none") -> str:
+    """
+    Where the converted variant of a .keras model lives, next to it:
+    MB5.keras -> MB5.tflite, MB5.int8.tflite, MB5.float16.onnx, ...
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend: {backend}, expected one of {', '.join(BACKENDS)}")
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization}, expected one of {', '.join(QUANTIZATIONS)}")
+    if backend == "keras":
+        return source_path
+
+    stem = os.path.splitext(source_path)[0]
+    suffix = "" if quantization == "none" else f".{quantization}"
+    return f"{stem}{suffix}.{_EXTENSIONS[backend]}"
+
+
+class TFLiteModel:
+    """
+    A .tflite model behind the Keras `predict` interface. Uses the
+    standalone LiteRT / tflite_runtime interpreter when installed, so the
+    process never has to import TensorFlow.
+    """
+
+    def __init__(self, path: str, num_threads: Optional[int] = None):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+
+                Interpreter = tf.lite.Interpreter
+
+        self._interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        # One interpreter holds one set of tensors, so calls are serialized
+        self._lock = threading.Lock()
+
+    def predict(self, inputs, verbose=0) -> np.ndarray:
+        inputs = np.ascontiguousarray(inputs, dtype=self._input["dtype"])
+        with self._lock:
+            if len(inputs) != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input["index"], inputs.shape)
+                self._interpreter.allocate_tensors()
+                self._batch_size = len(inputs)
+            self._interpreter.set_tensor(self._input["index"], inputs)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output["index"]).astype(np.float32, copy=True)
+
+
+class OnnxModel:
+    """
+    An .onnx model run by ONNX Runtime on CPU, behind the Keras `predict`
+    interface.
+    """
+
+    def __init__(self, path: str, num_threads: Optional[int] = None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._input = self._session.get_inputs()[0].name
+
+    def predict(self, inputs, verbose=0) -> np.ndarray:
+        outputs = self._session.run(None, {self._input: np.ascontiguousarray(inputs, dtype=np.float32)})
+        return outputs[0].astype(np.float32, copy=False)
+
+
+def load(path: str, backend: str, num_threads: Optional[int] = None):
+    """
+    Load a model artifact with the given backend. Every backend returns an
+    object with `predict(inputs, verbose=0)`.
+    """
+    if backend == "keras":
+        from tensorflow.keras.models import load_model
+
+        return load_model(path, compile=False)
+    if backend == "tflite":
+        return TFLiteModel(path, num_threads)
+    if backend == "onnx":
+        return OnnxModel(path, num_threads)
+    raise ValueError(f"Unknown model backend: {backend}, expected one of {', '.join(BACKENDS)}")
@@ -1,51 +1,310 @@
-from flask import Blueprint, request, jsonify
-from werkzeug.utils import secure_filename
+from flask import Blueprint, Response, abort, g, redirect, request, jsonify, send_file, stream_with_context
+from celery import group
 from datetime import datetime
-import os
+from sqlalchemy import insert, select
+import time
 import uuid
 
+from config import Config
 from db.database import db
 from db.models import Generation
-from services.generate import generate_pixel_art_task, generate_from_image_task
+from models.registry import registry
+from services import admission, events, history, metrics, scheduler
+from services.cache import content_digest, result_cache, result_key
+from services.canvas import parse_canvas_size
+from services.conditioning import normalize_prompt, similar_prompts
+from services.exporter import EXPORT_FORMATS, export_generation
+from services.ingest import UploadRejected, ingest_upload
+from services.pixelize import parse_resolution, resolution_label
+from services.storage import get_storage, public_url
+from celery_worker import celery
 
 main = Blueprint("main", __name__)
 
 UPLOAD_FOLDER = "static/uploads"
+BATCH_MAX_ITEMS = 500
+
+
+# Only what the status endpoints return; skips the output_images/generation_config JSON blobs
+_STATUS_COLUMNS = (
+    Generation.id,
+    Generation.status,
+    Generation.progress,
+    Generation.output_image_url,
+    Generation.error_message,
+    Generation.created_at,
+    Generation.completed_at,
+)
+
+
+def _cached_result(resolution, model_name, cache_key):
+    """
+    Column values that complete a new Generation straight from the result
+    cache, or None on a miss (the caller then queues the job).
+    """
+    keys = result_cache.get(cache_key)
+    if keys is None:
+        return None
+    return _completed(resolution, keys, registry.version(model_name))
+
+
+def _completed(resolution, keys, model_version, processing_time=0.0):
+    now = datetime.utcnow()
+    return {
+        "status": "completed",
+        "progress": 1.0,
+        "output_image_url": public_url(keys[resolution_label(parse_resolution(resolution))][0]),
+        "output_images": keys,
+        "model_version": model_version,
+        "processing_time": processing_time,
+        "started_at": now,
+        "completed_at": now,
+    }
+
+
+def _batch_count(params):
+    """
+    The request's batch_count, 1 to MAX_BATCH_COUNT; ValueError otherwise.
+    """
+    try:
+        batch_count = int(params.get("batch_count", 1))
+    except (TypeError, ValueError):
+        raise ValueError("batch_count must be an integer")
+    if not 1 <= batch_count <= Config.MAX_BATCH_COUNT:
+        raise ValueError(f"batch_count must be between 1 and {Config.MAX_BATCH_COUNT}")
+    return batch_count
+
+
+def _user_id(params):
+    user_id = params.get("user_id")
+    user_id = int(user_id) if user_id not in (None, "") else None
+    g.user_id = user_id  # attributes the request in the usage log
+    return user_id
+
+
+def _admit(params, cost):
+    """
+    Charge `cost` images to the caller's token bucket; raises
+    QuotaExceeded when over quota. Called once the request's jobs are
+    prepared, so only what actually gets queued is charged.
+    """
+    user_id = _user_id(params)
+    scheduler.admit(user_id if user_id is not None else f"ip:{request.remote_addr}", cost)
+
+
+# Raised while validating and admitting a submission; answered by _rejection()
+_REJECTED = (scheduler.QuotaExceeded, ValueError, KeyError)
+
+
+def _rejection(e, batch=False):
+    """
+    (body, status code, headers) answering an error in _REJECTED, for
+    these routes and the handlers in asgi.py alike.
+    """
+    if isinstance(e, scheduler.QuotaExceeded):
+        # Over the caller's quota, or admission control found the queue backed up
+        return {"error": str(e), "retry_after": e.retry_after}, 429, {"Retry-After": str(e.retry_after)}
+    if isinstance(e, UploadRejected):
+        return {"error": str(e)}, e.status_code, {}
+    # A KeyError is a required field missing from the JSON body or form
+    message = f"Missing field: {e.args[0]}" if isinstance(e, KeyError) else str(e)
+    if batch and not isinstance(e, scheduler.RequestTooLarge):
+        return {"error": f"Invalid batch item: {message}"}, 400, {}
+    return {"error": message}, 400, {}
+
+
+def _rejected(e, batch=False):
+    body, status_code, headers = _rejection(e, batch)
+    return jsonify(body), status_code, headers
+
+
+def _json_params(data):
+    # Both front ends hand over None for a missing or malformed JSON body
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    return data
+
+
+def _text_cache_key(params, batch_count):
+    # Keyed on the normalized prompt, which is all the text model sees
+    return result_key(
+        content_digest(normalize_prompt(params["text"]).encode("utf-8")), params["style"], params["resolution"],
+        params["color_palette"], batch_count, registry.version("text")
+    )
+
+
+def _prepare_text_job(params, bulk=False):
+    """
+    Validate one text request and build its Generation row.
+    Returns (row, signature); signature is None when served from cache.
+    """
+    parse_resolution(params["resolution"])
+    batch_count = _batch_count(params)
+    user_id = _user_id(params)
+    placement = scheduler.place(user_id, params["resolution"], batch_count, params.get("priority"), bulk)
+
+    job_id = str(uuid.uuid4())
+    row = {
+        "id": job_id,
+        "user_id": user_id,
+        "input_text": params["text"],
+        "style_type": params["style"],
+        "resolution": params["resolution"],
+        "color_palette": params["color_palette"],
+        "batch_count": batch_count,
+        "generation_config": placement._asdict(),
+        "status": "pending",
+        "created_at": datetime.utcnow(),
+    }
+
+    cache_key = _text_cache_key(params, batch_count)
+    cached = _cached_result(params["resolution"], "text", cache_key)
+    if cached:
+        row.update(cached)
+        return row, None
+
+    # Batch items were admitted as a whole by the handler. Text has no cheaper
+    # path than the model, so a degraded job makes fewer images; one that
+    # is already that small is refused past the SLO like any other
+    can_degrade = batch_count > Config.ADMISSION_DEGRADED_MAX_BATCH
+    if not bulk and admission.check(placement.queue, can_degrade=can_degrade):
+        degraded = {"requested_batch_count": batch_count}
+        row["batch_count"] = batch_count = Config.ADMISSION_DEGRADED_MAX_BATCH
+        placement = scheduler.place(user_id, params["resolution"], batch_count, params.get("priority"), bulk)
+        row["generation_config"] = {**placement._asdict(), "degraded": degraded}
+        cache_key = _text_cache_key(params, batch_count)
+        admission.degraded()
+    row["generation_config"]["estimated_start_at"] = admission.estimated_start(placement.queue)
+
+    signature = celery.signature(
+        "generate_pixel_art_task",
+        args=[
+            params["text"],
+            params["style"],
+            params["resolution"],
+            params["color_palette"],
+            batch_count,
+            job_id
+        ],
+        kwargs={"cache_key": cache_key},
+        task_id=job_id,
+        queue=placement.queue,
+        priority=placement.priority
+    )
+    return row, signature
+
+
+def _prepare_image_job(image, params, bulk=False):
+    """
+    Validate and ingest one uploaded image and build its Generation row.
+    Returns (row, signature); signature is None when served from cache.
+    """
+    style = params.get("style", "8bit")
+    resolution = params.get("resolution", "32x32")
+    color_palette = params.get("color_palette", "classic")
+    batch_count = _batch_count(params)
+    parse_resolution(resolution)
+    user_id = _user_id(params)
+    placement = scheduler.place(user_id, resolution, batch_count, params.get("priority"), bulk)
+    # Before the upload is stored, so a refused job costs nothing. Batch
+    # items were admitted as a whole by the handler
+    degrade = not bulk and admission.check(placement.queue, can_degrade=True)
+
+    job_id = str(uuid.uuid4())
+    input_key, array_key, digest = ingest_upload(image, UPLOAD_FOLDER, job_id)
+    row = {
+        "id": job_id,
+        "user_id": user_id,
+        "input_image_url": public_url(input_key),
+        "style_type": style,
+        "resolution": resolution,
+        "color_palette": color_palette,
+        "batch_count": batch_count,
+        "generation_config": placement._asdict(),
+        "status": "pending",
+        "created_at": datetime.utcnow(),
+    }
+
+    cache_key = result_key(
+        digest, style, resolution, color_palette, batch_count, registry.version("image")
+    )
+    cached = _cached_result(resolution, "image", cache_key)
+    if cached:
+        row.update(cached)
+        return row, None
+
+    if degrade:
+        # Pixelize the upload without the model and answer right away
+        degraded = {"fallback": "pixelize"}
+        if batch_count > Config.ADMISSION_DEGRADED_MAX_BATCH:
+            degraded["requested_batch_count"] = batch_count
+            row["batch_count"] = batch_count = Config.ADMISSION_DEGRADED_MAX_BATCH
+        started = time.perf_counter()
+        _, keys = admission.pixelize_fallback(array_key, resolution, color_palette, batch_count)
+        row.update(_completed(resolution, keys, "pixelize", time.perf_counter() - started))
+        row["generation_config"]["degraded"] = degraded
+        admission.degraded()
+        return row, None
+    row["generation_config"]["estimated_start_at"] = admission.estimated_start(placement.queue)
+
+    signature = celery.signature(
+        "generate_from_image_task",
+        args=[input_key, style, resolution, color_palette, batch_count, job_id],
+        kwargs={"cache_key": cache_key, "array_key": array_key},
+        task_id=job_id,
+        queue=placement.queue,
+        priority=placement.priority
+    )
+    return row, signature
+
+
+def _row_state(row):
+    return events.job_state(
+        row["id"], row["status"], row.get("progress"), row.get("output_image_url"),
+        created_at=row["created_at"], completed_at=row.get("completed_at"),
+        estimated_start_at=row["generation_config"].get("estimated_start_at")
+    )
+
+
+def _job_response(row, message):
+    if row["status"] == "completed":
+        degraded = row["generation_config"].get("degraded")
+        if degraded:
+            return {
+                "job_id": row["id"],
+                "status": "completed",
+                "result_url": row["output_image_url"],
+                "message": "Queue is backed up, pixelized without the model",
+                "degraded": degraded
+            }
+        return {
+            "job_id": row["id"],
+            "status": "completed",
+            "result_url": row["output_image_url"],
+            "message": "Served from cache"
+        }
+    return {"job_id": row["id"], "status": "pending", "message": message, **row["generation_config"]}
 
 
 @main.route("/generate/text", methods=["POST"])
 def generate_from_text():
     try:
-        data = request.get_json()
-
-        job_id = str(uuid.uuid4())
-        generation = Generation(
-            id=job_id,
-            input_text=data["text"],
-            style_type=data["style"],
-            resolution=data["resolution"],
-            color_palette=data["color_palette"],
-            batch_count=data.get("batch_count", 1),
-            status="pending",
-            created_at=datetime.utcnow()
-        )
+        try:
+            params = _json_params(request.get_json(silent=True))
+            row, signature = _prepare_text_job(params)
+            _admit(params, _queued_cost([(row, signature)]))
+        except _REJECTED as e:
+            return _rejected(e)
 
-        db.session.add(generation)
+        db.session.add(Generation(**row))
         db.session.commit()
+        events.publish([_row_state(row)])
+        history.invalidate([row.get("user_id")])
 
-        generate_pixel_art_task.apply_async(
-            args=[
-                data["text"],
-                data["style"],
-                data["resolution"],
-                data["color_palette"],
-                data.get("batch_count", 1),
-                job_id
-            ],
-            task_id=job_id
-        )
+        if signature is not None:
+            signature.apply_async()
 
-        return jsonify({"job_id": job_id, "status": "pending", "message": "Text generation started"})
+        return jsonify(_job_response(row, "Text generation started"))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -54,40 +313,237 @@ def generate_from_text():
 def generate_from_image():
     try:
         image = request.files.get("image")
-        style = request.form.get("style", "8bit")
-        resolution = request.form.get("resolution", "32x32")
-        color_palette = request.form.get("color_palette", "classic")
-        batch_count = int(request.form.get("batch_count", 1))
+        if not image:
+            return jsonify({"error": "Image is required"}), 400
+
+        try:
+            row, signature = _prepare_image_job(image, request.form)
+            _admit(request.form, _queued_cost([(row, signature)]))
+        except _REJECTED as e:
+            return _rejected(e)
+
+        db.session.add(Generation(**row))
+        db.session.commit()
+        events.publish([_row_state(row)])
+        history.invalidate([row.get("user_id")])
 
+        if signature is not None:
+            signature.apply_async()
+
+        return jsonify(_job_response(row, "Image generation started"))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _canvas_params(params):
+    width, height = parse_canvas_size(params.get("width", 256), params.get("height", 256))
+    cell_size = int(params.get("cell_size", 1))
+    if not 1 <= cell_size <= Config.CANVAS_MAX_CELL_SIZE:
+        raise ValueError(f"cell_size must be between 1 and {Config.CANVAS_MAX_CELL_SIZE}")
+    return width, height, cell_size
+
+
+def _canvas_cost(params):
+    """
+    Validate a canvas request and return its quota cost: one model tile
+    per image, capped so a canvas can always be admitted.
+    """
+    width, height, _ = _canvas_params(params)
+    _, tile, _, _ = Config.MODEL_INPUT_SHAPE
+    return min(-(-width * height // (tile * tile)), Config.USER_BURST)
+
+
+def _prepare_canvas_job(image, params):
+    """
+    Validate and ingest one canvas upload and build its Generation row.
+    Returns (row, signature); canvases are never served from cache.
+    """
+    width, height, cell_size = _canvas_params(params)
+    user_id = _user_id(params)
+    placement = scheduler.place(user_id, f"{width}x{height}", 1, params.get("priority"), bulk=True)
+    admission.check(placement.queue)
+
+    job_id = str(uuid.uuid4())
+    input_key, _, _ = ingest_upload(image, UPLOAD_FOLDER, job_id)
+    style = params.get("style", "8bit")
+    color_palette = params.get("color_palette", "classic")
+    row = {
+        "id": job_id,
+        "user_id": user_id,
+        "input_image_url": public_url(input_key),
+        "style_type": style,
+        "resolution": f"{width}x{height}",
+        "color_palette": color_palette,
+        "batch_count": 1,
+        "generation_config": {
+            **placement._asdict(),
+            "canvas": {"cell_size": cell_size},
+            "estimated_start_at": admission.estimated_start(placement.queue),
+        },
+        "status": "pending",
+        "created_at": datetime.utcnow(),
+    }
+    signature = celery.signature(
+        "generate_canvas_task",
+        args=[input_key, style, width, height, color_palette, cell_size, job_id],
+        task_id=job_id,
+        queue=placement.queue,
+        priority=placement.priority
+    )
+    return row, signature
+
+
+@main.route("/generate/canvas", methods=["POST"])
+def generate_canvas():
+    """
+    Pixelize a full-size image into a large canvas: `width` x `height`
+    cells, each `cell_size` output pixels wide. The model runs over
+    overlapping tiles, so this always goes to the bulk queue and reports
+    progress as tiles complete.
+    """
+    try:
+        image = request.files.get("image")
         if not image:
             return jsonify({"error": "Image is required"}), 400
 
-        job_id = str(uuid.uuid4())
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        filename = secure_filename(f"{job_id}_{image.filename}")
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        image.save(filepath)
-
-        generation = Generation(
-            id=job_id,
-            input_image_url=filepath,
-            style_type=style,
-            resolution=resolution,
-            color_palette=color_palette,
-            batch_count=batch_count,
-            status="pending",
-            created_at=datetime.utcnow()
-        )
+        try:
+            cost = _canvas_cost(request.form)
+            row, signature = _prepare_canvas_job(image, request.form)
+            _admit(request.form, cost)
+        except _REJECTED as e:
+            return _rejected(e)
 
-        db.session.add(generation)
+        db.session.add(Generation(**row))
         db.session.commit()
+        events.publish([_row_state(row)])
+        history.invalidate([row.get("user_id")])
 
-        generate_from_image_task.apply_async(
-            args=[filepath, style, resolution, color_palette, batch_count, job_id],
-            task_id=job_id
+        signature.apply_async()
+        return jsonify(_job_response(row, "Canvas generation started"))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _check_batch_size(count):
+    if count > BATCH_MAX_ITEMS:
+        raise UploadRejected(f"At most {BATCH_MAX_ITEMS} items per batch")
+
+
+def _text_batch(data):
+    """
+    Validate a JSON batch. Returns (top-level defaults, items with the
+    defaults applied).
+    """
+    items = data.get("items") or []
+    _check_batch_size(len(items))
+    defaults = {k: v for k, v in data.items() if k != "items"}
+    items = [{**defaults, **item} for item in items]
+    scheduler.check_cost(sum(_batch_count(item) for item in items))
+    return defaults, items
+
+
+def _check_image_batch(images, params):
+    _check_batch_size(len(images))
+    scheduler.check_cost(len(images) * _batch_count(params))
+
+
+def _queued_cost(jobs):
+    # Cache hits and pixelize fallbacks complete right away and cost nothing
+    return sum(row["batch_count"] for row, signature in jobs if signature is not None)
+
+
+# Batch items are admitted as a whole, before any of them is prepared
+
+def _prepare_text_batch(items):
+    admission.check(Config.BULK_QUEUE)
+    return [_prepare_text_job(item, bulk=True) for item in items]
+
+
+def _prepare_image_batch(images, params):
+    admission.check(Config.BULK_QUEUE)
+    return [_prepare_image_job(image, params, bulk=True) for image in images]
+
+
+@main.route("/generate/batch", methods=["POST"])
+def generate_batch():
+    """
+    Submit many text prompts (JSON `items`, each overriding top-level
+    defaults) or many images (multipart `images`, sharing the form params)
+    in one request: one bulk INSERT, one commit and one group publish.
+    Batch jobs always go to the bulk queue.
+    """
+    try:
+        try:
+            if request.files:
+                images = request.files.getlist("images")
+                _check_image_batch(images, request.form)
+                jobs = _prepare_image_batch(images, request.form)
+                _admit(request.form, _queued_cost(jobs))
+            else:
+                defaults, items = _text_batch(_json_params(request.get_json(silent=True)))
+                jobs = _prepare_text_batch(items)
+                _admit(defaults, _queued_cost(jobs))
+        except _REJECTED as e:
+            return _rejected(e, batch=True)
+
+        if not jobs:
+            return jsonify({"error": "No items to generate"}), 400
+
+        rows = [row for row, _ in jobs]
+        db.session.execute(insert(Generation), rows)
+        db.session.commit()
+        events.publish([_row_state(row) for row in rows])
+        history.invalidate([row.get("user_id") for row in rows])
+
+        signatures = [signature for _, signature in jobs if signature is not None]
+        if signatures:
+            group(signatures).apply_async()
+
+        return jsonify({
+            "jobs": [_job_response(row, "Generation started") for row in rows],
+            "job_ids": [row["id"] for row in rows],
+            "queued": len(signatures),
+            "cached": len(rows) - len(signatures)
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@main.route("/generate/similar", methods=["GET"])
+def get_similar_prompts():
+    """
+    Earlier prompts closest to `text`, with their completed generations,
+    so a client can offer an existing result instead of a new job.
+    """
+    try:
+        text = request.args.get("text")
+        if not text:
+            return jsonify({"error": "text is required"}), 400
+        # The web tier only embeds with the lightweight hashing encoder;
+        # model encoders run in the worker, so only prompts it has seen are found
+        matches = similar_prompts(
+            text,
+            k=min(request.args.get("k", 5, type=int), 50),
+            min_similarity=request.args.get("min_similarity", type=float),
+            encode=Config.TEXT_ENCODER == "hashing"
         )
+        if matches is None:
+            return jsonify({"error": "Prompt not seen yet"}), 404
 
-        return jsonify({"job_id": job_id, "status": "pending", "message": "Image generation started"})
+        generation_ids = [g for match in matches for g in match["generation_ids"]]
+        results = {}
+        if generation_ids:
+            results = {
+                g.id: g.output_image_url for g in db.session.execute(
+                    select(Generation.id, Generation.output_image_url)
+                    .where(Generation.id.in_(generation_ids), Generation.status == "completed")
+                )
+            }
+        for match in matches:
+            match["generations"] = [
+                {"job_id": g, "result_url": results[g]} for g in match.pop("generation_ids") if g in results
+            ]
+        return jsonify({"prompt": normalize_prompt(text), "matches": matches})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -95,7 +551,15 @@ def generate_from_image():
 @main.route("/generation/<job_id>/status", methods=["GET"])
 def get_generation_status(job_id):
     try:
-        generation = Generation.query.filter_by(id=job_id).first()
+        # Workers keep the last-known state in Redis, so running jobs never hit MySQL
+        state = events.get_state(job_id)
+        if state is not None:
+            state.pop("step", None)
+            return jsonify(state)
+
+        generation = db.session.execute(
+            select(*_STATUS_COLUMNS).where(Generation.id == job_id)
+        ).first()
         if not generation:
             return jsonify({"error": "Job not found"}), 404
 
@@ -106,7 +570,137 @@ def get_generation_status(job_id):
             "result_url": generation.output_image_url,
             "error": generation.error_message,
             "created_at": generation.created_at,
-            "completed_at": generation.completed_at
+            "completed_at": generation.completed_at,
+            "estimated_start_at": None  # only known from the job's state in Redis
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+def _event_stream(job_ids):
+    if not events.enabled():
+        return jsonify({"error": "Event streaming requires REDIS_URL"}), 503
+
+    # Seed Redis once from MySQL for jobs it doesn't know about (e.g. expired state)
+    missing = [job_id for job_id in job_ids if events.get_state(job_id) is None]
+    if missing:
+        generations = db.session.execute(
+            select(*_STATUS_COLUMNS).where(Generation.id.in_(missing))
+        ).all()
+        events.publish([events.job_state(*g) for g in generations])
+        db.session.remove()  # don't hold a DB connection for the life of the stream
+
+    return Response(
+        stream_with_context(events.stream_events(job_ids)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@main.route("/generation/<job_id>/events", methods=["GET"])
+def get_generation_events(job_id):
+    return _event_stream([job_id])
+
+
+@main.route("/generation/events", methods=["GET"])
+def get_generations_events():
+    job_ids = [j for j in request.args.get("job_ids", "").split(",") if j]
+    if not job_ids:
+        return jsonify({"error": "job_ids is required"}), 400
+    if len(job_ids) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} job ids per stream"}), 400
+    return _event_stream(job_ids)
+
+
+@main.route("/generation/<job_id>/export", methods=["GET"])
+def export_generation_output(job_id):
+    """
+    Download a generation as png, png8, gif, webp, spritesheet or atlas,
+    optionally upscaled (`scale`). Encoded artifacts are cached on disk and
+    streamed with ETag and Range support.
+    """
+    try:
+        generation = db.session.execute(
+            select(Generation.status, Generation.resolution, Generation.output_images)
+            .where(Generation.id == job_id)
+        ).first()
+        if not generation:
+            return jsonify({"error": "Job not found"}), 404
+        if generation.status != "completed":
+            return jsonify({"error": f"Job is {generation.status}"}), 409
+        if "canvas" in (generation.output_images or {}):
+            return jsonify({"error": "Canvas jobs aren't exported; download the PNG at result_url"}), 409
+
+        fmt = request.args.get("format", "png")
+        try:
+            label = resolution_label(parse_resolution(request.args.get("resolution", generation.resolution)))
+            path, content_type = export_generation(
+                job_id, generation.output_images, label, fmt,
+                scale=int(request.args.get("scale", 1)),
+                index=int(request.args.get("index", 0))
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return send_file(
+            path,
+            mimetype=content_type,
+            conditional=True,
+            etag=True,
+            max_age=86400,
+            download_name=f"pixel-art-{job_id}.{EXPORT_FORMATS[fmt][0]}"
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@main.route("/history", methods=["GET"])
+def get_history():
+    """
+    Newest-first generation history, `limit` rows per page. Pass the
+    returned `next_cursor` as `cursor` for the next page.
+    """
+    try:
+        user_id = request.args.get("user_id", type=int)
+        try:
+            body = history.fetch_history(
+                user_id=user_id,
+                status=request.args.get("status"),
+                style_type=request.args.get("style_type"),
+                cursor=request.args.get("cursor"),
+                limit=request.args.get("limit", type=int)
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return Response(body, mimetype="application/json")
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@main.route("/files/<path:key>", methods=["GET"])
+def get_file(key):
+    """
+    Serve a stored object by key. Keys are content hashes, so responses are
+    cacheable forever; with S3 storage this redirects to the bucket.
+    """
+    storage = get_storage()
+    try:
+        if not storage.exists(key):
+            abort(404)
+        url = storage.url(key)
+        if url:
+            return redirect(url)
+        return send_file(storage.local_path(key), conditional=True, etag=True, max_age=31536000)
+    except KeyError:
+        abort(404)
+
+
+@main.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(result_cache.stats())
+
+
+@main.route("/metrics", methods=["GET"])
+def get_metrics():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
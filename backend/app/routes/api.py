@@ -1,43 +1,33 @@
 # backend/app/routes/api.py
-from flask import Blueprint, request, jsonify
-from services.generate import generate_from_text, generate_from_image
-from services.exporter import export_image
+from flask import Blueprint, Response, request, jsonify, send_file
+from services.exporter import ExportError, export_image
 from services.history import fetch_history
 
 api = Blueprint('api', __name__)
 
-@api.route('/generate/text', methods=['POST'])
-def generate_text():
-    data = request.get_json()
-    try:
-        job_id = generate_from_text(data)
-        return jsonify({'job_id': job_id}), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@api.route('/generate/image', methods=['POST'])
-def generate_image():
-    try:
-        image_file = request.files['image']
-        params = request.form.to_dict()
-        job_id = generate_from_image(image_file, params)
-        return jsonify({'job_id': job_id}), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
 @api.route('/export', methods=['POST'])
 def export():
     data = request.get_json()
     try:
-        blob = export_image(data['image_url'], data['format'])
-        return blob, 200, {'Content-Type': 'application/octet-stream'}
+        path, content_type = export_image(data['image_url'], data['format'], int(data.get('scale', 1)))
+        return send_file(path, mimetype=content_type, conditional=True, etag=True)
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @api.route('/history', methods=['GET'])
 def history():
     try:
-        history_data = fetch_history()
-        return jsonify({'generations': history_data}), 200
+        body = fetch_history(
+            user_id=request.args.get('user_id', type=int),
+            status=request.args.get('status'),
+            style_type=request.args.get('style_type'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int)
+        )
+        return Response(body, mimetype='application/json'), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
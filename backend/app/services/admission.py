@@ -0,0 +1,193 @@
+import math
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from werkzeug.http import http_date
+
+from config import Config
+from services.metrics import queue_depths
+from services.redis_client import get_redis
+from services.scheduler import QuotaExceeded
+
+_TIMES_KEY = "pixelart:job-seconds:{}"  # queue
+
+_counters = {"admitted": 0, "degraded": 0, "fallbacks": 0, "rejected": 0, "estimate_failures": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name, n=1):
+    with _counters_lock:
+        _counters[name] += n
+
+
+def admission_stats():
+    with _counters_lock:
+        return dict(_counters)
+
+
+class Overloaded(QuotaExceeded):
+    """
+    The queue a job would join is backed up past its SLO. Answered like
+    any QuotaExceeded: 429 with Retry-After.
+    """
+
+    def __init__(self, queue, wait, retry_after):
+        Exception.__init__(
+            self, f"The {queue} queue is about {round(wait)} seconds behind, retry in {retry_after} seconds"
+        )
+        self.queue = queue
+        self.wait = wait
+        self.retry_after = retry_after
+
+
+# ----------------------------
+# Wait estimates
+# ----------------------------
+
+QueueLoad = namedtuple("QueueLoad", ["depth", "job_seconds", "wait"])
+
+
+class LoadEstimator:
+    """
+    Expected wait before a newly queued job starts, per queue: messages
+    waiting in the broker x the mean processing time of the queue's last
+    ADMISSION_SAMPLES jobs / ADMISSION_WORKER_SLOTS for the queue. Read from
+    Redis at most every `refresh` seconds per process.
+    """
+
+    def __init__(self, refresh: float):
+        self._refresh = refresh
+        self._loads: Dict[str, QueueLoad] = {}
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def loads(self, refresh: bool = True) -> Dict[str, QueueLoad]:
+        if not refresh:
+            return self._loads
+        # One reader at a time; the rest wait for its result instead of all querying Redis
+        with self._lock:
+            if time.monotonic() >= self._expires:
+                self._loads = self._read()
+                self._expires = time.monotonic() + self._refresh
+            return self._loads
+
+    def _read(self) -> Dict[str, QueueLoad]:
+        client = get_redis()
+        if client is None:
+            return {}
+        depths = queue_depths()
+        if not depths:
+            _count("estimate_failures")
+            return {}
+        try:
+            pipe = client.pipeline(transaction=False)
+            for queue in depths:
+                pipe.lrange(_TIMES_KEY.format(queue), 0, -1)
+            samples = pipe.execute()
+        except Exception as e:
+            print("Failed to read job times:", e)
+            _count("estimate_failures")
+            return {}
+
+        loads = {}
+        for (queue, depth), times in zip(depths.items(), samples):
+            job_seconds = sum(float(t) for t in times) / len(times) if times else Config.ADMISSION_DEFAULT_JOB_SECONDS
+            slots = Config.ADMISSION_WORKER_SLOTS.get(queue, 1)
+            loads[queue] = QueueLoad(depth, job_seconds, depth * job_seconds / slots)
+        return loads
+
+
+estimator = LoadEstimator(Config.ADMISSION_REFRESH_SECONDS)
+
+
+def record_processing_time(queue: Optional[str], seconds: float):
+    """
+    Add a finished job's processing time to its queue's recent samples.
+    Called by the worker.
+    """
+    client = get_redis()
+    if client is None or queue is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.lpush(_TIMES_KEY.format(queue), seconds)
+        pipe.ltrim(_TIMES_KEY.format(queue), 0, Config.ADMISSION_SAMPLES - 1)
+        pipe.execute()
+    except Exception as e:
+        print("Failed to record job time:", e)
+
+
+def estimated_start(queue: str) -> Optional[str]:
+    """
+    When a job queued on `queue` now should start, as an HTTP date (the
+    status endpoint's date format); None without an estimate.
+    """
+    load = estimator.loads().get(queue)
+    if load is None:
+        return None
+    return http_date(datetime.utcnow() + timedelta(seconds=load.wait))
+
+
+# ----------------------------
+# Decisions
+# ----------------------------
+
+def check(queue: str, can_degrade: bool = False) -> bool:
+    """
+    Admission for one job about to join `queue`. Returns True when it
+    should take its degraded path: the wait is past the queue's SLO but
+    within SLO x ADMISSION_SHED_FACTOR, ADMISSION_MODE is "degrade" and the
+    job `can_degrade`. The caller then calls degraded() once it has done
+    so. Any other job past the SLO raises Overloaded, with a Retry-After
+    of the time the queue needs to drain back under it. Admits everything
+    when there is no estimate (no Redis).
+    """
+    if Config.ADMISSION_MODE == "off":
+        return False
+    load = estimator.loads().get(queue)
+    slo = Config.ADMISSION_SLO_SECONDS.get(queue)
+    if load is None or slo is None or load.wait <= slo:
+        _count("admitted")
+        return False
+    if can_degrade and Config.ADMISSION_MODE == "degrade" and load.wait <= slo * Config.ADMISSION_SHED_FACTOR:
+        return True
+    _count("rejected")
+    raise Overloaded(queue, load.wait, max(1, math.ceil(load.wait - slo)))
+
+
+def degraded():
+    # Counted by the caller, which may still serve the job some other way (e.g. from cache)
+    _count("degraded")
+
+
+def pixelize_fallback(array_key: str, resolution: str, color_palette: str, batch_count: int) -> Tuple[str, dict]:
+    """
+    The degraded path of an image job: the upload's model input is
+    resized and palette-mapped in place of a model output, then rendered
+    and stored right away instead of waiting for inference. Returns (label
+    of the requested size, output keys by label).
+    """
+    from services.ingest import load_model_input
+    from services.palette import resolve_palette
+    from services.pipeline import render
+    from services.storage import content_key, get_storage
+
+    inputs = np.repeat(load_model_input(array_key)[np.newaxis], batch_count, axis=0)
+    palette = resolve_palette(color_palette)
+    label, encoded, _ = render(inputs, resolution, palette.colors if palette is not None else None)
+
+    storage = get_storage()
+    keys = {}
+    for key_label, images in encoded.items():
+        keys[key_label] = []
+        for data in images:
+            key = content_key("outputs", data, ".png")
+            if not storage.exists(key):
+                storage.put(key, data, "image/png")
+            keys[key_label].append(key)
+    _count("fallbacks")
+    return label, keys
@@ -0,0 +1,168 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, Tuple
+
+import numpy as np
+
+from config import Config
+from models.registry import registry
+
+
+class _Request:
+    __slots__ = ("inputs", "future", "enqueued_at")
+
+    def __init__(self, inputs: np.ndarray):
+        self.inputs = inputs
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchMetrics:
+    """
+    Running batch-size and queue-wait statistics for one batcher.
+    """
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.requests = 0
+        self.predict_time = 0.0
+        self.batch_sizes: Dict[int, int] = {}
+        self._waits = deque(maxlen=window)
+
+    def observe(self, batch_size: int, request_count: int, waits, predict_time: float):
+        with self._lock:
+            self.batches += 1
+            self.items += batch_size
+            self.requests += request_count
+            self.predict_time += predict_time
+            self.batch_sizes[batch_size] = self.batch_sizes.get(batch_size, 0) + 1
+            self._waits.extend(waits)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = np.array(self._waits) if self._waits else np.zeros(1)
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "requests": self.requests,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "batch_sizes": dict(self.batch_sizes),
+                "predict_time": self.predict_time,
+                "queue_wait_p50": float(np.percentile(waits, 50)),
+                "queue_wait_p95": float(np.percentile(waits, 95)),
+                "queue_wait_max": float(waits.max()),
+            }
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent predict calls into one forward pass.
+
+    Requests are collected until either `max_batch_size` items are pending
+    or `max_wait_ms` has passed since the first one arrived, then stacked
+    into a single NumPy batch. Each caller gets back its own slice.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = Config.BATCH_MAX_SIZE,
+                 max_wait_ms: float = Config.BATCH_MAX_WAIT_MS):
+        self._predict = predict_fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.metrics = BatchMetrics()
+
+    def submit(self, inputs) -> Future:
+        inputs = np.asarray(inputs, dtype=np.float32)
+        if inputs.ndim == 3:
+            inputs = inputs[np.newaxis]
+
+        request = _Request(inputs)
+        self._ensure_started()
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, inputs, timeout=None) -> np.ndarray:
+        return self.submit(inputs).result(timeout)
+
+    def _ensure_started(self):
+        # Started lazily so the thread is created after Celery forks its children
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0].inputs)
+            deadline = time.perf_counter() + self._max_wait
+
+            while size < self._max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.inputs)
+
+            self._dispatch(batch, size)
+
+    def _dispatch(self, batch, size: int):
+        started = time.perf_counter()
+        waits = [started - request.enqueued_at for request in batch]
+        try:
+            outputs = self._predict(np.concatenate([request.inputs for request in batch]))
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in batch:
+            count = len(request.inputs)
+            request.future.set_result(outputs[offset:offset + count])
+            offset += count
+
+        self.metrics.observe(size, len(batch), waits, time.perf_counter() - started)
+
+
+_batchers: Dict[Tuple[str, Tuple[int, ...]], MicroBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(model_name: str, input_shape) -> MicroBatcher:
+    """
+    One batcher per (model, per-sample input shape), so only requests that
+    can be stacked together share a forward pass.
+    """
+    key = (model_name, tuple(input_shape))
+    batcher = _batchers.get(key)
+    if batcher is not None:
+        return batcher
+
+    with _batchers_lock:
+        if key not in _batchers:
+            _batchers[key] = MicroBatcher(
+                lambda inputs: registry.get(model_name).predict(inputs, verbose=0)
+            )
+        return _batchers[key]
+
+
+def batching_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        f"{name}:{'x'.join(map(str, shape))}": batcher.metrics.to_dict()
+        for (name, shape), batcher in list(_batchers.items())
+    }
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from config import Config
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def result_key(input_digest: str, style, resolution, color_palette, batch_count, model_version) -> str:
+    """
+    SHA-256 over the input's content digest (prompt text or uploaded image
+    bytes) and every parameter that changes the output.
+    """
+    digest = hashlib.sha256(input_digest.encode("ascii"))
+    for part in (style, resolution, color_palette, batch_count, model_version):
+        digest.update(b"\x00")
+        digest.update(str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of generation results.
+
+    Output images already live in object storage under content keys, so
+    an entry is just the manifest of those keys by deliverable label, as
+    JSON on local disk under `root/<key[:2]>/<key>.json`. Entries are
+    evicted least-recently-used first once the directory grows past
+    `max_bytes`. When `redis_url` is set, manifests are also written to
+    Redis so other nodes can serve them; a Redis hit is promoted to local
+    disk.
+    """
+
+    def __init__(self, root: str, max_bytes: int, redis_url: Optional[str] = None,
+                 redis_ttl: int = 86400):
+        self._root = root
+        self._max_bytes = max_bytes
+        self._redis_url = redis_url
+        self._redis_ttl = redis_ttl
+        self._redis = None
+        self._size = None
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "redis_hits": 0, "puts": 0, "evictions": 0}
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+
+    def get(self, key: str) -> Optional[Dict[str, List[str]]]:
+        """
+        Output keys by deliverable label, like Generation.output_images, or None.
+        """
+        manifest = self._local_entry(key) or self._fetch_remote(key)
+        if manifest is None:
+            self._count("misses")
+            return None
+
+        try:
+            os.utime(self._entry_path(key))  # bump recency for LRU
+        except FileNotFoundError:
+            # Evicted between the read and here
+            self._count("misses")
+            return None
+        self._count("hits")
+        return json.loads(manifest)
+
+    def put(self, key: str, keys: Dict[str, List[str]]):
+        path = self._entry_path(key)
+        if os.path.isfile(path):
+            return
+
+        manifest = json.dumps(keys).encode("utf-8")
+        self._write(path, manifest)
+        self._count("puts")
+        self._store_remote(key, manifest)
+        with self._lock:
+            # A first scan already finds the new entry
+            self._size = self._size + len(manifest) if self._size is not None else self._scan_size()
+            if self._size > self._max_bytes:
+                self._evict()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+    # ----------------------------
+    # Local disk tier
+    # ----------------------------
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self._root, key[:2], f"{key}.json")
+
+    def _write(self, path: str, manifest: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(manifest)
+        os.replace(tmp, path)
+
+    def _local_entry(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._entry_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _entries(self):
+        if not os.path.isdir(self._root):
+            return
+        for shard in os.scandir(self._root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_file() and entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    def _scan_size(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+    def _evict(self):
+        # Oldest first until we're back under 90% of the cap
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        target = int(self._max_bytes * 0.9)
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.counters["evictions"] += 1
+        self._size = total
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    # ----------------------------
+    # Optional Redis tier
+    # ----------------------------
+
+    def _client(self):
+        if self._redis is None and self._redis_url:
+            import redis
+            self._redis = redis.Redis.from_url(self._redis_url)
+        return self._redis
+
+    def _store_remote(self, key: str, manifest: bytes):
+        client = self._client()
+        if client is None:
+            return
+        try:
+            client.set(f"pixelart:result:{key}", manifest, ex=self._redis_ttl)
+        except Exception as e:
+            print("Result cache: Redis write failed:", e)
+
+    def _fetch_remote(self, key: str) -> Optional[bytes]:
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            manifest = client.get(f"pixelart:result:{key}")
+        except Exception as e:
+            print("Result cache: Redis read failed:", e)
+            return None
+        if not manifest:
+            return None
+
+        self._write(self._entry_path(key), manifest)
+        self._count("redis_hits")
+        return manifest
+
+
+result_cache = ResultCache(
+    Config.RESULT_CACHE_DIR,
+    Config.RESULT_CACHE_MAX_BYTES,
+    redis_url=Config.RESULT_CACHE_REDIS_URL,
+    redis_ttl=Config.RESULT_CACHE_REDIS_TTL,
+)
+
+
+def cache_stats() -> Dict[str, int]:
+    return result_cache.stats()
@@ -0,0 +1,223 @@
+import hashlib
+import struct
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from config import Config
+from services.ingest import UploadRejected
+
+
+def parse_canvas_size(width, height) -> Tuple[int, int]:
+    """
+    Validate a canvas size in cells: each side at least one model tile and
+    at most CANVAS_MAX_SIDE.
+    """
+    _, tile, _, _ = Config.MODEL_INPUT_SHAPE
+    width, height = int(width), int(height)
+    for side in (width, height):
+        if not tile <= side <= Config.CANVAS_MAX_SIDE:
+            raise ValueError(f"Canvas sides must be between {tile} and {Config.CANVAS_MAX_SIDE} cells")
+    return width, height
+
+
+# ----------------------------
+# Source
+# ----------------------------
+
+class MappedSource:
+    """
+    An (H, W, 3) uint8 .npy file read a band of rows at a time. Each read
+    maps only those rows and unmaps them afterwards, so pages of rows
+    already processed don't stay resident the way they would in one
+    long-lived memmap of the whole file.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        with open(path, "rb") as f:
+            if np.lib.format.read_magic(f) == (1, 0):
+                self.shape, _, self.dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                self.shape, _, self.dtype = np.lib.format.read_array_header_2_0(f)
+            self._offset = f.tell()
+
+    def __getitem__(self, rows: slice) -> np.ndarray:
+        top, bottom, _ = rows.indices(self.shape[0])
+        height, width, channels = self.shape
+        window = np.memmap(self._path, dtype=self.dtype, mode="r", shape=(bottom - top, width, channels),
+                           offset=self._offset + top * width * channels * self.dtype.itemsize)
+        band = np.array(window)
+        del window
+        return band
+
+
+def prepare_source(path: str, size: Tuple[int, int], out_path: str, strip_rows: int = 256) -> MappedSource:
+    """
+    Resize an image to the canvas grid (one pixel per cell) into a uint8
+    .npy file, written in horizontal strips so the resized canvas never has
+    to fit in memory at once.
+    """
+    width, height = size
+    with Image.open(path) as img:
+        src_width, src_height = img.size
+        if src_width * src_height > Config.MAX_IMAGE_PIXELS:
+            raise UploadRejected(
+                f"Image is {src_width}x{src_height}, larger than {Config.MAX_IMAGE_PIXELS} pixels", 413
+            )
+        img.draft("RGB", size)  # JPEGs decode at the smallest scale still >= the canvas
+        img = img.convert("RGB")
+        scale_y = img.size[1] / height
+
+        with open(out_path, "wb") as out:
+            np.lib.format.write_array_header_1_0(
+                out, {"descr": "|u1", "fortran_order": False, "shape": (height, width, 3)}
+            )
+            for top in range(0, height, strip_rows):
+                bottom = min(top + strip_rows, height)
+                strip = img.resize((width, bottom - top), Image.BILINEAR,
+                                   box=(0, top * scale_y, img.size[0], bottom * scale_y))
+                out.write(np.asarray(strip, dtype=np.uint8).tobytes())
+    return MappedSource(out_path)
+
+
+# ----------------------------
+# Tiling
+# ----------------------------
+
+def tile_origins(length: int, tile: int, overlap: int) -> List[int]:
+    """
+    Start offsets of overlapping tiles covering `length`; the last tile is
+    pulled back to end exactly at the edge.
+    """
+    stride = tile - overlap
+    origins = list(range(0, max(length - tile, 0) + 1, stride))
+    if origins[-1] + tile < length:
+        origins.append(length - tile)
+    return origins
+
+
+def blend_window(tile: int, overlap: int) -> np.ndarray:
+    """
+    (tile, tile) weights ramping up linearly across the overlap on every
+    side, so neighbouring tiles cross-fade instead of leaving seams.
+    """
+    ramp = np.ones(tile, dtype=np.float32)
+    if overlap:
+        edge = (np.arange(overlap, dtype=np.float32) + 0.5) / overlap
+        ramp[:overlap] = edge
+        ramp[-overlap:] = np.minimum(ramp[-overlap:], edge[::-1])
+    return np.outer(ramp, ramp)
+
+
+# ----------------------------
+# Streamed PNG
+# ----------------------------
+
+class PNGStreamWriter:
+    """
+    Writes an RGB PNG a band of rows at a time: each band is filtered and
+    fed through one zlib stream into IDAT chunks as it arrives, so the
+    image is never held in memory. Keeps a SHA-256 of everything written,
+    for a content-addressed key.
+    """
+
+    def __init__(self, fileobj, width: int, height: int, level: int = 6):
+        self._file = fileobj
+        self._width = width
+        self._height = height
+        self._rows = 0
+        self._compressor = zlib.compressobj(level)
+        self.sha256 = hashlib.sha256()
+        self._write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self.sha256.update(data)
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self._write(struct.pack(">I", len(data)))
+        self._write(kind)
+        self._write(data)
+        self._write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def write_rows(self, rows: np.ndarray):
+        rows = np.ascontiguousarray(rows, dtype=np.uint8)
+        if rows.shape[1:] != (self._width, 3):
+            raise ValueError(f"Expected rows of shape (n, {self._width}, 3), got {rows.shape}")
+        # Filter type 0 (None) in front of every scanline
+        raw = np.zeros((len(rows), 1 + self._width * 3), dtype=np.uint8)
+        raw[:, 1:] = rows.reshape(len(rows), -1)
+        data = self._compressor.compress(raw.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self._rows += len(rows)
+
+    def close(self):
+        if self._rows != self._height:
+            raise ValueError(f"Wrote {self._rows} of {self._height} rows")
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
+
+
+# ----------------------------
+# Rendering
+# ----------------------------
+
+def render_canvas(source: np.ndarray, predict: Callable[[np.ndarray], np.ndarray], writer: PNGStreamWriter,
+                  palette=None, cell_size: int = 1, overlap: int = Config.CANVAS_TILE_OVERLAP,
+                  batch_size: int = Config.BATCH_MAX_SIZE,
+                  on_progress: Optional[Callable[[int, int], None]] = None):
+    """
+    Run the model over `source` (an (H, W, 3) uint8 array or a
+    MappedSource) tile by tile and stream the blended result to `writer`.
+
+    Tiles are read lazily one row of tiles at a time and predicted in
+    batches of `batch_size`. Outputs are accumulated with `blend_window`
+    weights in a band a little taller than one tile; rows no later tile
+    can touch are normalized, palette-quantized, scaled up to `cell_size`
+    and written out, so memory depends on the canvas width only.
+    Floyd-Steinberg error can't cross those bands, so a canvas is
+    dithered with the ordered matrix instead.
+    `on_progress(done, total)` is called after each row of tiles.
+    """
+    height, width, _ = source.shape
+    _, tile, _, _ = Config.MODEL_INPUT_SHAPE
+    overlap = min(overlap, tile // 2)
+    window = blend_window(tile, overlap)[..., np.newaxis]
+    xs, ys = tile_origins(width, tile, overlap), tile_origins(height, tile, overlap)
+
+    dither = "ordered" if Config.PALETTE_DITHER == "floyd-steinberg" else Config.PALETTE_DITHER
+
+    acc = np.zeros((0, width, 3), dtype=np.float32)
+    weights = np.zeros((0, width, 1), dtype=np.float32)
+    base = 0  # canvas row of acc[0]
+    for i, y in enumerate(ys):
+        rows = source[y:y + tile]
+        tiles = np.stack([rows[:, x:x + tile] for x in xs]).astype(np.float32) / 255.0
+        outputs = np.concatenate([predict(tiles[j:j + batch_size]) for j in range(0, len(tiles), batch_size)])
+
+        grow = y + tile - base - len(acc)
+        if grow > 0:
+            acc = np.concatenate([acc, np.zeros((grow, width, 3), dtype=np.float32)])
+            weights = np.concatenate([weights, np.zeros((grow, width, 1), dtype=np.float32)])
+        top = y - base
+        for x, out in zip(xs, outputs):
+            acc[top:top + tile, x:x + tile] += np.clip(out, 0.0, 1.0) * window
+            weights[top:top + tile, x:x + tile] += window
+
+        # Rows above the next tile row are final
+        done = (ys[i + 1] if i + 1 < len(ys) else height) - base
+        band = (acc[:done] / np.maximum(weights[:done], 1e-6) * 255.0 + 0.5).astype(np.uint8)
+        if palette is not None:
+            band = palette.quantize(band[np.newaxis], dither, first_row=base)[0]
+        if cell_size > 1:
+            band = np.repeat(np.repeat(band, cell_size, axis=0), cell_size, axis=1)
+        writer.write_rows(band)
+        acc, weights, base = acc[done:], weights[done:], base + done
+
+        if on_progress is not None:
+            on_progress(i + 1, len(ys))
@@ -0,0 +1,268 @@
+import hashlib
+import os
+import queue
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+
+from config import Config
+from services.embedding_cache import EmbeddingCache
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+# ----------------------------
+# Prompts
+# ----------------------------
+
+def normalize_prompt(text: str) -> str:
+    """
+    Canonical form of a prompt: Unicode-normalized, lowercased, with
+    punctuation dropped and whitespace collapsed, so trivially different
+    prompts share one embedding and one result-cache entry.
+    """
+    return " ".join(tokenize(text))
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def prompt_key(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+# ----------------------------
+# Encoders
+# ----------------------------
+
+class HashingEncoder:
+    """
+    Dependency-free encoder: word unigrams/bigrams and character trigrams
+    hashed into `dim` signed buckets, L2-normalized. Prompts sharing words
+    land close together, which is all near-duplicate lookup needs.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def _features(self, normalized: str):
+        words = normalized.split()
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        padded = f" {normalized} "
+        features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        return features
+
+    def encode(self, prompts: List[str]) -> np.ndarray:
+        rows, buckets, signs = [], [], []
+        for row, prompt in enumerate(prompts):
+            for feature in self._features(prompt):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+                rows.append(row)
+                buckets.append(digest % self.dim)
+                signs.append(1.0 if digest >> 63 else -1.0)
+
+        vectors = np.zeros((len(prompts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (np.array(rows, dtype=np.intp), np.array(buckets, dtype=np.intp)), signs)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class TransformerEncoder:
+    """
+    Mean-pooled sentence embeddings from a Hugging Face model
+    (TEXT_ENCODER, e.g. sentence-transformers/all-MiniLM-L6-v2).
+    Loaded on first use, in the worker only.
+    """
+
+    def __init__(self, model_name: str):
+        from transformers import AutoModel, AutoTokenizer
+
+        self._tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self._model = AutoModel.from_pretrained(model_name).eval()
+        self.dim = self._model.config.hidden_size
+
+    def encode(self, prompts: List[str]) -> np.ndarray:
+        import torch
+
+        batch = self._tokenizer(prompts, padding=True, truncation=True, max_length=64, return_tensors="pt")
+        with torch.no_grad():
+            hidden = self._model(**batch).last_hidden_state
+        mask = batch["attention_mask"].unsqueeze(-1).float()
+        vectors = ((hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)).numpy().astype(np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+_encoder = None
+_cache = None
+_init_lock = threading.Lock()
+
+
+def get_encoder():
+    global _encoder
+    if _encoder is None:
+        with _init_lock:
+            if _encoder is None:
+                if Config.TEXT_ENCODER == "hashing":
+                    _encoder = HashingEncoder(Config.EMBEDDING_DIM)
+                else:
+                    _encoder = TransformerEncoder(Config.TEXT_ENCODER)
+    return _encoder
+
+
+def get_cache() -> EmbeddingCache:
+    # One cache directory per encoder, so switching encoders never mixes vectors.
+    # Doesn't load the encoder: cached lookups work without it.
+    global _cache
+    if _cache is None:
+        with _init_lock:
+            if _cache is None:
+                name = Config.TEXT_ENCODER
+                if name == "hashing":
+                    name = f"hashing-{Config.EMBEDDING_DIM}"
+                _cache = EmbeddingCache(os.path.join(Config.EMBEDDING_CACHE_DIR, re.sub(r"[^\w.-]+", "_", name)))
+    return _cache
+
+
+def embed(prompts: List[str], generation_ids: Optional[List[str]] = None) -> np.ndarray:
+    """
+    Unit-length embeddings for a batch of prompts. Cached prompts skip the
+    encoder; the rest are encoded in one call and added to the cache.
+    `generation_ids`, if given, links each prompt to the job that used it.
+    """
+    normalized = [normalize_prompt(p) for p in prompts]
+    keys = [prompt_key(n) for n in normalized]
+    cache = get_cache()
+
+    vectors = cache.lookup(keys)
+    missing = {key: n for key, n in zip(keys, normalized) if key not in vectors}
+    if missing:
+        encoded = get_encoder().encode(list(missing.values()))
+        cache.add({key: (n, vector) for (key, n), vector in zip(missing.items(), encoded)})
+        vectors.update(zip(missing, encoded))
+
+    links = [(key, generation_id) for key, generation_id in zip(keys, generation_ids or []) if generation_id]
+    if links:
+        cache.link(links)
+    return np.stack([vectors[key] for key in keys])
+
+
+class PromptBatcher:
+    """
+    Coalesces concurrent single-prompt embeds into one embed() call, the
+    way MicroBatcher does for predicts. A /generate/batch reaches a worker
+    as many jobs at once; their distinct prompts then go through the
+    encoder together and their links are written in one append.
+    """
+
+    def __init__(self, max_prompts: int = Config.BATCH_MAX_SIZE,
+                 max_wait_ms: float = Config.BATCH_MAX_WAIT_MS):
+        self._max_prompts = max_prompts
+        self._max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def embed(self, prompt: str, generation_id: Optional[str] = None, timeout=None) -> np.ndarray:
+        future = Future()
+        self._ensure_started()
+        self._queue.put((prompt, generation_id, future))
+        return future.result(timeout)
+
+    def _ensure_started(self):
+        # Started lazily so the thread is created after Celery forks its children
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="prompt-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self._max_wait
+            while len(batch) < self._max_prompts:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                vectors = embed([prompt for prompt, _, _ in batch], [g for _, g, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+
+prompt_batcher = PromptBatcher()
+
+
+def similar_prompts(text: str, k: int = 5, min_similarity: float = None, encode: bool = True,
+                    max_generations: int = Config.SIMILAR_MAX_GENERATIONS):
+    """
+    Previously seen prompts closest to `text`, with the newest
+    `max_generations` generations that used each of them:
+    [{"prompt", "similarity", "generation_ids"}]. The query
+    itself isn't added to the cache. With `encode=False` only an
+    already-cached prompt can be looked up, and None is returned for any
+    other.
+    """
+    if min_similarity is None:
+        min_similarity = Config.EMBEDDING_SIMILARITY
+    normalized = normalize_prompt(text)
+    cached = get_cache().lookup([prompt_key(normalized)])
+    if cached:
+        vector = next(iter(cached.values()))
+    elif encode:
+        vector = get_encoder().encode([normalized])[0]
+    else:
+        return None
+    return [
+        {"prompt": prompt, "similarity": similarity, "generation_ids": generation_ids}
+        for prompt, similarity, generation_ids in get_cache().nearest(vector, k, min_similarity, max_generations)
+    ]
+
+
+# ----------------------------
+# Conditioning
+# ----------------------------
+
+@lru_cache(maxsize=4)
+def _projection(dim: int, size: int) -> np.ndarray:
+    # Fixed random projection from embedding space to model input pixels;
+    # unit-length embeddings come out roughly standard normal
+    return np.random.default_rng(0).standard_normal((dim, size), dtype=np.float32)
+
+
+def text_inputs(text: str, batch_count: int, generation_id: Optional[str] = None) -> np.ndarray:
+    """
+    Model inputs for a prompt: the prompt embedding projected to the
+    model's input shape, blended with per-sample noise seeded by the
+    normalized prompt so a batch holds variations of one image and the
+    same prompt always yields the same batch.
+    """
+    _, height, width, channels = Config.MODEL_INPUT_SHAPE
+    vector = prompt_batcher.embed(text, generation_id)
+    condition = vector @ _projection(len(vector), height * width * channels)
+    condition = 1.0 / (1.0 + np.exp(-2.0 * condition))  # into [0, 1] like image inputs
+
+    normalized = normalize_prompt(text)
+    seed = int.from_bytes(hashlib.sha256(normalized.encode("utf-8")).digest()[:8], "big")
+    noise = np.random.default_rng(seed).random((batch_count, height * width * channels), dtype=np.float32)
+
+    weight = Config.TEXT_CONDITIONING_NOISE
+    inputs = (1.0 - weight) * condition + weight * noise
+    return inputs.reshape(batch_count, height, width, channels).astype(np.float32)
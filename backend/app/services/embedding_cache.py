@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # no cross-process lock on Windows; threads are still serialized
+    fcntl = None
+
+_counters = {"hits": 0, "misses": 0}
+_counters_lock = threading.Lock()
+
+
+def embedding_stats():
+    with _counters_lock:
+        return dict(_counters)
+
+
+def _count(name, n=1):
+    with _counters_lock:
+        _counters[name] += n
+
+
+class EmbeddingCache:
+    """
+    Persistent prompt embeddings, shared by every process on the host.
+
+    Vectors live in one .npy file that readers memory-map, so a lookup
+    never loads the whole cache; `index.jsonl` is an append-only log
+    mapping each row to its prompt key and to the generations that used
+    it. Writers take a file lock, append rows (doubling the vector file
+    when full) and then the index lines, so a reader that has seen an
+    index line can always read its row.
+    """
+
+    def __init__(self, root: str, initial_capacity: int = 1024):
+        self._root = root
+        self._initial_capacity = initial_capacity
+        self._vectors_path = os.path.join(root, "vectors.npy")
+        self._index_path = os.path.join(root, "index.jsonl")
+        self._lock = threading.Lock()
+
+        self._rows: Dict[str, int] = {}
+        self._prompts: List[str] = []
+        self._generations: Dict[int, List[str]] = {}
+        self._index_offset = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._vectors_stat = None
+
+    # ----------------------------
+    # Reading
+    # ----------------------------
+
+    def _refresh(self):
+        # Pick up rows other processes appended since the last call
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "rb") as f:
+                f.seek(self._index_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # a writer is mid-append; read it next time
+                    self._index_offset += len(line)
+                    entry = json.loads(line)
+                    if "key" in entry:
+                        self._rows[entry["key"]] = entry["row"]
+                        self._prompts.append(entry["prompt"])
+                    if "generation_id" in entry:
+                        self._generations.setdefault(entry["row"], []).append(entry["generation_id"])
+
+        if os.path.exists(self._vectors_path):
+            stat = os.stat(self._vectors_path)
+            if (stat.st_ino, stat.st_size) != self._vectors_stat:
+                # Grown (replaced) by a writer: map the new file
+                self._vectors = np.load(self._vectors_path, mmap_mode="r")
+                self._vectors_stat = (stat.st_ino, stat.st_size)
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._prompts)
+
+    def lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Cached vectors for whichever of these prompt keys are known.
+        """
+        with self._lock:
+            self._refresh()
+            found = {key: np.array(self._vectors[self._rows[key]]) for key in keys if key in self._rows}
+        _count("hits", len(found))
+        _count("misses", len(keys) - len(found))
+        return found
+
+    def nearest(self, vector: np.ndarray, k: int = 5, min_similarity: float = 0.0,
+                max_generations: Optional[int] = None) -> List[Tuple[str, float, List[str]]]:
+        """
+        The `k` cached prompts most similar to `vector` (cosine; vectors
+        are unit length) as (prompt, similarity, generation ids), with at
+        most the newest `max_generations` ids per prompt.
+        """
+        with self._lock:
+            self._refresh()
+            count = len(self._prompts)
+            if not count:
+                return []
+            similarities = self._vectors[:count] @ np.asarray(vector, dtype=np.float32)
+            k = min(k, count)
+            top = np.argpartition(-similarities, k - 1)[:k]
+            top = top[np.argsort(-similarities[top])]
+            return [
+                (self._prompts[row], float(similarities[row]),
+                 self._generations.get(row, [])[-max_generations if max_generations else 0:])
+                for row in top if similarities[row] >= min_similarity
+            ]
+
+    # ----------------------------
+    # Writing
+    # ----------------------------
+
+    @contextmanager
+    def _writing(self):
+        os.makedirs(self._root, exist_ok=True)
+        with self._lock, open(os.path.join(self._root, ".lock"), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _ensure_capacity(self, rows: int, dim: int):
+        capacity = len(self._vectors) if self._vectors is not None else 0
+        if rows <= capacity:
+            return
+        new_capacity = max(self._initial_capacity, capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+
+        tmp = f"{self._vectors_path}.tmp{os.getpid()}"
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(new_capacity, dim))
+        if capacity:
+            grown[:capacity] = self._vectors
+        grown.flush()
+        del grown
+        os.replace(tmp, self._vectors_path)
+        self._vectors_stat = None
+        self._refresh()
+
+    def add(self, entries: Dict[str, Tuple[str, np.ndarray]]):
+        """
+        Store {key: (prompt, vector)}; keys already present are skipped.
+        """
+        with self._writing():
+            new = [(key, prompt, vector) for key, (prompt, vector) in entries.items() if key not in self._rows]
+            if not new:
+                return
+            first = len(self._prompts)
+            self._ensure_capacity(first + len(new), len(new[0][2]))
+
+            vectors = np.load(self._vectors_path, mmap_mode="r+")
+            vectors[first:first + len(new)] = np.stack([vector for _, _, vector in new])
+            vectors.flush()
+            del vectors
+
+            with open(self._index_path, "a", encoding="utf-8") as f:
+                f.write("".join(
+                    json.dumps({"key": key, "row": first + i, "prompt": prompt}) + "\n"
+                    for i, (key, prompt, _) in enumerate(new)
+                ))
+            self._refresh()
+
+    def link(self, links: List[Tuple[str, str]]):
+        """
+        Record that generations used these prompts, as (key, generation
+        id) pairs, for `nearest()`.
+        """
+        with self._writing():
+            lines = [
+                json.dumps({"row": self._rows[key], "generation_id": generation_id}) + "\n"
+                for key, generation_id in links if key in self._rows
+            ]
+            if not lines:
+                return
+            with open(self._index_path, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+            self._refresh()
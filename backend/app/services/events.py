@@ -0,0 +1,147 @@
+import json
+import time
+from typing import Dict, Any, Iterable, List, Optional
+
+from werkzeug.http import http_date
+
+from config import Config
+from services.redis_client import get_async_redis, get_redis
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+_STATE_KEY = "pixelart:job:{}"
+_CHANNEL = "pixelart:job-events:{}"
+
+
+def enabled() -> bool:
+    return bool(Config.REDIS_URL)
+
+
+def job_state(job_id, status, progress=0.0, result_url=None, error=None,
+              created_at=None, completed_at=None, step=None, estimated_start_at=None) -> Dict[str, Any]:
+    """
+    A job's status in the same shape as /generation/<job_id>/status
+    (datetimes formatted the way Flask's jsonify does), plus the current step.
+    `estimated_start_at` (already an HTTP date) is only kept while pending.
+    """
+    state = {
+        "job_id": job_id,
+        "status": status,
+        "progress": progress or 0,
+        "result_url": result_url,
+        "error": error,
+        "created_at": http_date(created_at) if created_at else None,
+        "completed_at": http_date(completed_at) if completed_at else None,
+        "estimated_start_at": estimated_start_at if status == "pending" else None,
+    }
+    if step:
+        state["step"] = step
+    return state
+
+
+def publish(states: Iterable[Dict[str, Any]]):
+    """
+    Store each state as the job's last-known state and fan it out to
+    subscribers, in one pipelined round-trip. A no-op without Redis.
+    """
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for state in states:
+            payload = json.dumps(state)
+            pipe.set(_STATE_KEY.format(state["job_id"]), payload, ex=Config.JOB_STATE_TTL)
+            pipe.publish(_CHANNEL.format(state["job_id"]), payload)
+        pipe.execute()
+    except Exception as e:
+        print("Failed to publish job events:", e)
+
+
+async def publish_async(states: Iterable[Dict[str, Any]]):
+    """
+    publish() through the asyncio client, for the ASGI front end.
+    """
+    client = get_async_redis()
+    if client is None:
+        return
+    try:
+        async with client.pipeline(transaction=False) as pipe:
+            for state in states:
+                payload = json.dumps(state)
+                pipe.set(_STATE_KEY.format(state["job_id"]), payload, ex=Config.JOB_STATE_TTL)
+                pipe.publish(_CHANNEL.format(state["job_id"]), payload)
+            await pipe.execute()
+    except Exception as e:
+        print("Failed to publish job events:", e)
+
+
+def get_state(job_id) -> Optional[Dict[str, Any]]:
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        payload = client.get(_STATE_KEY.format(job_id))
+    except Exception as e:
+        print("Failed to read job state:", e)
+        return None
+    return json.loads(payload) if payload else None
+
+
+async def get_state_async(job_id) -> Optional[Dict[str, Any]]:
+    client = get_async_redis()
+    if client is None:
+        return None
+    try:
+        payload = await client.get(_STATE_KEY.format(job_id))
+    except Exception as e:
+        print("Failed to read job state:", e)
+        return None
+    return json.loads(payload) if payload else None
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_events(job_ids: List[str], keepalive: float = 15.0):
+    """
+    Server-Sent Events for several jobs over one connection: the
+    last-known state of each job first, then every update, until all of
+    them have completed or failed.
+    """
+    client = get_redis()
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(*[_CHANNEL.format(job_id) for job_id in job_ids])
+
+    try:
+        pending = set(job_ids)
+        # Subscribe before reading state so no update falls in between
+        for job_id, payload in zip(job_ids, client.mget([_STATE_KEY.format(j) for j in job_ids])):
+            if payload is None:
+                yield _sse("error", {"job_id": job_id, "error": "Job not found"})
+                pending.discard(job_id)
+                continue
+            state = json.loads(payload)
+            yield _sse("progress", state)
+            if state["status"] in TERMINAL_STATUSES:
+                pending.discard(job_id)
+
+        last_sent = time.monotonic()
+        while pending:
+            message = pubsub.get_message(timeout=keepalive)
+            if message is None:
+                if time.monotonic() - last_sent >= keepalive:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+                continue
+
+            state = json.loads(message["data"])
+            yield _sse("progress", state)
+            last_sent = time.monotonic()
+            if state["status"] in TERMINAL_STATUSES:
+                pending.discard(state["job_id"])
+
+        yield _sse("done", {"job_ids": job_ids})
+    finally:
+        pubsub.close()
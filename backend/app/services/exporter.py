@@ -0,0 +1,211 @@
+import hashlib
+import json
+import math
+import os
+import threading
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from config import Config
+from services.canvas import PNGStreamWriter
+from services.pixelize import resample
+from services.storage import FileCache, get_storage, key_from_url
+
+# format -> (file extension, Content-Type)
+EXPORT_FORMATS = {
+    "png": ("png", "image/png"),
+    "png8": ("png", "image/png"),
+    "gif": ("gif", "image/gif"),
+    "webp": ("webp", "image/webp"),
+    "spritesheet": ("png", "image/png"),
+    "atlas": ("json", "application/json"),
+}
+
+_counters = {"hits": 0, "misses": 0, "streamed": 0, "evictions": 0}
+_counters_lock = threading.Lock()
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _count(name, n=1):
+    with _counters_lock:
+        _counters[name] += n
+
+
+def export_stats():
+    with _counters_lock:
+        return dict(_counters)
+
+
+# ----------------------------
+# Encoders
+# ----------------------------
+
+def _load_frames(keys: List[str]) -> np.ndarray:
+    # At their stored size; upscaling happens while encoding
+    storage = get_storage()
+    return np.stack([np.asarray(Image.open(storage.local_path(k)).convert("RGB")) for k in keys])
+
+
+def _to_indexed(img: Image.Image) -> Image.Image:
+    # Outputs are already palette-quantized, so this is lossless up to 256 colors
+    return img.convert("P", palette=Image.Palette.ADAPTIVE, colors=256)
+
+
+def _sheet_layout(count: int, width: int, height: int) -> Tuple[int, List[Tuple[int, int]]]:
+    columns = max(1, math.ceil(math.sqrt(count)))
+    return columns, [((i % columns) * width, (i // columns) * height) for i in range(count)]
+
+
+def _stream_sheet(frames: np.ndarray, scale: int, out):
+    """
+    A spritesheet of `frames` (one frame is a plain PNG) upscaled by
+    `scale` and written one source row at a time, so the upscaled image
+    is never held in memory.
+    """
+    count, height, width, _ = frames.shape
+    columns, _ = _sheet_layout(count, width, height)
+    rows = math.ceil(count / columns)
+    grid = np.zeros((rows * columns, height, width, 3), dtype=np.uint8)
+    grid[:count] = frames
+    grid = grid.reshape(rows, columns, height, width, 3)
+
+    writer = PNGStreamWriter(out, columns * width * scale, rows * height * scale)
+    for row in grid:
+        for y in range(height):
+            line = np.repeat(row[:, y].reshape(columns * width, 3), scale, axis=0)
+            writer.write_rows(np.broadcast_to(line, (scale,) + line.shape))
+    writer.close()
+
+
+def _encode(fmt: str, frames: np.ndarray, scale: int, out, source_name: str):
+    count, height, width, _ = frames.shape
+    if fmt == "atlas":
+        width, height = width * scale, height * scale
+        columns, positions = _sheet_layout(count, width, height)
+        rows = math.ceil(count / columns)
+        atlas = {
+            "frames": {
+                f"{source_name}_{i}": {"frame": {"x": x, "y": y, "w": width, "h": height}}
+                for i, (x, y) in enumerate(positions)
+            },
+            "meta": {
+                "image": f"{source_name}.png",
+                "size": {"w": columns * width, "h": rows * height},
+                "format": "RGB888",
+            },
+        }
+        out.write(json.dumps(atlas, indent=2).encode("utf-8"))
+        return
+
+    if count * height * width * scale * scale > Config.EXPORT_MAX_MEMORY_PIXELS:
+        if fmt not in ("png", "spritesheet"):
+            raise ExportError(f"Too large to export as {fmt}; use png, spritesheet or a smaller scale")
+        _count("streamed")
+        _stream_sheet(frames, scale, out)
+        return
+
+    if scale > 1:
+        frames = resample(frames, (width * scale, height * scale))
+    images = [Image.fromarray(frame) for frame in frames]
+    if fmt == "png":
+        images[0].save(out, "PNG", optimize=True)
+    elif fmt == "png8":
+        _to_indexed(images[0]).save(out, "PNG", optimize=True)
+    elif fmt == "webp":
+        images[0].save(out, "WEBP", lossless=True, method=6)
+    elif fmt == "gif":
+        indexed = [_to_indexed(f) for f in images]
+        indexed[0].save(
+            out, "GIF", save_all=True, append_images=indexed[1:],
+            duration=Config.EXPORT_GIF_FRAME_MS, loop=0, disposal=2, optimize=True,
+        )
+    elif fmt == "spritesheet":
+        width, height = images[0].size
+        columns, positions = _sheet_layout(len(images), width, height)
+        sheet = Image.new("RGB", (columns * width, math.ceil(len(images) / columns) * height))
+        for image, position in zip(images, positions):
+            sheet.paste(image, position)
+        sheet.save(out, "PNG", optimize=True)
+    else:
+        raise ExportError(f"Unsupported format: {fmt}")
+
+
+# ----------------------------
+# Cached artifacts
+# ----------------------------
+
+# Evicted least-recently-used first, like ResultCache
+artifact_cache = FileCache(Config.EXPORT_CACHE_DIR, Config.EXPORT_CACHE_MAX_BYTES,
+                           on_evict=lambda: _count("evictions"))
+
+
+def _artifact(cache_name: str, fmt: str, keys: List[str], scale: int, source_name: str) -> str:
+    """
+    Path of the encoded artifact, encoding it on the first request only.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported format: {fmt}, expected one of {', '.join(EXPORT_FORMATS)}")
+    if not 1 <= scale <= Config.EXPORT_MAX_SCALE:
+        raise ExportError(f"Scale must be between 1 and {Config.EXPORT_MAX_SCALE}")
+
+    extension, _ = EXPORT_FORMATS[fmt]
+    name = f"{cache_name}.{extension}"
+    path = artifact_cache.get(name)
+    if path is not None:
+        _count("hits")
+        return path
+
+    _count("misses")
+    frames = _load_frames(keys)
+    return artifact_cache.put(name, lambda out: _encode(fmt, frames, scale, out, source_name))
+
+
+def export_generation(generation_id: str, output_images, label: str, fmt: str,
+                      scale: int = 1, index: int = 0) -> Tuple[str, str]:
+    """
+    Encode (or fetch from cache) one deliverable of a completed Generation.
+    png/png8/webp export frame `index`; gif, spritesheet and atlas cover
+    the whole batch. Returns (path, Content-Type).
+    """
+    keys = (output_images or {}).get(label)
+    if not keys:
+        raise ExportError(f"No {label} output for this generation")
+
+    if fmt in ("png", "png8", "webp"):
+        if not 0 <= index < len(keys):
+            raise ExportError(f"Index must be between 0 and {len(keys) - 1}")
+        keys, name = [keys[index]], f"{fmt}_{label}_x{scale}_{index}"
+    else:
+        name = f"{fmt}_{label}_x{scale}"
+
+    path = _artifact(
+        os.path.join(generation_id[:2], generation_id, name), fmt, keys, scale,
+        f"{generation_id}_{label}",
+    )
+    return path, EXPORT_FORMATS[fmt][1]
+
+
+def export_image(image_url: str, fmt: str, scale: int = 1) -> Tuple[str, str]:
+    """
+    Encode a single output image by URL (/files/outputs/...) or storage
+    key. Only generation outputs can be exported. Returns (path, Content-Type).
+    """
+    key = key_from_url(image_url) or image_url
+    try:
+        if not key.startswith("outputs/") or not get_storage().exists(key):
+            raise ExportError("Unknown image")
+    except KeyError:
+        raise ExportError("Unknown image")
+
+    # Keys are content hashes, so the key alone identifies the artifact
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    path = _artifact(
+        os.path.join("files", digest[:2], f"{digest}_{fmt}_x{scale}"), fmt, [key], scale,
+        os.path.splitext(os.path.basename(key))[0],
+    )
+    return path, EXPORT_FORMATS[fmt][1]
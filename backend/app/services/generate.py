@@ -1,26 +1,207 @@
-# Before
-# from models.model_text import load_text_to_pixel_model
-# text_model = load_text_to_pixel_model()
-
-# After — define this as a cached lazy loader
-from models.model_text import load_text_to_pixel_model
-
-_text_model = None  # lazy cache
-
-def generate_from_text(data):
-    global _text_model
-    if _text_model is None:
-        _text_model = load_text_to_pixel_model()
-
-    prompt = data['text']
-    # your generation logic using _text_model
-    return {
-        "job_id": "job123",
-        "status": "started"
-    }
-    
-def generate_pixel_art_task(*args, **kwargs):
-    print("generate_pixel_art_task called - placeholder only.")
-
-def generate_from_image_task(*args, **kwargs):
-    print("generate_from_image_task called - placeholder only.")
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from celery import shared_task
+
+from config import Config
+from db.database import db
+from db.models import Generation
+from models.registry import registry
+from services import admission, events, history, presets
+from services.batching import get_batcher
+from services.cache import result_cache
+from services.canvas import PNGStreamWriter, prepare_source, render_canvas
+from services.conditioning import text_inputs
+from services.ingest import load_model_input
+from services.metrics import JOBS_IN_FLIGHT
+from services.palette import resolve_palette
+from services.pipeline import decode, postprocess
+from services.storage import content_key, digest_key, get_storage, get_uploader, public_url
+from services.tracing import StageTracer
+
+
+def _image_inputs(image_key, batch_count, array_key=None):
+    # Inputs are fetched by storage key; without the pre-resized array, decode the upload
+    if array_key:
+        arr = load_model_input(array_key)
+    else:
+        _, height, width, _ = Config.MODEL_INPUT_SHAPE
+        arr = decode(get_storage().local_path(image_key), (width, height)).astype(np.float32) / 255.0
+    return np.repeat(arr[np.newaxis], batch_count, axis=0)
+
+
+def _upload_outputs(encoded):
+    """
+    Hand every encoded PNG to the background uploader. Returns the content
+    keys, by label like Generation.output_images, and the pending uploads.
+    """
+    uploader = get_uploader()
+    keys, uploads = {}, []
+    for label, images in encoded.items():
+        keys[label] = []
+        for data in images:
+            key = content_key("outputs", data, ".png")
+            uploads.append(uploader.put_async(key, data, "image/png"))
+            keys[label].append(key)
+    return keys, uploads
+
+
+def _publish(generation, step=None):
+    events.publish([events.job_state(
+        generation.id, generation.status, generation.progress, generation.output_image_url,
+        generation.error_message, generation.created_at, generation.completed_at, step
+    )])
+
+
+def _run_job(job_id, model_name, color_palette, work, cache_key=None):
+    """
+    Bookkeeping shared by every job type: status transitions, stage
+    tracing, events and the result cache. `work(generation, tracer)` does
+    the job and returns (label of the main output, output keys by label).
+    """
+    generation = db.session.get(Generation, job_id)
+    if generation is None:
+        print(f"Generation {job_id} not found, skipping")
+        return None
+
+    generation.status = "processing"
+    generation.started_at = datetime.utcnow()
+    db.session.commit()
+
+    tracer = StageTracer(generation, model_name, on_stage=_publish)
+    JOBS_IN_FLIGHT.inc()
+    try:
+        # Cached lookups; usage_count is written in batches
+        preset = presets.record_use(generation.style_type, color_palette)
+        if preset is not None:
+            generation.generation_config = {**(generation.generation_config or {}), "style": preset["value"]}
+        label, keys = work(generation, tracer)
+    except Exception as e:
+        generation.status = "failed"
+        generation.error_message = str(e)
+        generation.completed_at = datetime.utcnow()
+        tracer.finish("failed")
+        db.session.commit()
+        _publish(generation)
+        history.invalidate([generation.user_id])
+        raise
+    finally:
+        JOBS_IN_FLIGHT.dec()
+
+    generation.status = "completed"
+    generation.progress = 1.0
+    generation.output_image_url = public_url(keys[label][0])
+    generation.output_images = keys
+    generation.model_version = registry.version(model_name)
+    generation.processing_time = tracer.elapsed
+    generation.completed_at = datetime.utcnow()
+    tracer.finish("completed")
+    db.session.commit()
+    _publish(generation)
+    history.invalidate([generation.user_id])
+    config = generation.generation_config or {}
+    if "canvas" not in config:
+        # A canvas takes minutes, not seconds; it would skew its queue's wait estimate
+        admission.record_processing_time(config.get("queue"), tracer.elapsed)
+
+    if cache_key:
+        result_cache.put(cache_key, keys)
+    return keys
+
+
+def _run_generation(job_id, model_name, make_inputs, resolution, color_palette, cache_key=None):
+    def work(generation, tracer):
+        with tracer.stage("decode" if model_name == "image" else "preprocess", 0.0):
+            inputs = make_inputs()
+        with tracer.stage("inference", 0.2):
+            # Concurrent jobs for the same model share one forward pass
+            outputs = get_batcher(model_name, inputs.shape[1:]).predict(inputs)
+        with tracer.stage("postprocess", 0.6):
+            # Resize, quantize and encode run in the encode pool
+            label, encoded, timings = postprocess(outputs, resolution, color_palette)
+            keys, uploads = _upload_outputs(encoded)
+        for name, seconds in timings.items():
+            tracer.observe(name, seconds)
+        with tracer.stage("upload", 0.9):
+            for upload in uploads:
+                upload.result()
+        return label, keys
+
+    return _run_job(job_id, model_name, color_palette, work, cache_key)
+
+
+def _canvas_progress(generation, start, end):
+    """
+    on_progress callback for render_canvas(): moves Generation.progress
+    from `start` to `end`, committing and publishing at most once per
+    CANVAS_PROGRESS_INTERVAL.
+    """
+    last = [0.0]
+
+    def report(done, total):
+        now = time.monotonic()
+        if done < total and now - last[0] < Config.CANVAS_PROGRESS_INTERVAL:
+            return
+        last[0] = now
+        generation.progress = start + (end - start) * done / total
+        db.session.commit()
+        _publish(generation, "tiles")
+
+    return report
+
+
+def _run_canvas(job_id, image_key, width, height, color_palette, cell_size):
+    def work(generation, tracer):
+        os.makedirs(Config.CANVAS_WORK_DIR, exist_ok=True)
+        source_path = os.path.join(Config.CANVAS_WORK_DIR, f"{job_id}.npy")
+        png_path = os.path.join(Config.CANVAS_WORK_DIR, f"{job_id}.png")
+        try:
+            with tracer.stage("decode", 0.0):
+                source = prepare_source(get_storage().local_path(image_key), (width, height), source_path)
+            with tracer.stage("tiles", 0.05):
+                _, tile, _, channels = Config.MODEL_INPUT_SHAPE
+                batcher = get_batcher("image", (tile, tile, channels))
+                with open(png_path, "wb") as f:
+                    writer = PNGStreamWriter(f, width * cell_size, height * cell_size)
+                    render_canvas(
+                        source, batcher.predict, writer, resolve_palette(color_palette), cell_size,
+                        on_progress=_canvas_progress(generation, 0.05, 0.95),
+                    )
+                    writer.close()
+                del source
+            key = digest_key("outputs", writer.sha256.hexdigest(), ".png")
+            with tracer.stage("upload", 0.95):
+                storage = get_storage()
+                if not storage.exists(key):
+                    storage.put_file(key, png_path, "image/png")
+        finally:
+            for leftover in (source_path, png_path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        return "canvas", {"canvas": [key]}
+
+    return _run_job(job_id, "image", color_palette, work)
+
+
+@shared_task(name="generate_pixel_art_task")
+def generate_pixel_art_task(text, style, resolution, color_palette, batch_count, job_id, cache_key=None):
+    return _run_generation(
+        job_id, "text", lambda: text_inputs(text, batch_count, job_id),
+        resolution, color_palette, cache_key
+    )
+
+
+@shared_task(name="generate_from_image_task")
+def generate_from_image_task(image_key, style, resolution, color_palette, batch_count, job_id,
+                             cache_key=None, array_key=None):
+    return _run_generation(
+        job_id, "image", lambda: _image_inputs(image_key, batch_count, array_key),
+        resolution, color_palette, cache_key
+    )
+
+
+@shared_task(name="generate_canvas_task")
+def generate_canvas_task(image_key, style, width, height, color_palette, cell_size, job_id):
+    return _run_canvas(job_id, image_key, width, height, color_palette, cell_size)
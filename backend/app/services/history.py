@@ -0,0 +1,206 @@
+import base64
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, or_, select
+
+from config import Config
+from db.database import db
+from db.models import Generation
+from services.redis_client import get_async_redis, get_redis
+
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # stdlib fallback, same output
+    import json
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+# Only what the history list shows; no output_images/generation_config JSON
+HISTORY_COLUMNS = (
+    Generation.id,
+    Generation.user_id,
+    Generation.input_text,
+    Generation.input_image_url,
+    Generation.style_type,
+    Generation.resolution,
+    Generation.color_palette,
+    Generation.batch_count,
+    Generation.output_image_url,
+    Generation.status,
+    Generation.progress,
+    Generation.created_at,
+    Generation.completed_at,
+)
+
+FILTERS = ("user_id", "status", "style_type")
+
+_PAGE_KEY = "pixelart:history:{}:{}:{}"
+_VERSION_KEY = "pixelart:history-version:{}"
+
+
+def encode_cursor(created_at: datetime, generation_id: str) -> str:
+    raw = f"{created_at.isoformat()}|{generation_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, generation_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(created_at), generation_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _page_query(filters: Dict[str, Any], cursor: Optional[str], limit: int):
+    query = select(*HISTORY_COLUMNS)
+    for name in FILTERS:
+        if filters.get(name) is not None:
+            query = query.where(getattr(Generation, name) == filters[name])
+
+    if cursor:
+        created_at, generation_id = decode_cursor(cursor)
+        # Keyset on (created_at, id): seeks straight into the index, no OFFSET scan
+        query = query.where(or_(
+            Generation.created_at < created_at,
+            and_(Generation.created_at == created_at, Generation.id < generation_id),
+        ))
+
+    return query.order_by(Generation.created_at.desc(), Generation.id.desc()).limit(limit + 1)
+
+
+def _page(rows, limit: int) -> Dict[str, Any]:
+    items = [
+        {
+            **row._asdict(),
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+            "completed_at": row.completed_at.isoformat() if row.completed_at else None,
+        }
+        for row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return {"generations": items, "next_cursor": next_cursor}
+
+
+def _query_page(filters: Dict[str, Any], cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    return _page(db.session.execute(_page_query(filters, cursor, limit)).all(), limit)
+
+
+def _page_params(user_id, status, style_type, cursor, limit):
+    """
+    Validated (limit, filters, owner, params hash) for one history page;
+    owner and hash make up its cache key.
+    """
+    limit = Config.HISTORY_PAGE_SIZE if limit is None else int(limit)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    limit = min(limit, Config.HISTORY_MAX_PAGE_SIZE)
+    filters = {"user_id": user_id, "status": status, "style_type": style_type}
+    owner = user_id if user_id is not None else "all"
+    params = hashlib.sha256(f"{status}|{style_type}|{cursor}|{limit}".encode("utf-8")).hexdigest()[:32]
+    return limit, filters, owner, params
+
+
+def fetch_history(user_id=None, status=None, style_type=None, cursor=None, limit=None) -> bytes:
+    """
+    One page of history, newest first, as serialized JSON bytes:
+    {"generations": [...], "next_cursor": "..."}.
+
+    Pages are cached in Redis for HISTORY_CACHE_TTL seconds under a
+    per-user version number, which `invalidate()` bumps whenever one of
+    that user's jobs changes state.
+    """
+    limit, filters, owner, params = _page_params(user_id, status, style_type, cursor, limit)
+
+    client = get_redis()
+    if client is None:
+        return dumps(_query_page(filters, cursor, limit))
+
+    try:
+        version = int(client.get(_VERSION_KEY.format(owner)) or 0)
+        page_key = _PAGE_KEY.format(owner, version, params)
+        cached = client.get(page_key)
+    except Exception as e:
+        print("History cache read failed:", e)
+        return dumps(_query_page(filters, cursor, limit))
+    if cached is not None:
+        return cached
+
+    body = dumps(_query_page(filters, cursor, limit))
+    try:
+        client.set(page_key, body, ex=Config.HISTORY_CACHE_TTL)
+    except Exception as e:
+        print("History cache write failed:", e)
+    return body
+
+
+async def fetch_history_async(session, user_id=None, status=None, style_type=None, cursor=None,
+                              limit=None) -> bytes:
+    """
+    fetch_history() for the ASGI front end: queried through an
+    AsyncSession and cached through the asyncio Redis client.
+    """
+    limit, filters, owner, params = _page_params(user_id, status, style_type, cursor, limit)
+
+    async def query():
+        rows = (await session.execute(_page_query(filters, cursor, limit))).all()
+        return dumps(_page(rows, limit))
+
+    client = get_async_redis()
+    if client is None:
+        return await query()
+
+    try:
+        version = int(await client.get(_VERSION_KEY.format(owner)) or 0)
+        page_key = _PAGE_KEY.format(owner, version, params)
+        cached = await client.get(page_key)
+    except Exception as e:
+        print("History cache read failed:", e)
+        return await query()
+    if cached is not None:
+        return cached
+
+    body = await query()
+    try:
+        await client.set(page_key, body, ex=Config.HISTORY_CACHE_TTL)
+    except Exception as e:
+        print("History cache write failed:", e)
+    return body
+
+
+def invalidate(user_ids):
+    """
+    Drop cached history pages for these users (and the unfiltered view)
+    by bumping their version; stale pages just expire.
+    """
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for owner in {*(u for u in user_ids if u is not None), "all"}:
+            pipe.incr(_VERSION_KEY.format(owner))
+        pipe.execute()
+    except Exception as e:
+        print("History cache invalidation failed:", e)
+
+
+async def invalidate_async(user_ids):
+    client = get_async_redis()
+    if client is None:
+        return
+    try:
+        async with client.pipeline(transaction=False) as pipe:
+            for owner in {*(u for u in user_ids if u is not None), "all"}:
+                pipe.incr(_VERSION_KEY.format(owner))
+            await pipe.execute()
+    except Exception as e:
+        print("History cache invalidation failed:", e)
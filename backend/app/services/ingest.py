@@ -0,0 +1,109 @@
+import hashlib
+import io
+import os
+from typing import Tuple
+
+import numpy as np
+from PIL import Image
+from werkzeug.utils import secure_filename
+
+from config import Config
+from services.storage import content_key, get_storage
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadRejected(ValueError):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def stream_to_disk(stream, filepath, max_bytes=Config.MAX_UPLOAD_BYTES) -> str:
+    """
+    Copy an upload stream to `filepath` chunk by chunk, hashing as we go.
+    Returns the SHA-256 hex digest of the bytes written.
+    """
+    digest = hashlib.sha256()
+    written = 0
+    with open(filepath, "wb") as out:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_bytes:
+                out.close()
+                os.remove(filepath)
+                raise UploadRejected(f"Upload exceeds {max_bytes} bytes", 413)
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def decode_to_array(path, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Decode an image straight to `size` (width, height) as an (H, W, 3) uint8
+    array. Dimensions are checked from the header before any pixel data is
+    decoded, and JPEGs use draft mode so the DCT scales the image down
+    during decoding instead of materializing the full-resolution frame.
+    """
+    with Image.open(path) as img:
+        width, height = img.size
+        if width * height > Config.MAX_IMAGE_PIXELS:
+            raise UploadRejected(
+                f"Image is {width}x{height}, larger than {Config.MAX_IMAGE_PIXELS} pixels", 413
+            )
+        img.draft("RGB", size)
+        return np.asarray(img.convert("RGB").resize(size), dtype=np.uint8)
+
+
+def ingest_upload(file_storage, upload_folder, job_id, size=None):
+    """
+    Store an uploaded image and its pre-resized model input.
+
+    The upload is streamed to `upload_folder` to be hashed and decoded,
+    then the original and a uint8 `.npy` model input (which workers
+    memory-map instead of re-decoding) are written to object storage
+    under content-addressed keys, and the local copy is removed.
+    Returns (input key, array key, sha256 hex digest of the upload).
+    """
+    if size is None:
+        _, height, width, _ = Config.MODEL_INPUT_SHAPE
+        size = (width, height)
+
+    os.makedirs(upload_folder, exist_ok=True)
+    filepath = os.path.join(upload_folder, secure_filename(f"{job_id}_{file_storage.filename}"))
+    digest = stream_to_disk(file_storage.stream, filepath)
+
+    try:
+        try:
+            arr = decode_to_array(filepath, size)
+        except UploadRejected:
+            raise
+        except Image.DecompressionBombError as e:
+            raise UploadRejected(str(e), 413)
+        except Exception as e:
+            raise UploadRejected(f"Unreadable image: {e}")
+
+        storage = get_storage()
+        extension = os.path.splitext(filepath)[1].lower()
+        input_key = f"uploads/{digest[:2]}/{digest}{extension}"
+        if not storage.exists(input_key):
+            storage.put_file(input_key, filepath, file_storage.mimetype)
+
+        buf = io.BytesIO()
+        np.save(buf, arr)
+        array_key = content_key("inputs", buf.getvalue(), ".npy")
+        if not storage.exists(array_key):
+            storage.put(array_key, buf.getvalue(), "application/octet-stream")
+    finally:
+        # put_file() has already moved or removed it when the upload was new
+        if os.path.exists(filepath):
+            os.remove(filepath)
+    return input_key, array_key, digest
+
+
+def load_model_input(array_key) -> np.ndarray:
+    # Memory-mapped, so only the few KB of pixels are ever paged in
+    return np.load(get_storage().local_path(array_key), mmap_mode="r").astype(np.float32) / 255.0
@@ -0,0 +1,151 @@
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+from config import Config
+from services.redis_client import get_redis
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram(
+    "pixelart_stage_seconds", "Time spent in each generation pipeline stage",
+    ["stage", "model"], buckets=STAGE_BUCKETS,
+)
+JOB_SECONDS = Histogram(
+    "pixelart_job_seconds", "End-to-end processing time of a generation job",
+    ["model"], buckets=STAGE_BUCKETS,
+)
+JOBS = Counter("pixelart_jobs_total", "Generation jobs finished", ["model", "status"])
+JOBS_IN_FLIGHT = Gauge("pixelart_jobs_in_flight", "Generation jobs currently running in this worker")
+WORKER_CAPACITY = Gauge("pixelart_worker_capacity", "Concurrent job slots in this worker")
+
+HTTP_SECONDS = Histogram(
+    "pixelart_http_request_seconds", "HTTP request latency", ["endpoint", "method", "status"],
+)
+
+
+def _events(name, documentation, stats):
+    # A module's _counters totals, which only ever go up, as one labelled counter
+    family = CounterMetricFamily(name, documentation, labels=["event"])
+    for event, count in stats.items():
+        family.add_metric([event], count)
+    return family
+
+
+class _RuntimeCollector:
+    """
+    Values read at scrape time: Celery queue depth and the model, batching
+    and result-cache stats of this process.
+    """
+
+    def describe(self):
+        # Without this, registering the collector would run collect() at import
+        return []
+
+    def collect(self):
+        depth = GaugeMetricFamily("pixelart_queue_depth", "Messages waiting in a Celery queue", labels=["queue"])
+        for queue, length in queue_depths().items():
+            depth.add_metric([queue], length)
+        yield depth
+
+        from models.registry import registry
+        load = GaugeMetricFamily("pixelart_model_load_seconds", "Model load time", labels=["model"])
+        memory = GaugeMetricFamily("pixelart_model_rss_bytes", "RSS growth from loading a model", labels=["model"])
+        for name, stats in registry.stats().items():
+            load.add_metric([name], stats["load_time"])
+            memory.add_metric([name], stats["rss_delta_bytes"])
+        yield load
+        yield memory
+
+        from services.batching import batching_stats
+        batch = GaugeMetricFamily("pixelart_batch_avg_size", "Average micro-batch size", labels=["batcher"])
+        wait = GaugeMetricFamily("pixelart_batch_queue_wait_p95_seconds", "p95 micro-batch queue wait",
+                                 labels=["batcher"])
+        for name, stats in batching_stats().items():
+            batch.add_metric([name], stats["avg_batch_size"])
+            wait.add_metric([name], stats["queue_wait_p95"])
+        yield batch
+        yield wait
+
+        from services.cache import cache_stats
+        yield _events("pixelart_result_cache_events", "Result cache counters", cache_stats())
+
+        from services.exporter import export_stats
+        yield _events("pixelart_export_cache_events", "Export artifact cache counters", export_stats())
+
+        from services.embedding_cache import embedding_stats
+        yield _events("pixelart_embedding_cache_events", "Prompt embedding cache counters", embedding_stats())
+
+        from services.storage import storage_stats
+        yield _events("pixelart_storage_events", "Object storage upload counters", storage_stats())
+
+        from services.pipeline import pipeline_stats
+        yield _events("pixelart_pipeline_events", "CPU process pool counters", pipeline_stats())
+
+        from services.usage import usage_stats
+        usage = usage_stats()
+        buffered = GaugeMetricFamily("pixelart_usage_log_buffered", "API usage events waiting to be flushed")
+        buffered.add_metric([], usage.pop("buffered"))
+        yield buffered
+        yield _events("pixelart_usage_log_events", "Buffered API usage log counters", usage)
+
+        from services.presets import preset_stats
+        yield _events("pixelart_preset_cache_events", "Style preset and palette cache counters", preset_stats())
+
+        from services.admission import admission_stats, estimator
+        yield _events("pixelart_admission_events", "Admission control decisions", admission_stats())
+        wait = GaugeMetricFamily("pixelart_queue_wait_seconds", "Estimated wait for a newly queued job",
+                                 labels=["queue"])
+        for queue, load in estimator.loads(refresh=False).items():
+            wait.add_metric([queue], load.wait)
+        yield wait
+
+
+def queue_depths():
+    client = get_redis()
+    if client is None:
+        return {}
+    try:
+        from services.scheduler import queue_keys
+        pipe = client.pipeline(transaction=False)
+        for queue in Config.CELERY_QUEUE_NAMES:
+            for key in queue_keys(queue):
+                pipe.llen(key)
+        lengths = iter(pipe.execute())
+        return {
+            queue: sum(next(lengths) for _ in queue_keys(queue))
+            for queue in Config.CELERY_QUEUE_NAMES
+        }
+    except Exception as e:
+        print("Failed to read queue depth:", e)
+        return {}
+
+
+REGISTRY.register(_RuntimeCollector())
+
+
+def init_app(app):
+    """
+    Time every request of a Flask app into pixelart_http_request_seconds.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            HTTP_SECONDS.labels(
+                request.url_rule.rule if request.url_rule else "unmatched",
+                request.method,
+                response.status_code,
+            ).observe(time.perf_counter() - started)
+        return response
+
+
+def render():
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,169 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+
+# Built-in palettes, resolved before looking up ColorPalette rows
+BUILTIN_PALETTES: Dict[str, List[str]] = {
+    "classic": [  # PICO-8
+        "#000000", "#1D2B53", "#7E2553", "#008751", "#AB5236", "#5F574F", "#C2C3C7", "#FFF1E8",
+        "#FF004D", "#FFA300", "#FFEC27", "#00E436", "#29ADFF", "#83769C", "#FF77A8", "#FFCCAA",
+    ],
+    "gameboy": ["#0F380F", "#306230", "#8BAC0F", "#9BBC0F"],
+    "grayscale": ["#000000", "#555555", "#AAAAAA", "#FFFFFF"],
+}
+
+DITHER_MODES = ("none", "ordered", "floyd-steinberg")
+
+_BAYER_4 = np.array([
+    [0, 8, 2, 10],
+    [12, 4, 14, 6],
+    [3, 11, 1, 9],
+    [15, 7, 13, 5],
+], dtype=np.float32) / 16.0 - 0.5
+
+
+def hex_to_rgb(colors: List[str]) -> np.ndarray:
+    return np.array(
+        [[int(c.lstrip("#")[i:i + 2], 16) for i in (0, 2, 4)] for c in colors],
+        dtype=np.uint8,
+    )
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """
+    Vectorized sRGB (uint8 or 0-255 float, last axis = 3) to CIE Lab (D65).
+    """
+    c = np.asarray(rgb, dtype=np.float32) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    xyz = c @ np.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505],
+    ], dtype=np.float32)
+    xyz /= np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16.0 / 116.0)
+    return np.stack([
+        116.0 * f[..., 1] - 16.0,
+        500.0 * (f[..., 0] - f[..., 1]),
+        200.0 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+class CompiledPalette:
+    """
+    A palette with a precomputed RGB -> palette-index lookup table.
+
+    The LUT has 2**lut_bits levels per channel; each cell holds the index
+    of the palette color nearest (in Lab) to the cell's center, so
+    quantizing is one fancy-index per pixel for a whole batch at once.
+    """
+
+    def __init__(self, colors: List[str], lut_bits: int = Config.PALETTE_LUT_BITS):
+        self.colors = list(colors)
+        self.rgb = hex_to_rgb(colors)
+        self.lab = rgb_to_lab(self.rgb)
+        self._shift = 8 - lut_bits
+
+        levels = 1 << lut_bits
+        step = 256 // levels
+        axis = np.arange(levels, dtype=np.float32) * step + (step - 1) / 2.0
+        grid = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), axis=-1).reshape(-1, 3)
+        self.lut = self._nearest(rgb_to_lab(grid)).reshape(levels, levels, levels)
+
+    def _nearest(self, lab: np.ndarray) -> np.ndarray:
+        dist = ((lab[:, np.newaxis, :] - self.lab[np.newaxis, :, :]) ** 2).sum(axis=-1)
+        index_dtype = np.uint8 if len(self.colors) <= 256 else np.uint16
+        return dist.argmin(axis=1).astype(index_dtype)
+
+    def indices(self, pixels: np.ndarray) -> np.ndarray:
+        px = np.asarray(pixels, dtype=np.uint8) >> self._shift
+        return self.lut[px[..., 0], px[..., 1], px[..., 2]]
+
+    def quantize(self, images: np.ndarray, dither: str = "none", first_row: int = 0) -> np.ndarray:
+        """
+        Snap uint8 images of shape (..., H, W, 3) to the palette.
+        `first_row` is the row of a band within a larger image, so ordered
+        dithering lines up across bands.
+        """
+        if dither == "ordered":
+            return self.rgb[self.indices(self._ordered(images, first_row))]
+        if dither == "floyd-steinberg":
+            return self._floyd_steinberg(images)
+        return self.rgb[self.indices(images)]
+
+    def _ordered(self, images: np.ndarray, first_row: int = 0) -> np.ndarray:
+        height, width = images.shape[-3:-1]
+        rows, columns = (np.arange(height) + first_row) % 4, np.arange(width) % 4
+        threshold = _BAYER_4[rows[:, np.newaxis], columns[np.newaxis, :], np.newaxis]
+        spread = 255.0 / max(len(self.colors) ** (1 / 3), 2.0)
+        return np.clip(images + threshold * spread, 0, 255).astype(np.uint8)
+
+    def _floyd_steinberg(self, images: np.ndarray) -> np.ndarray:
+        # Error diffusion is sequential per pixel, so vectorize across the batch
+        work = np.asarray(images, dtype=np.float32).reshape(-1, *images.shape[-3:]).copy()
+        out = np.empty(work.shape, dtype=np.uint8)
+        _, height, width, _ = work.shape
+
+        for y in range(height):
+            for x in range(width):
+                old = work[:, y, x]
+                new = self.rgb[self.indices(np.clip(old, 0, 255))]
+                out[:, y, x] = new
+                err = old - new
+                if x + 1 < width:
+                    work[:, y, x + 1] += err * (7 / 16)
+                if y + 1 < height:
+                    if x > 0:
+                        work[:, y + 1, x - 1] += err * (3 / 16)
+                    work[:, y + 1, x] += err * (5 / 16)
+                    if x + 1 < width:
+                        work[:, y + 1, x + 1] += err * (1 / 16)
+
+        return out.reshape(images.shape)
+
+
+_compiled: Dict[str, Tuple[object, CompiledPalette]] = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_palette(key: str, colors: List[str], version=None) -> CompiledPalette:
+    """
+    Compile once per palette and reuse until `version` (the row's
+    `updated_at`) changes.
+    """
+    cached = _compiled.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    palette = CompiledPalette(colors)
+    with _compiled_lock:
+        _compiled[key] = (version, palette)
+    return palette
+
+
+def resolve_palette(name: str) -> Optional[CompiledPalette]:
+    """
+    Look up `Generation.color_palette`: a built-in name, or a ColorPalette
+    id or name. Returns None when no palette should be applied.
+    """
+    if not name or name == "none":
+        return None
+    if name in BUILTIN_PALETTES:
+        return compile_palette(f"builtin:{name}", BUILTIN_PALETTES[name])
+
+    from services.presets import get_palette
+
+    row = get_palette(name)
+    if row is None:
+        raise ValueError(f"Unknown color palette: {name}")
+    return compile_palette(f"db:{row['id']}", row["value"], row["updated_at"])
+
+
+def apply_palette(images: np.ndarray, name: str, dither: str = Config.PALETTE_DITHER) -> np.ndarray:
+    palette = resolve_palette(name)
+    if palette is None:
+        return images
+    return palette.quantize(images, dither)
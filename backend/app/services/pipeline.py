@@ -0,0 +1,240 @@
+import io
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from config import Config
+from services.ingest import decode_to_array
+from services.palette import compile_palette, resolve_palette
+from services.pixelize import (
+    parse_resolution, render_deliverables, resample, resolution_label, upscale_preview
+)
+
+_counters = {"decodes": 0, "postprocesses": 0, "shared_bytes": 0, "backpressure_waits": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name, n=1):
+    with _counters_lock:
+        _counters[name] += n
+
+
+def pipeline_stats():
+    with _counters_lock:
+        return dict(_counters)
+
+
+# ----------------------------
+# Shared-memory arrays
+# ----------------------------
+
+class SharedArray:
+    """
+    An ndarray in a multiprocessing.shared_memory block. Only `spec` (the
+    block's name, shape and dtype) crosses the process boundary, so image
+    batches reach the pool without being pickled. The creating process
+    owns the block and unlinks it.
+    """
+
+    def __init__(self, shm, shape, dtype, owner):
+        self._shm = shm
+        self._owner = owner
+        self.array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, shape, dtype) -> "SharedArray":
+        nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        _count("shared_bytes", nbytes)
+        return cls(shared_memory.SharedMemory(create=True, size=nbytes), shape, dtype, owner=True)
+
+    @classmethod
+    def attach(cls, spec) -> "SharedArray":
+        name, shape, dtype = spec
+        return cls(shared_memory.SharedMemory(name=name), shape, dtype, owner=False)
+
+    @property
+    def spec(self):
+        return self._shm.name, self.array.shape, self.array.dtype.str
+
+    def close(self):
+        del self.array  # drop the view before closing the buffer it points into
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ----------------------------
+# Stage work (runs in pool processes)
+# ----------------------------
+
+def render(outputs: np.ndarray, resolution: str, colors: Optional[List[str]]):
+    """
+    Model outputs to PNGs: every deliverable size, palette-applied, plus a
+    preview of the requested size. Returns (requested label, PNG bytes by
+    label, seconds per stage).
+    """
+    timings = {}
+
+    started = time.perf_counter()
+    pixels = (np.clip(outputs, 0.0, 1.0) * 255).astype(np.uint8)
+    size = parse_resolution(resolution)
+    label = resolution_label(size)
+    deliverables = render_deliverables(pixels)
+    if label not in deliverables:
+        deliverables[label] = resample(pixels, size)
+    timings["resize"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if colors:
+        # Compiled once per process and palette
+        palette = compile_palette("colors:" + ",".join(colors), colors)
+        deliverables = {key: palette.quantize(arr, Config.PALETTE_DITHER) for key, arr in deliverables.items()}
+    deliverables["preview"] = upscale_preview(deliverables[label])
+    timings["quantize"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    encoded = {}
+    for key, images in deliverables.items():
+        encoded[key] = []
+        for arr in images:
+            buf = io.BytesIO()
+            Image.fromarray(arr).save(buf, "PNG")
+            encoded[key].append(buf.getvalue())
+    timings["encode"] = time.perf_counter() - started
+
+    return label, encoded, timings
+
+
+def _render_shared(spec, resolution, colors):
+    with SharedArray.attach(spec) as outputs:
+        return render(outputs.array, resolution, colors)
+
+
+def _decode_shared(path, size, spec):
+    with SharedArray.attach(spec) as out:
+        out.array[...] = decode_to_array(path, size)
+
+
+# ----------------------------
+# Pools
+# ----------------------------
+
+class StagePool:
+    """
+    A process pool for one CPU-bound stage, fed through a bounded queue:
+    at most `queue_depth` jobs per process are pending, and further
+    submitters block until one finishes instead of piling up pixels in
+    memory. With `processes=0` the work runs inline in the calling thread.
+    """
+
+    def __init__(self, name: str, processes: int, queue_depth: int):
+        self.name = name
+        self.processes = processes
+        self._slots = threading.BoundedSemaphore(max(processes * queue_depth, 1))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use, after Celery forks its children. Forking
+        # a worker that already runs TensorFlow and the batcher's threads
+        # isn't safe, so processes come from a clean forkserver instead.
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                    if "forkserver" in methods:
+                        context.set_forkserver_preload([__name__])
+                    self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+        return self._executor
+
+    def submit(self, fn, *args) -> Future:
+        if self.processes <= 0:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if not self._slots.acquire(blocking=False):
+            _count("backpressure_waits")
+            self._slots.acquire()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+_decode_pool = None
+_encode_pool = None
+_init_lock = threading.Lock()
+
+
+def get_pools() -> Tuple[StagePool, StagePool]:
+    global _decode_pool, _encode_pool
+    if _encode_pool is None:
+        with _init_lock:
+            if _encode_pool is None:
+                _decode_pool = StagePool("decode", Config.PIPELINE_DECODE_PROCESSES, Config.PIPELINE_QUEUE_DEPTH)
+                _encode_pool = StagePool("encode", Config.PIPELINE_ENCODE_PROCESSES, Config.PIPELINE_QUEUE_DEPTH)
+    return _decode_pool, _encode_pool
+
+
+# ----------------------------
+# Entry points for the worker
+# ----------------------------
+
+def decode(path: str, size: Tuple[int, int]) -> np.ndarray:
+    """
+    decode_to_array() in the decode pool, writing straight into shared
+    memory. Returns an (H, W, 3) uint8 array.
+    """
+    pool, _ = get_pools()
+    _count("decodes")
+    if pool.processes <= 0:
+        return decode_to_array(path, size)
+
+    width, height = size
+    with SharedArray.create((height, width, 3), np.uint8) as out:
+        pool.submit(_decode_shared, path, size, out.spec).result()
+        return np.array(out.array)
+
+
+def postprocess(outputs: np.ndarray, resolution: str, color_palette: str):
+    """
+    render() in the encode pool, so PIL and NumPy work for one job runs in
+    parallel with other jobs' inference. The palette is resolved here,
+    where the database is, and only its colors are sent along.
+    """
+    palette = resolve_palette(color_palette)
+    colors = palette.colors if palette is not None else None
+    _, pool = get_pools()
+    _count("postprocesses")
+    if pool.processes <= 0:
+        return render(outputs, resolution, colors)
+
+    with SharedArray.create(outputs.shape, np.float32) as shared:
+        shared.array[...] = outputs
+        return pool.submit(_render_shared, shared.spec, resolution, colors).result()
@@ -0,0 +1,89 @@
+from functools import lru_cache
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+from config import Config
+
+
+@lru_cache(maxsize=64)
+def parse_resolution(value: str) -> Tuple[int, int]:
+    """
+    Parse a "WxH" resolution string, e.g. "32x32", into (width, height).
+    Raises ValueError for anything outside Config.OUTPUT_SIZES.
+    """
+    try:
+        width, height = (int(part) for part in str(value).lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Invalid resolution: {value!r}, expected e.g. '32x32'")
+
+    if width not in Config.OUTPUT_SIZES or height not in Config.OUTPUT_SIZES:
+        sizes = ", ".join(f"{s}x{s}" for s in Config.OUTPUT_SIZES)
+        raise ValueError(f"Unsupported resolution: {value!r}, expected one of {sizes}")
+    return width, height
+
+
+def resolution_label(size: Tuple[int, int]) -> str:
+    return f"{size[0]}x{size[1]}"
+
+
+@lru_cache(maxsize=None)
+def _box_weights(src: int, dst: int) -> np.ndarray:
+    """
+    (dst, src) matrix averaging each output cell over the source pixels it
+    covers, weighted by overlap. Used when shrinking an axis.
+    """
+    weights = np.zeros((dst, src), dtype=np.float32)
+    scale = src / dst
+    for i in range(dst):
+        start, end = i * scale, (i + 1) * scale
+        for j in range(int(start), min(int(np.ceil(end)), src)):
+            weights[i, j] = min(end, j + 1) - max(start, j)
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+@lru_cache(maxsize=None)
+def _nearest_index(src: int, dst: int) -> np.ndarray:
+    # Source pixel for each output pixel when growing an axis; keeps hard pixel edges
+    return ((np.arange(dst) + 0.5) * src / dst).astype(np.intp)
+
+
+def _resample_axis(images: np.ndarray, axis: int, dst: int) -> np.ndarray:
+    src = images.shape[axis]
+    if src == dst:
+        return images
+    if dst > src:
+        return np.take(images, _nearest_index(src, dst), axis=axis)
+
+    moved = np.moveaxis(images.astype(np.float32), axis, -1)
+    return np.moveaxis(moved @ _box_weights(src, dst).T, -1, axis)
+
+
+def resample(images: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Resize a batch of (N, H, W, 3) uint8 images to (width, height):
+    area-averaged when shrinking, nearest-neighbor when growing.
+    """
+    width, height = size
+    out = _resample_axis(images, 1, height)
+    out = _resample_axis(out, 2, width)
+    if out.dtype != np.uint8:
+        out = np.clip(np.rint(out), 0, 255).astype(np.uint8)
+    return out
+
+
+def upscale_preview(images: np.ndarray, longest_side: int = Config.PREVIEW_SIZE) -> np.ndarray:
+    _, height, width, _ = images.shape
+    factor = max(longest_side // max(height, width), 1)
+    return resample(images, (width * factor, height * factor))
+
+
+def render_deliverables(images: np.ndarray, sizes: Iterable[int] = Config.OUTPUT_SIZES
+                        ) -> Dict[str, np.ndarray]:
+    """
+    Every square deliverable size for a whole batch, keyed by "WxH".
+    """
+    return {
+        resolution_label((size, size)): resample(images, (size, size))
+        for size in sizes
+    }
@@ -0,0 +1,273 @@
+import atexit
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import case, event, func, select, update
+from sqlalchemy.orm import Session
+
+from config import Config
+from db.database import db
+from db.models import ColorPalette, StylePreset
+from services.redis_client import get_redis
+
+_CHANNEL = "pixelart:preset-invalidations"
+_MISSING = object()
+
+_counters = {"hits": 0, "misses": 0, "invalidations": 0, "usage_flushed": 0, "usage_flush_failures": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name, n=1):
+    with _counters_lock:
+        _counters[name] += n
+
+
+def preset_stats():
+    with _counters_lock:
+        return dict(_counters)
+
+
+# ----------------------------
+# Cache
+# ----------------------------
+
+class PresetCache:
+    """
+    LRU of looked-up StylePreset/ColorPalette rows (as plain dicts, or None
+    for names that don't exist), keyed by (kind, id-or-name). Entries expire
+    after `ttl` seconds; changes committed anywhere evict them sooner
+    through Redis pub/sub (see `invalidate`).
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Optional[dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, kind, row_id=None, name=None):
+        # By id and name, so new rows also evict a cached "doesn't exist"
+        aliases = {str(row_id), name} - {None}
+        with self._lock:
+            for key in [
+                key for key, (_, value) in self._entries.items()
+                if key[0] == kind and (key[1] in aliases or (value is not None and value["id"] == row_id))
+            ]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = PresetCache(Config.PRESET_CACHE_TTL, Config.PRESET_CACHE_MAX_ENTRIES)
+
+
+# kind -> (model, column holding the preset's contents)
+_MODELS = {"palette": (ColorPalette, "colors"), "style": (StylePreset, "config")}
+_KINDS = {model: kind for kind, (model, _) in _MODELS.items()}
+
+
+def _lookup(kind: str, name: str) -> Optional[Dict[str, Any]]:
+    """
+    The row `name` (an id or a name) refers to as {"id", "name", "value",
+    "updated_at"}, where value is ColorPalette.colors or
+    StylePreset.config; None when there is no such row.
+    """
+    _ensure_subscribed()
+    key = (kind, name)
+    row = cache.get(key)
+    if row is not _MISSING:
+        _count("hits")
+        return row
+
+    _count("misses")
+    model, column = _MODELS[kind]
+    where = model.id == int(name) if name.isdigit() else model.name == name
+    found = db.session.execute(
+        select(model.id, model.name, getattr(model, column), model.updated_at).where(where).limit(1)
+    ).first()
+    row = None
+    if found is not None:
+        row = {"id": found[0], "name": found[1], "value": found[2], "updated_at": found[3]}
+    cache.put(key, row)
+    return row
+
+
+def get_palette(name: str) -> Optional[Dict[str, Any]]:
+    return _lookup("palette", name)
+
+
+def get_style(name: str) -> Optional[Dict[str, Any]]:
+    return _lookup("style", name)
+
+
+# ----------------------------
+# Invalidation
+# ----------------------------
+
+_subscriber = None
+_subscriber_lock = threading.Lock()
+
+
+def _ensure_subscribed():
+    # One listener thread per process, started after any fork
+    global _subscriber
+    if _subscriber is not None or get_redis() is None:
+        return
+    with _subscriber_lock:
+        if _subscriber is None:
+            _subscriber = threading.Thread(target=_listen, name="preset-invalidations", daemon=True)
+            _subscriber.start()
+
+
+def _listen():
+    while True:
+        try:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(_CHANNEL)
+            cache.clear()  # anything published while we weren't listening is lost
+            for message in pubsub.listen():
+                change = json.loads(message["data"])
+                cache.invalidate(change["kind"], change.get("id"), change.get("name"))
+                _count("invalidations")
+        except Exception as e:
+            print("Preset invalidation listener failed, reconnecting:", e)
+            time.sleep(1)
+
+
+def invalidate(kind, row_id, name):
+    """
+    Evict a changed row here, then in every other process.
+    """
+    cache.invalidate(kind, row_id, name)
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.publish(_CHANNEL, json.dumps({"kind": kind, "id": row_id, "name": name}))
+    except Exception as e:
+        print("Failed to publish preset invalidation:", e)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault("preset_changes", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        kind = _KINDS.get(type(obj))
+        if kind is not None:
+            changes.add((kind, obj.id, obj.name))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session):
+    for change in session.info.pop("preset_changes", ()):
+        invalidate(*change)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("preset_changes", None)
+
+
+# ----------------------------
+# Buffered usage_count
+# ----------------------------
+
+class UsageCounts:
+    """
+    usage_count increments aggregated in memory and written every
+    `interval` seconds as one UPDATE per table, so popular public presets
+    aren't a locked hot row on every job. `updated_at` is left alone: it
+    tracks edits, and bumping it would invalidate every cached copy.
+    """
+
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._pending: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+        self._app = None
+        self._thread = None
+
+    def add(self, kind: str, row_id: int):
+        with self._lock:
+            self._pending[(kind, row_id)] = self._pending.get((kind, row_id), 0) + 1
+            if self._thread is None:
+                from flask import current_app
+                self._app = current_app._get_current_object()
+                self._thread = threading.Thread(target=self._run, name="preset-usage", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        try:
+            with self._app.app_context():
+                for kind, (model, _) in _MODELS.items():
+                    counts = {row_id: n for (k, row_id), n in pending.items() if k == kind}
+                    if counts:
+                        db.session.execute(
+                            update(model)
+                            .where(model.id.in_(counts))
+                            .values(
+                                usage_count=func.coalesce(model.usage_count, 0) + case(counts, value=model.id, else_=0),
+                                updated_at=model.updated_at,
+                            )
+                            .execution_options(synchronize_session=False)
+                        )
+                db.session.commit()
+        except Exception as e:
+            print("Preset usage flush failed:", e)
+            _count("usage_flush_failures")
+            with self._lock:
+                for key, n in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + n
+            return
+        _count("usage_flushed", sum(pending.values()))
+
+
+usage_counts = UsageCounts(Config.PRESET_USAGE_FLUSH_SECONDS)
+
+
+def record_use(style: Optional[str], color_palette: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Count one use of the job's style preset and palette, when they are
+    rows rather than built-in names. Returns the style preset, if any.
+    """
+    from services.palette import BUILTIN_PALETTES
+
+    preset = get_style(style) if style else None
+    if preset is not None:
+        usage_counts.add("style", preset["id"])
+    if color_palette and color_palette != "none" and color_palette not in BUILTIN_PALETTES:
+        palette = get_palette(color_palette)
+        if palette is not None:
+            usage_counts.add("palette", palette["id"])
+    return preset
@@ -0,0 +1,31 @@
+from config import Config
+
+_client = None
+
+
+def get_redis():
+    """
+    The process-wide Redis client (one connection pool), or None when
+    REDIS_URL isn't configured.
+    """
+    global _client
+    if _client is None and Config.REDIS_URL:
+        import redis
+        _client = redis.Redis.from_url(Config.REDIS_URL)
+    return _client
+
+
+_async_client = None
+
+
+def get_async_redis():
+    """
+    The process-wide asyncio Redis client for the ASGI front end, or None
+    when REDIS_URL isn't configured. Its connections belong to the event
+    loop that first uses them, so it's only used from the server's loop.
+    """
+    global _async_client
+    if _async_client is None and Config.REDIS_URL:
+        import redis.asyncio
+        _async_client = redis.asyncio.Redis.from_url(Config.REDIS_URL)
+    return _async_client
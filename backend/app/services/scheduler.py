@@ -0,0 +1,117 @@
+import time
+from collections import namedtuple
+
+from config import Config
+from services.pixelize import parse_resolution
+from services.redis_client import get_redis
+from services.usage import recent_usage
+
+# Requested priority -> Celery priority. With the Redis broker 0 is served first.
+PRIORITIES = {"high": 0, "normal": 3, "low": 6}
+MAX_PRIORITY = 9
+
+Placement = namedtuple("Placement", ["queue", "priority"])
+
+_BUCKET_KEY = "pixelart:bucket:{}"
+
+# Refill then take `cost` tokens atomically; returns {allowed, seconds until enough tokens}
+_TAKE_TOKENS = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limit exceeded, retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class RequestTooLarge(ValueError):
+    def __init__(self, cost):
+        super().__init__(
+            f"Request costs {cost} images, more than the {Config.USER_BURST} allowed at once; split it up"
+        )
+
+
+def queue_keys(queue):
+    # Redis keeps one list per priority step: "bulk", "bulk:3", "bulk:6", ...
+    sep = Config.BROKER_TRANSPORT_OPTIONS["sep"]
+    return [queue] + [f"{queue}{sep}{p}" for p in Config.BROKER_TRANSPORT_OPTIONS["priority_steps"] if p]
+
+
+def check_cost(cost):
+    """
+    Raises RequestTooLarge when `cost` is more than a token bucket can
+    ever hold; admit() would refuse it however long the caller waited.
+    """
+    if cost > Config.USER_BURST:
+        raise RequestTooLarge(cost)
+
+
+def admit(subject, cost):
+    """
+    Take `cost` images from `subject`'s token bucket (a user id, or the
+    client address for anonymous requests). Raises QuotaExceeded with a
+    Retry-After in seconds when the bucket is empty, and RequestTooLarge
+    when `cost` is more than the bucket can ever hold. Without Redis every
+    other request is admitted.
+    """
+    check_cost(cost)
+    client = get_redis()
+    if client is None or cost <= 0:
+        return
+    rate = Config.USER_RATE_PER_MINUTE / 60.0
+    try:
+        allowed, retry_after = client.eval(
+            _TAKE_TOKENS, 1, _BUCKET_KEY.format(subject),
+            Config.USER_BURST, rate, time.time(), cost,
+        )
+    except Exception as e:
+        print("Admission check failed:", e)
+        return
+    if not int(allowed):
+        raise QuotaExceeded(max(1, int(float(retry_after) + 0.999)))
+
+
+def is_interactive(resolution, batch_count):
+    width, height = parse_resolution(resolution)
+    return batch_count <= Config.INTERACTIVE_MAX_BATCH and width * height <= Config.INTERACTIVE_MAX_PIXELS
+
+
+def place(user_id, resolution, batch_count, priority=None, bulk=False):
+    """
+    Queue and Celery priority for one job. Small single jobs go to the
+    interactive queue, everything else (and all of /generate/batch) to
+    bulk. Heavy users are demoted one priority step per FAIR_SHARE_STEP
+    requests in the fair-share window, so they can't crowd out others.
+    """
+    priority = priority or "normal"
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority}, expected one of {', '.join(PRIORITIES)}")
+
+    queue = Config.INTERACTIVE_QUEUE
+    if bulk or not is_interactive(resolution, batch_count):
+        queue = Config.BULK_QUEUE
+
+    demotion = 0
+    if user_id is not None:
+        demotion = min(recent_usage(user_id) // Config.FAIR_SHARE_STEP, Config.FAIR_SHARE_MAX_DEMOTION)
+    return Placement(queue, min(PRIORITIES[priority] + demotion, MAX_PRIORITY))
@@ -0,0 +1,49 @@
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+from prometheus_client import Gauge
+
+# Inference runtimes only the worker may load; each costs seconds and
+# hundreds of MB when imported
+HEAVY_MODULES = ("tensorflow", "keras", "onnxruntime", "tflite_runtime", "ai_edge_litert")
+
+STARTUP_SECONDS = Gauge("pixelart_startup_seconds", "Time spent in each app startup phase", ["phase"])
+
+
+def heavy_modules() -> List[str]:
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+class StartupReport:
+    """
+    Wall time of each create_app phase, exported as
+    pixelart_startup_seconds and printed once startup is done.
+    """
+
+    def __init__(self, process_type):
+        self.process_type = process_type
+        self.phases: Dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+            STARTUP_SECONDS.labels(name).set(self.phases[name])
+
+    def finish(self):
+        total = time.perf_counter() - self._started
+        STARTUP_SECONDS.labels("total").set(total)
+        breakdown = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases.items())
+        print(f"Started {self.process_type} app in {total * 1000:.0f}ms ({breakdown})")
+
+        loaded = heavy_modules()
+        if self.process_type == "web" and loaded:
+            print(f"Warning: web process imported {', '.join(loaded)}; run startup_report.py to find out where")
+        return {"process_type": self.process_type, "total": total, "phases": dict(self.phases),
+                "heavy_modules": loaded}
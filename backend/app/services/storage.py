@@ -0,0 +1,345 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from config import Config
+
+_counters = {"uploads": 0, "deduplicated": 0, "upload_bytes": 0, "failures": 0, "cache_evictions": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name, n=1):
+    with _counters_lock:
+        _counters[name] += n
+
+
+def storage_stats():
+    with _counters_lock:
+        return dict(_counters)
+
+
+def content_key(namespace: str, data: bytes, extension: str) -> str:
+    """
+    Content-addressed object key, e.g. outputs/3f/3fa9...c1.png, so equal
+    bytes are stored (and served) once.
+    """
+    return digest_key(namespace, hashlib.sha256(data).hexdigest(), extension)
+
+
+def digest_key(namespace: str, digest: str, extension: str) -> str:
+    # content_key() for data hashed while it was being written
+    return f"{namespace}/{digest[:2]}/{digest}{extension}"
+
+
+def public_url(key: str) -> str:
+    # Stable URL stored on Generation rows; /files/<key> serves or redirects it
+    return f"{Config.STORAGE_BASE_URL}/{key}"
+
+
+def key_from_url(url: str) -> Optional[str]:
+    prefix = f"{Config.STORAGE_BASE_URL}/"
+    return url[len(prefix):] if url and url.startswith(prefix) else None
+
+
+# ----------------------------
+# Local file cache
+# ----------------------------
+
+class FileCache:
+    """
+    Files under `root` by name, evicted least-recently-used first once
+    they add up to more than `max_bytes`. `on_evict()` is called for each
+    file removed. Recency is kept in the access time, so a file's mtime
+    (and the ETag and Last-Modified served from it) never changes.
+    """
+
+    def __init__(self, root: str, max_bytes: int, on_evict: Optional[Callable[[], None]] = None):
+        self._root = root
+        self._max_bytes = max_bytes
+        self._on_evict = on_evict
+        self._size = None
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[str]:
+        path = self._path(name)
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))  # bump recency for LRU
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, name: str, write: Callable) -> str:
+        """
+        Fill a temporary file with `write(fileobj)` and move it into place.
+        Returns the file's path.
+        """
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmp, "wb") as out:
+                write(out)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        with self._lock:
+            # A first scan already finds the new file
+            self._size = self._size + size if self._size is not None else self._scan_size()
+            if self._size > self._max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _path(self, name: str) -> str:
+        root = os.path.realpath(self._root)
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.commonpath([root, path]) != root:
+            raise KeyError(f"Invalid key: {name}")
+        return path
+
+    def _entries(self):
+        for directory, _, files in os.walk(self._root):
+            for filename in files:
+                if ".tmp" in filename:
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_atime, stat.st_size
+
+    def _scan_size(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+    def _evict(self, keep: str):
+        # Oldest first until we're back under 90% of the cap
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        target = int(self._max_bytes * 0.9)
+        for path, _, size in entries:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if self._on_evict is not None:
+                self._on_evict()
+        self._size = total
+
+
+# ----------------------------
+# Backends
+# ----------------------------
+
+class LocalStorage:
+    """
+    Objects as files under `root`. Enough for a single node, or several
+    sharing a volume.
+    """
+
+    def __init__(self, root: str):
+        self._root = root
+
+    def _path(self, key: str) -> str:
+        path = os.path.realpath(os.path.join(self._root, key))
+        if os.path.commonpath([os.path.realpath(self._root), path]) != os.path.realpath(self._root):
+            raise KeyError(f"Invalid key: {key}")
+        return path
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def put(self, key: str, data: bytes, content_type: Optional[str] = None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None):
+        # Moves `path` into place
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(path, target)
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def local_path(self, key: str) -> str:
+        path = self._path(key)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(key)
+        return path
+
+    def url(self, key: str) -> Optional[str]:
+        return None  # served by the app itself
+
+
+class S3Storage:
+    """
+    Objects in an S3-compatible bucket (AWS, MinIO, ...). Objects are
+    immutable, so `local_path` keeps a read-through copy on local disk,
+    least-recently-used copies evicted past `cache_max_bytes`.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, public_url: Optional[str] = None,
+                 url_ttl: int = 3600, cache_dir: str = "static/storage-cache",
+                 cache_max_bytes: int = 5 * 1024 * 1024 * 1024):
+        import boto3
+
+        self._bucket = bucket
+        self._prefix = prefix
+        self._public_url = public_url
+        self._url_ttl = url_ttl
+        self._cache = FileCache(cache_dir, cache_max_bytes, on_evict=lambda: _count("cache_evictions"))
+        self._client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self._ensure_bucket()
+
+    def _ensure_bucket(self):
+        from botocore.exceptions import ClientError
+
+        try:
+            self._client.head_bucket(Bucket=self._bucket)
+        except ClientError:
+            self._client.create_bucket(Bucket=self._bucket)
+
+    def _key(self, key: str) -> str:
+        return f"{self._prefix}{key}"
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self._client.head_object(Bucket=self._bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put(self, key: str, data: bytes, content_type: Optional[str] = None):
+        self._client.put_object(
+            Bucket=self._bucket, Key=self._key(key), Body=data,
+            ContentType=content_type or "application/octet-stream",
+            CacheControl="public, max-age=31536000, immutable",
+        )
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None):
+        # Multipart upload straight from disk, then drops `path`
+        self._client.upload_file(path, self._bucket, self._key(key), ExtraArgs={
+            "ContentType": content_type or "application/octet-stream",
+            "CacheControl": "public, max-age=31536000, immutable",
+        })
+        os.remove(path)
+
+    def get(self, key: str) -> bytes:
+        return self._client.get_object(Bucket=self._bucket, Key=self._key(key))["Body"].read()
+
+    def local_path(self, key: str) -> str:
+        # Read-through copy, in an LRU capped at STORAGE_LOCAL_CACHE_MAX_BYTES
+        path = self._cache.get(key)
+        if path is None:
+            path = self._cache.put(key, lambda f: self._client.download_fileobj(self._bucket, self._key(key), f))
+        return path
+
+    def url(self, key: str) -> str:
+        if self._public_url:
+            return f"{self._public_url}/{self._key(key)}"
+        return self._client.generate_presigned_url(
+            "get_object", Params={"Bucket": self._bucket, "Key": self._key(key)}, ExpiresIn=self._url_ttl
+        )
+
+
+# ----------------------------
+# Background uploads
+# ----------------------------
+
+class Uploader:
+    """
+    Writes objects from a thread pool so the caller can go on encoding or
+    running inference. Keys are content-addressed, so an object that
+    already exists (or is being written) is not written again.
+    """
+
+    def __init__(self, storage, max_workers: int):
+        self._storage = storage
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage-upload")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.RLock()  # a finished future runs _forget() inside put_async
+
+    def put_async(self, key: str, data: bytes, content_type: Optional[str] = None) -> Future:
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._put, key, data, content_type)
+                self._pending[key] = future
+                future.add_done_callback(lambda _: self._forget(key))
+                return future
+        _count("deduplicated")
+        return future
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _put(self, key, data, content_type):
+        try:
+            if self._storage.exists(key):
+                _count("deduplicated")
+                return key
+            self._storage.put(key, data, content_type)
+        except Exception:
+            _count("failures")
+            raise
+        _count("uploads")
+        _count("upload_bytes", len(data))
+        return key
+
+
+_storage = None
+_uploader = None
+_init_lock = threading.Lock()
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        with _init_lock:
+            if _storage is None:
+                if Config.STORAGE_BACKEND == "s3":
+                    _storage = S3Storage(
+                        Config.S3_BUCKET, prefix=Config.S3_PREFIX, endpoint_url=Config.S3_ENDPOINT_URL,
+                        region=Config.S3_REGION, public_url=Config.S3_PUBLIC_URL,
+                        url_ttl=Config.S3_URL_TTL, cache_dir=Config.STORAGE_LOCAL_CACHE_DIR,
+                        cache_max_bytes=Config.STORAGE_LOCAL_CACHE_MAX_BYTES,
+                    )
+                elif Config.STORAGE_BACKEND == "local":
+                    _storage = LocalStorage(Config.STORAGE_ROOT)
+                else:
+                    raise ValueError(f"Unknown storage backend: {Config.STORAGE_BACKEND}")
+    return _storage
+
+
+def get_uploader() -> Uploader:
+    # Created on first use, so the pool's threads start after Celery forks
+    global _uploader
+    if _uploader is None:
+        storage = get_storage()
+        with _init_lock:
+            if _uploader is None:
+                _uploader = Uploader(storage, Config.STORAGE_UPLOAD_THREADS)
+    return _uploader
@@ -0,0 +1,74 @@
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from db.database import db
+from db.models import GenerationStep
+from services.metrics import JOB_SECONDS, JOBS, STAGE_SECONDS
+
+
+class StageTracer:
+    """
+    Times the pipeline stages of one Generation.
+
+    Each `stage()` observes pixelart_stage_seconds and records a
+    GenerationStep. Steps are only added to the session by `finish()`, so
+    they are written together with the job's final status in one commit
+    instead of one commit per step.
+    """
+
+    def __init__(self, generation, model_name, on_stage=None):
+        self.generation = generation
+        self.model_name = model_name
+        self.steps = []
+        self._on_stage = on_stage
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, progress=None, description=None):
+        if progress is not None:
+            self.generation.progress = progress
+        if self._on_stage is not None:
+            self._on_stage(self.generation, name)
+
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        step_data = None
+        try:
+            yield
+        except Exception as e:
+            step_data = {"error": str(e)}
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            STAGE_SECONDS.labels(name, self.model_name).observe(elapsed)
+            self.steps.append(GenerationStep(
+                generation_id=self.generation.id,
+                step_number=len(self.steps) + 1,
+                step_name=name,
+                step_description=description,
+                step_data=step_data,
+                started_at=started_at,
+                completed_at=datetime.utcnow(),
+                processing_time=elapsed,
+            ))
+
+    def observe(self, name, seconds):
+        """
+        Record time spent in a sub-stage measured elsewhere (e.g. in a pool
+        process) in pixelart_stage_seconds, without a GenerationStep.
+        """
+        STAGE_SECONDS.labels(name, self.model_name).observe(seconds)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    def finish(self, status):
+        """
+        Stage the buffered steps for the caller's next commit and record
+        the job outcome.
+        """
+        db.session.add_all(self.steps)
+        JOBS.labels(self.model_name, status).inc()
+        JOB_SECONDS.labels(self.model_name).observe(self.elapsed)
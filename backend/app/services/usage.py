@@ -0,0 +1,326 @@
+import atexit
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+
+from config import Config
+from services.redis_client import get_redis
+
+_BUCKET_KEY = "pixelart:usage:{}:{}"  # user id, minute
+_BUCKET_SECONDS = 60
+
+_counters = {"recorded": 0, "dropped": 0, "flushed": 0, "failed": 0, "flushes": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name, n=1):
+    with _counters_lock:
+        _counters[name] += n
+
+
+def usage_stats():
+    with _counters_lock:
+        stats = dict(_counters)
+    stats["buffered"] = len(_log) if _log is not None else 0
+    return stats
+
+
+# ----------------------------
+# Rolled-up counters
+# ----------------------------
+
+class UsageRollup:
+    """
+    Per-user request counts in one-minute buckets plus per-user/endpoint
+    totals, kept in memory so quota checks never count api_usage rows.
+    Buckets older than `window` seconds are pruned as new ones open.
+    """
+
+    def __init__(self, window: int):
+        self._window = window
+        self._buckets: Dict[Optional[int], Dict[int, int]] = {}
+        self._endpoints: Dict[Tuple[Optional[int], str], int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, user_id, endpoint, now=None):
+        minute = int((now or time.time()) // _BUCKET_SECONDS)
+        with self._lock:
+            buckets = self._buckets.setdefault(user_id, {})
+            if minute not in buckets:
+                oldest = minute - self._window // _BUCKET_SECONDS
+                for stale in [m for m in buckets if m <= oldest]:
+                    del buckets[stale]
+            buckets[minute] = buckets.get(minute, 0) + 1
+            key = (user_id, endpoint)
+            self._endpoints[key] = self._endpoints.get(key, 0) + 1
+
+    def recent(self, user_id, window=None) -> int:
+        since = int(time.time() // _BUCKET_SECONDS) - (window or self._window) // _BUCKET_SECONDS
+        with self._lock:
+            return sum(n for m, n in self._buckets.get(user_id, {}).items() if m > since)
+
+    def by_endpoint(self, user_id) -> Dict[str, int]:
+        with self._lock:
+            return {endpoint: n for (uid, endpoint), n in self._endpoints.items() if uid == user_id}
+
+
+rollup = UsageRollup(Config.FAIR_SHARE_WINDOW)
+
+
+def recent_usage(user_id, window=None) -> int:
+    """
+    Requests by `user_id` over the last `window` seconds (FAIR_SHARE_WINDOW
+    by default). Summed from the per-minute Redis buckets every web process
+    flushes into, else from this process's own rollup.
+    """
+    window = window or Config.FAIR_SHARE_WINDOW
+    client = get_redis()
+    if client is not None:
+        now = int(time.time() // _BUCKET_SECONDS)
+        keys = [_BUCKET_KEY.format(user_id, m) for m in range(now - window // _BUCKET_SECONDS + 1, now + 1)]
+        try:
+            return sum(int(n) for n in client.mget(keys) if n is not None)
+        except Exception as e:
+            print("Usage bucket read failed:", e)
+    return rollup.recent(user_id, window)
+
+
+# ----------------------------
+# Buffered log
+# ----------------------------
+
+class UsageLog:
+    """
+    Bounded in-process buffer of ApiUsage events with a background flusher.
+
+    `record()` never blocks on I/O: it appends to a buffer of at most
+    `capacity` events and counts a drop when the buffer is full. The
+    flusher writes whatever is buffered every `flush_ms` milliseconds, or
+    as soon as `flush_size` events are waiting, as one bulk INSERT (or one
+    RPUSH for the "redis" sink, for usage_consumer.py to insert).
+    `close()` flushes what's left; it runs at interpreter exit.
+    """
+
+    def __init__(self, app, sink: str, capacity: int, flush_size: int, flush_ms: float):
+        if sink not in ("db", "redis"):
+            raise ValueError(f"Unknown usage sink: {sink}")
+        self._app = app
+        self._sink = sink
+        self._capacity = capacity
+        self._flush_size = flush_size
+        self._flush_interval = flush_ms / 1000.0
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def record(self, user_id, endpoint, method, ip_address, user_agent):
+        rollup.add(user_id, endpoint)
+        event = {
+            "user_id": user_id,
+            "endpoint": endpoint[:200],
+            "method": method[:10],
+            "ip_address": (ip_address or "")[:100] or None,
+            "user_agent": (user_agent or "")[:255] or None,
+            "timestamp": datetime.utcnow(),
+        }
+        with self._cond:
+            if self._closed or len(self._buffer) >= self._capacity:
+                _count("dropped")
+                return
+            self._buffer.append(event)
+            if len(self._buffer) >= self._flush_size:
+                self._cond.notify()
+        _count("recorded")
+        self._ensure_started()
+
+    def _ensure_started(self):
+        # Started lazily so the thread is created after the server forks its workers
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="usage-flusher", daemon=True)
+                self._thread.start()
+
+    def _take(self) -> List[dict]:
+        count = min(len(self._buffer), self._flush_size)
+        return [self._buffer.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._buffer) < self._flush_size and not self._closed:
+                    self._cond.wait(self._flush_interval)
+                batch = self._take()
+                closed = self._closed
+            if batch:
+                self._flush(batch)
+            if closed and not batch:
+                return
+
+    def _flush(self, events: List[dict]):
+        try:
+            if self._sink == "redis":
+                _push(events)
+            else:
+                with self._app.app_context():
+                    write_events(events)
+            _add_to_buckets(events)
+        except Exception as e:
+            print(f"Usage flush of {len(events)} events failed:", e)
+            _count("failed", len(events))
+            return
+        _count("flushed", len(events))
+        _count("flushes")
+
+    def close(self, timeout: float = 10.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        else:
+            # Never started: nothing was recorded in this process
+            while self._buffer:
+                self._flush(self._take())
+
+
+def write_events(events: List[dict]):
+    """
+    Bulk-insert usage events. Events for users that don't exist are kept
+    without a user_id rather than failing the whole batch on the foreign key.
+    """
+    from db.database import db
+    from db.models import ApiUsage, User
+
+    user_ids = {e["user_id"] for e in events if e["user_id"] is not None}
+    if user_ids:
+        known = set(db.session.execute(select(User.id).where(User.id.in_(user_ids))).scalars())
+        events = [e if e["user_id"] in known or e["user_id"] is None else {**e, "user_id": None} for e in events]
+    try:
+        db.session.execute(insert(ApiUsage), events)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _add_to_buckets(events: List[dict]):
+    # Shared per-minute counts for recent_usage(), one round trip per flush
+    client = get_redis()
+    if client is None:
+        return
+    counts: Dict[str, int] = {}
+    for event in events:
+        if event["user_id"] is not None:
+            minute = int(event["timestamp"].timestamp() // _BUCKET_SECONDS)
+            key = _BUCKET_KEY.format(event["user_id"], minute)
+            counts[key] = counts.get(key, 0) + 1
+    if not counts:
+        return
+    pipe = client.pipeline(transaction=False)
+    for key, n in counts.items():
+        pipe.incrby(key, n)
+        pipe.expire(key, Config.FAIR_SHARE_WINDOW + _BUCKET_SECONDS)
+    pipe.execute()
+
+
+def _push(events: List[dict]):
+    client = get_redis()
+    if client is None:
+        raise RuntimeError("USAGE_SINK=redis needs REDIS_URL")
+    payload = [json.dumps({**e, "timestamp": e["timestamp"].isoformat()}) for e in events]
+    pipe = client.pipeline(transaction=False)
+    pipe.rpush(Config.USAGE_REDIS_KEY, *payload)
+    pipe.ltrim(Config.USAGE_REDIS_KEY, -Config.USAGE_REDIS_MAX_LEN, -1)
+    pipe.execute()
+
+
+def consume(batch_size: int, block_seconds: int = 5) -> int:
+    """
+    Move up to `batch_size` events pushed by the "redis" sink into
+    api_usage. Blocks up to `block_seconds` for the first one; returns the
+    number written. Runs inside an app context.
+
+    Events are first moved atomically to a processing list and only
+    dropped from it once their INSERT has committed. A batch that failed
+    (or whose consumer died) stays there and is retried on the next call,
+    before any new events are taken. Meant for a single consumer.
+    """
+    client = get_redis()
+    processing = f"{Config.USAGE_REDIS_KEY}:processing"
+    raw_events = client.lrange(processing, 0, -1)
+    if not raw_events:
+        if client.blmove(Config.USAGE_REDIS_KEY, processing, block_seconds, "LEFT", "RIGHT") is None:
+            return 0
+        pipe = client.pipeline()  # MULTI: the moves happen all at once or not at all
+        for _ in range(batch_size - 1):
+            pipe.lmove(Config.USAGE_REDIS_KEY, processing, "LEFT", "RIGHT")
+        pipe.execute()
+        raw_events = client.lrange(processing, 0, -1)
+
+    events = []
+    for raw in raw_events:
+        try:
+            event = json.loads(raw)
+            event["timestamp"] = datetime.fromisoformat(event["timestamp"])
+        except (ValueError, KeyError, TypeError) as e:
+            print("Dropping malformed usage event:", e)
+            continue
+        events.append(event)
+    if events:
+        write_events(events)
+    client.delete(processing)
+    return len(events)
+
+
+# ----------------------------
+# Flask integration
+# ----------------------------
+
+_log: Optional[UsageLog] = None
+
+
+def init_app(app):
+    """
+    Log every routed request (except those in USAGE_EXCLUDE) to ApiUsage
+    through a buffered UsageLog.
+    """
+    global _log
+    if not Config.USAGE_LOG_ENABLED:
+        return
+    from flask import g, request
+
+    _log = UsageLog(app, Config.USAGE_SINK, Config.USAGE_BUFFER_SIZE,
+                    Config.USAGE_FLUSH_SIZE, Config.USAGE_FLUSH_MS)
+    atexit.register(_log.close)
+
+    @app.after_request
+    def _record(response):
+        rule = request.url_rule.rule if request.url_rule else None
+        if rule is not None and rule not in Config.USAGE_EXCLUDE:
+            user_id = g.get("user_id")
+            if user_id is None:
+                user_id = request.args.get("user_id", type=int)
+            _log.record(user_id, rule, request.method, request.remote_addr,
+                        request.headers.get("User-Agent"))
+        return response
+
+
+def record(user_id, endpoint, method, ip_address, user_agent):
+    """
+    Log one request handled outside Flask (the ASGI routes); a no-op
+    unless init_app() enabled logging.
+    """
+    if _log is not None and endpoint not in Config.USAGE_EXCLUDE:
+        _log.record(user_id, endpoint, method, ip_address, user_agent)
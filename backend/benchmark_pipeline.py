@@ -0,0 +1,384 @@
+"""
+End-to-end benchmark for the generation pipeline.
+
+Measures model load/warm-up, single and batched predict latency, the
+micro-batcher under concurrent load, pre/post-processing cost, and HTTP
+submission throughput for /generate/text and /generate/image against a
+local Flask app (SQLite + in-memory Celery broker, nothing leaves the
+process). When the real .keras files are missing, tiny stand-in Keras
+models with the same (32, 32, 3) interface are built instead.
+
+    python benchmark_pipeline.py --output bench.json
+    python benchmark_pipeline.py --output new.json --baseline bench.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BASE_DIR, "app")
+TEST_IMAGE_PATH = os.path.join(BASE_DIR, "test_assets", "KakaoTalk_20250708_231845951.jpg")
+
+sys.path.insert(0, APP_DIR)
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+
+def percentiles(samples):
+    arr = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "n": int(arr.size),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+    }
+
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def build_stand_in_model(path):
+    from tensorflow import keras
+
+    inputs = keras.Input(shape=(32, 32, 3))
+    x = keras.layers.Conv2D(16, 3, padding="same", activation="relu")(inputs)
+    x = keras.layers.Conv2D(16, 3, padding="same", activation="relu")(x)
+    outputs = keras.layers.Conv2D(3, 1, activation="sigmoid")(x)
+    keras.Model(inputs, outputs).save(path)
+
+
+def use_work_dir(work_dir):
+    """
+    Point everything at throwaway local state under `work_dir`; must run
+    before config is first imported.
+    """
+    os.environ.setdefault("MYSQL_PORT", "3306")
+    os.environ["RESULT_CACHE_DIR"] = os.path.join(work_dir, "cache")
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["STORAGE_ROOT"] = os.path.join(work_dir, "storage")
+    os.environ.pop("REDIS_URL", None)
+    os.environ.pop("RESULT_CACHE_REDIS_URL", None)
+    os.chdir(work_dir)
+
+
+def resolve_model_paths(work_dir):
+    from config import Config
+
+    paths = {"text": Config.TEXT_MODEL_PATH, "image": Config.IMAGE_MODEL_PATH}
+    stand_in = False
+    for name, path in list(paths.items()):
+        if not os.path.exists(path):
+            path = os.path.join(work_dir, f"{name}_stand_in.keras")
+            build_stand_in_model(path)
+            paths[name] = path
+            stand_in = True
+    # Before models.registry is imported, so the shared registry loads these too
+    Config.TEXT_MODEL_PATH = paths["text"]
+    Config.IMAGE_MODEL_PATH = paths["image"]
+    return paths, stand_in
+
+
+# ----------------------------
+# Benchmarks
+# ----------------------------
+
+def bench_model_load(paths):
+    from models.registry import ModelRegistry
+
+    fresh = ModelRegistry(paths)
+    fresh.preload()
+    return fresh.stats()
+
+
+def bench_predict(batch_sizes, repeats):
+    from models.registry import registry
+
+    results = {}
+    for name in ("text", "image"):
+        model = registry.get(name)
+        results[name] = {}
+        for batch_size in batch_sizes:
+            inputs = np.random.rand(batch_size, 32, 32, 3).astype(np.float32)
+            model.predict(inputs, verbose=0)  # trace this batch shape once
+            stats = percentiles(timed(lambda: model.predict(inputs, verbose=0), repeats))
+            stats["per_image_p50_ms"] = stats["p50_ms"] / batch_size
+            results[name][str(batch_size)] = stats
+    return results
+
+
+def bench_micro_batching(concurrency, requests_per_thread):
+    from services.batching import MicroBatcher
+    from models.registry import registry
+
+    model = registry.get("text")
+    batcher = MicroBatcher(lambda inputs: model.predict(inputs, verbose=0))
+    sample = np.random.rand(1, 32, 32, 3).astype(np.float32)
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        local = timed(lambda: batcher.predict(sample), requests_per_thread)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    result = percentiles(latencies)
+    result["images_per_sec"] = len(latencies) / elapsed
+    result["batching"] = batcher.metrics.to_dict()
+    return result
+
+
+def bench_preprocess(repeats):
+    from PIL import Image
+    from services.ingest import decode_to_array
+
+    results = {}
+    if os.path.exists(TEST_IMAGE_PATH):
+        results["decode_draft_32"] = percentiles(
+            timed(lambda: decode_to_array(TEST_IMAGE_PATH, (32, 32)), repeats)
+        )
+        results["decode_full_resize_32"] = percentiles(timed(
+            lambda: Image.open(TEST_IMAGE_PATH).convert("RGB").resize((32, 32)), repeats
+        ))
+    return results
+
+
+def bench_postprocess(batch_sizes, resolutions, repeats):
+    from services.palette import BUILTIN_PALETTES
+    from services.pipeline import render
+
+    classic = BUILTIN_PALETTES["classic"]
+    results = {}
+    for batch_size in batch_sizes:
+        outputs = np.random.rand(batch_size, 32, 32, 3).astype(np.float32)
+        for resolution in resolutions:
+            results[f"{batch_size}@{resolution}"] = percentiles(
+                timed(lambda: render(outputs, resolution, classic), repeats)
+            )
+    return results
+
+
+def bench_postprocess_pool(concurrency, jobs_per_thread):
+    """
+    Postprocess throughput with `concurrency` worker threads, inline in the
+    threads versus through the encode process pool.
+    """
+    from config import Config
+    from services.pipeline import StagePool, postprocess
+    import services.pipeline as pipeline
+
+    outputs = np.random.rand(4, 32, 32, 3).astype(np.float32)
+    results = {}
+    for mode, processes in (("inline", 0), ("pool", Config.PIPELINE_ENCODE_PROCESSES)):
+        pipeline._encode_pool = StagePool("encode", processes, Config.PIPELINE_QUEUE_DEPTH)
+        postprocess(outputs, "32x32", "classic")  # start the pool's processes
+        latencies = []
+        lock = threading.Lock()
+
+        def client():
+            local = timed(lambda: postprocess(outputs, "32x32", "classic"), jobs_per_thread)
+            with lock:
+                latencies.extend(local)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        pipeline._encode_pool.shutdown()
+
+        results[mode] = percentiles(latencies)
+        results[mode]["jobs_per_sec"] = len(latencies) / elapsed
+    return results
+
+
+def _jpeg_bytes(seed):
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    buf = io.BytesIO()
+    Image.fromarray(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def bench_http(work_dir, requests_count):
+    from config import Config
+
+    Config.SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(work_dir, "bench.db")
+
+    from main import create_app
+    from db.database import db
+    import celery_worker
+
+    # Publish into kombu's in-memory transport; nothing consumes it
+    celery_worker.celery.conf.broker_url = "memory://"
+    celery_worker.celery.conf.result_backend = None
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+
+    def run(send):
+        samples, statuses = [], {}
+        started = time.perf_counter()
+        for i in range(requests_count):
+            t0 = time.perf_counter()
+            status = send(i).status_code
+            samples.append(time.perf_counter() - t0)
+            statuses[status] = statuses.get(status, 0) + 1
+        elapsed = time.perf_counter() - started
+        result = percentiles(samples)
+        result["requests_per_sec"] = requests_count / elapsed
+        result["status_codes"] = {str(k): v for k, v in statuses.items()}
+        return result
+
+    images = [_jpeg_bytes(i) for i in range(min(requests_count, 16))]
+    job_ids = []
+
+    def text(i):
+        response = client.post("/generate/text", json={
+            "text": f"bench prompt {i}", "style": "8bit", "resolution": "32x32", "color_palette": "classic"
+        })
+        if response.status_code == 200:
+            job_ids.append(response.get_json()["job_id"])
+        return response
+
+    results = {
+        "generate_text": run(text),
+        "generate_image": run(lambda i: client.post(
+            "/generate/image",
+            data={"image": (io.BytesIO(images[i % len(images)]), f"{i}.jpg"), "resolution": "32x32"},
+            content_type="multipart/form-data",
+        )),
+    }
+    # Rows the text requests above created, so this times lookups that find a job
+    if job_ids:
+        results["status"] = run(lambda i: client.get(f"/generation/{job_ids[i % len(job_ids)]}/status"))
+
+    # Flush the buffered usage rows while bench.db is still there
+    from services import usage
+    if usage._log is not None:
+        usage._log.close()
+    return results
+
+
+# ----------------------------
+# Regression check
+# ----------------------------
+
+def compare(current, baseline, tolerance, path=""):
+    """
+    Every *_ms metric that got slower than baseline by more than `tolerance`.
+    """
+    regressions = []
+    for key, value in current.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        where = f"{path}.{key}" if path else key
+        if isinstance(value, dict) and isinstance(old, dict):
+            regressions.extend(compare(value, old, tolerance, where))
+        elif key.endswith("_ms") and isinstance(old, (int, float)) and old > 0:
+            change = (value - old) / old
+            if change > tolerance:
+                regressions.append({"metric": where, "baseline": old, "current": value,
+                                    "change": round(change, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--baseline", help="previous results to diff against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown before a metric counts as a regression")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16,32")
+    parser.add_argument("--resolutions", default="16x16,32x32,64x64,128x128")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--http-requests", type=int, default=200)
+    args = parser.parse_args()
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    resolutions = args.resolutions.split(",")
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="pixelart-bench-")
+    try:
+        use_work_dir(work_dir)
+        paths, stand_in = resolve_model_paths(work_dir)
+        print(f"[📦] Models: {paths}{' (stand-ins)' if stand_in else ''}")
+
+        results = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpu_count": os.cpu_count(),
+                "stand_in_models": stand_in,
+                "repeats": args.repeats,
+            }
+        }
+
+        print("[⏱️] model load")
+        results["model_load"] = bench_model_load(paths)
+        print("[⏱️] predict")
+        results["predict"] = bench_predict(batch_sizes, args.repeats)
+        print("[⏱️] micro-batching")
+        results["micro_batching"] = bench_micro_batching(args.concurrency, args.repeats)
+        print("[⏱️] preprocess")
+        results["preprocess"] = bench_preprocess(args.repeats)
+        print("[⏱️] postprocess")
+        results["postprocess"] = bench_postprocess(batch_sizes, resolutions, args.repeats)
+        print("[⏱️] postprocess pool")
+        results["postprocess_pool"] = bench_postprocess_pool(args.concurrency, args.repeats)
+        print("[⏱️] http submission")
+        results["http"] = bench_http(work_dir, args.http_requests)
+
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[✅] Results written to {output}")
+
+        if baseline:
+            with open(baseline) as f:
+                regressions = compare(results, json.load(f), args.tolerance)
+            for r in regressions:
+                print(f"[❌] {r['metric']}: {r['baseline']:.3f} -> {r['current']:.3f} ms (+{r['change']:.0%})")
+            if regressions:
+                sys.exit(1)
+            print("[✅] No regressions against baseline")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
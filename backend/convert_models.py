@@ -0,0 +1,219 @@
+"""
+Convert the Keras models to TFLite or ONNX and check parity.
+
+Each model is converted next to its .keras file (see
+models.runtime.artifact_path), optionally quantized to float16 or int8,
+then run on the same inputs as the Keras original. Only a variant within
+the tolerance is moved into place; otherwise it is deleted, whatever was
+at its path is left alone and the script exits non-zero, so a bad variant
+never reaches the workers. Select a converted variant with
+TEXT_MODEL_BACKEND / TEXT_MODEL_QUANTIZATION (and IMAGE_*).
+
+    python convert_models.py --backend tflite --quantization int8
+    python convert_models.py --backend onnx --models image --output parity.json
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BASE_DIR, "app")
+TEST_ASSETS_DIR = os.path.join(BASE_DIR, "test_assets")
+
+os.environ.setdefault("MYSQL_PORT", "3306")
+sys.path.insert(0, APP_DIR)
+
+from config import Config  # noqa: E402
+from models import runtime  # noqa: E402
+
+SOURCES = {"text": Config.TEXT_MODEL_PATH, "image": Config.IMAGE_MODEL_PATH}
+
+# Max absolute output difference (outputs are in [0, 1]) allowed per quantization
+DEFAULT_TOLERANCE = {"none": 1e-4, "float16": 1e-2, "int8": 6e-2}
+
+
+# ----------------------------
+# Sample inputs
+# ----------------------------
+
+def sample_inputs(count, seed=0):
+    """
+    Calibration/parity inputs: the test images plus uniform noise, shaped
+    like Config.MODEL_INPUT_SHAPE and scaled to [0, 1] like real jobs.
+    """
+    _, height, width, _ = Config.MODEL_INPUT_SHAPE
+    samples = [
+        np.asarray(Image.open(path).convert("RGB").resize((width, height)), dtype=np.float32) / 255.0
+        for path in sorted(glob.glob(os.path.join(TEST_ASSETS_DIR, "*")))
+        if path.lower().endswith((".jpg", ".jpeg", ".png"))
+    ][:count]
+    rng = np.random.default_rng(seed)
+    while len(samples) < count:
+        samples.append(rng.random((height, width, 3), dtype=np.float32))
+    return np.stack(samples)
+
+
+# ----------------------------
+# Converters
+# ----------------------------
+
+def convert_tflite(model, path, quantization, calibration):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        # int8 weights and activations, float32 in/out so callers don't change
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([sample[np.newaxis]] for sample in calibration)
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+
+
+def convert_onnx(model, path, quantization, calibration):
+    # Conversion-only dependencies: pip install tf2onnx onnx onnxconverter-common
+    import onnx
+    import tensorflow as tf
+    import tf2onnx
+
+    fp32_path = path if quantization == "none" else f"{path}.fp32"
+    signature = [tf.TensorSpec((None,) + tuple(Config.MODEL_INPUT_SHAPE[1:]), tf.float32, name="input")]
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=13, output_path=fp32_path)
+    if quantization == "float16":
+        from onnxconverter_common import float16
+
+        onnx.save(float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True), path)
+    elif quantization == "int8":
+        from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_static
+
+        class Reader(CalibrationDataReader):
+            def __init__(self):
+                name = onnx.load(fp32_path).graph.input[0].name
+                self._batches = iter([{name: sample[np.newaxis]} for sample in calibration])
+
+            def get_next(self):
+                return next(self._batches, None)
+
+        quantize_static(fp32_path, path, Reader(), weight_type=QuantType.QInt8,
+                        activation_type=QuantType.QInt8)
+    if fp32_path != path:
+        os.remove(fp32_path)
+
+
+CONVERTERS = {"tflite": convert_tflite, "onnx": convert_onnx}
+
+
+# ----------------------------
+# Parity
+# ----------------------------
+
+def timed_predict(model, inputs, repeats):
+    model.predict(inputs, verbose=0)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        outputs = model.predict(inputs, verbose=0)
+    return outputs, (time.perf_counter() - started) / repeats
+
+
+def check_parity(keras_model, converted, inputs, repeats):
+    expected, keras_time = timed_predict(keras_model, inputs, repeats)
+    actual, converted_time = timed_predict(converted, inputs, repeats)
+    diff = np.abs(np.asarray(expected, dtype=np.float32) - actual)
+    return {
+        "max_abs_error": float(diff.max()),
+        "mean_abs_error": float(diff.mean()),
+        # Share of output values that still land on the same 8-bit level
+        "pixel_agreement": float(np.mean(np.round(expected * 255) == np.round(actual * 255))),
+        "keras_predict_ms": keras_time * 1000.0,
+        "converted_predict_ms": converted_time * 1000.0,
+    }
+
+
+def convert(name, backend, quantization, args):
+    from tensorflow.keras.models import load_model
+
+    source = SOURCES[name]
+    path = runtime.artifact_path(source, backend, quantization)
+    keras_model = load_model(source, compile=False)
+    tolerance = args.tolerance if args.tolerance is not None else DEFAULT_TOLERANCE[quantization]
+
+    # Converted and checked under a temporary name; only a passing artifact
+    # replaces the one the registry loads
+    tmp = f"{path}.tmp{os.getpid()}"
+    try:
+        started = time.perf_counter()
+        CONVERTERS[backend](keras_model, tmp, quantization, sample_inputs(args.calibration_samples))
+        convert_time = time.perf_counter() - started
+
+        converted = runtime.load(tmp, backend)
+        parity = check_parity(keras_model, converted, sample_inputs(args.batch_size, seed=1), args.repeats)
+        artifact_bytes = os.path.getsize(tmp)
+        passed = parity["max_abs_error"] <= tolerance
+        if passed:
+            os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    return {
+        "model": name,
+        "source": source,
+        "path": path,
+        "backend": backend,
+        "quantization": quantization,
+        "convert_time": convert_time,
+        "source_bytes": os.path.getsize(source),
+        "artifact_bytes": artifact_bytes,
+        "tolerance": tolerance,
+        "passed": passed,
+        **parity,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", choices=sorted(CONVERTERS), default="tflite")
+    parser.add_argument("--quantization", choices=runtime.QUANTIZATIONS, default="none")
+    parser.add_argument("--models", default="text,image")
+    parser.add_argument("--tolerance", type=float,
+                        help="max absolute output error (default depends on --quantization)")
+    parser.add_argument("--calibration-samples", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", help="write the parity report as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.models.split(","):
+        print(f"[🔁] {name}: {args.backend} ({args.quantization})")
+        result = convert(name, args.backend, args.quantization, args)
+        results.append(result)
+        print(
+            f"[{'✅' if result['passed'] else '❌'}] {result['path']}: "
+            f"max error {result['max_abs_error']:.5f} (tolerance {result['tolerance']}), "
+            f"agreement {result['pixel_agreement']:.2%}, "
+            f"{result['source_bytes'] / 2**20:.1f} -> {result['artifact_bytes'] / 2**20:.1f} MiB, "
+            f"predict {result['keras_predict_ms']:.2f} -> {result['converted_predict_ms']:.2f} ms"
+        )
+        if not result["passed"]:
+            print(f"[❌] Discarded; {result['path']} was left as it was")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[✅] Report written to {args.output}")
+
+    if not all(result["passed"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Import-time breakdown of app startup.
+
+Runs create_app() in a fresh interpreter under `python -X importtime` and
+reports the slowest imports, the time per top-level package, and which
+import chain pulled in an inference runtime (TensorFlow, Keras, ONNX
+Runtime, TFLite). Exits non-zero when the web process imports one of
+those runtimes or startup takes longer than --max-seconds, so it can
+gate CI.
+
+    python startup_report.py
+    python startup_report.py --process-type worker --output startup.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BASE_DIR, "app")
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+_SCRIPT = """
+import json
+from main import create_app
+app = create_app({process_type!r})
+print(json.dumps(app.config["STARTUP_REPORT"]))
+"""
+
+
+def run_startup(process_type):
+    env = dict(os.environ)
+    env.setdefault("MYSQL_PORT", "3306")
+    env["PROCESS_TYPE"] = process_type
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _SCRIPT.format(process_type=process_type)],
+        cwd=APP_DIR, env=env, capture_output=True, text=True,
+    )
+    wall_time = time.perf_counter() - started
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        sys.exit(proc.returncode)
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    return report, parse_importtime(proc.stderr), wall_time
+
+
+def parse_importtime(output):
+    """
+    One entry per line of -X importtime output, with the chain of imports
+    that led to it. The output is post-order: a module's children are
+    printed before it, one indentation level deeper.
+    """
+    rows = []
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+
+    imports = []
+    # Walk backwards so each module's parent is seen before its children
+    parents = []
+    for module, self_us, cumulative_us, depth in reversed(rows):
+        del parents[depth:]
+        imports.append({
+            "module": module,
+            "self_ms": self_us / 1000.0,
+            "cumulative_ms": cumulative_us / 1000.0,
+            "chain": parents + [module],
+        })
+        parents.append(module)
+    imports.reverse()
+    return imports
+
+
+def summarize(imports, loaded, top):
+    by_package = {}
+    for entry in imports:
+        package = entry["module"].split(".")[0]
+        by_package[package] = by_package.get(package, 0.0) + entry["self_ms"]
+
+    # Outermost import of each runtime that actually loaded (failed
+    # optional imports show up in the output too)
+    heavy = {}
+    for entry in reversed(imports):
+        package = entry["module"].split(".")[0]
+        if package in loaded and package not in heavy:
+            heavy[package] = " -> ".join(entry["chain"])
+
+    return {
+        "import_ms": sum(entry["self_ms"] for entry in imports),
+        "slowest_imports": sorted(
+            ({"module": e["module"], "cumulative_ms": e["cumulative_ms"]} for e in imports),
+            key=lambda e: e["cumulative_ms"], reverse=True,
+        )[:top],
+        "packages": dict(sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]),
+        "heavy_imports": heavy,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--process-type", choices=("web", "worker"), default="web")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-seconds", type=float, help="fail when create_app takes longer")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    report, imports, wall_time = run_startup(args.process_type)
+    summary = summarize(imports, report["heavy_modules"], args.top)
+
+    print(f"[⏱️] {args.process_type}: interpreter + create_app {wall_time * 1000:.0f} ms, "
+          f"create_app {report['total'] * 1000:.0f} ms, imports {summary['import_ms']:.0f} ms")
+    for phase, seconds in report["phases"].items():
+        print(f"    {phase:<10} {seconds * 1000:8.1f} ms")
+    print("[📦] Slowest imports (cumulative)")
+    for entry in summary["slowest_imports"]:
+        print(f"    {entry['cumulative_ms']:8.1f} ms  {entry['module']}")
+    print("[📦] Time per package (self)")
+    for package, ms in summary["packages"].items():
+        print(f"    {ms:8.1f} ms  {package}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"process_type": args.process_type, "wall_time": wall_time,
+                       "startup": report, **summary}, f, indent=2)
+        print(f"[✅] Report written to {args.output}")
+
+    failed = False
+    for package, chain in summary["heavy_imports"].items():
+        print(f"[{'❌' if args.process_type == 'web' else 'ℹ️'}] {package} imported via {chain}")
+        failed = failed or args.process_type == "web"
+    if args.max_seconds is not None and report["total"] > args.max_seconds:
+        print(f"[❌] create_app took {report['total']:.2f}s (limit {args.max_seconds:.2f}s)")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("[✅] Startup within limits")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import os
+import sys
 import numpy as np
-from keras.models import load_model
 from PIL import Image
 
 # === CONFIG ===
@@ -10,6 +10,12 @@ MODEL_TEXT_PATH = os.path.join(BASE_DIR, "app", "models", "ModelPixelArt.keras")
 MODEL_IMAGE_PATH = os.path.join(BASE_DIR, "app", "models", "MB5.keras")
 TEST_IMAGE_PATH = os.path.join(BASE_DIR, "test_assets", "KakaoTalk_20250708_231845951.jpg")
 
+sys.path.insert(0, os.path.join(BASE_DIR, "app"))
+from models.registry import ModelRegistry
+
+# Each model is loaded (and warmed up) once and shared by every check below
+registry = ModelRegistry({MODEL_TEXT_PATH: MODEL_TEXT_PATH, MODEL_IMAGE_PATH: MODEL_IMAGE_PATH})
+
 def load_image_for_model(path, size=(32, 32)):
     try:
         img = Image.open(path).convert("RGB").resize(size)
@@ -23,8 +29,9 @@ def load_image_for_model(path, size=(32, 32)):
 def test_model(model_path, input_shape):
     try:
         print(f"[📦] Loading model: {model_path}")
-        model = load_model(model_path, compile=False)
+        model = registry.get(model_path)
         model.summary()
+        print(f"[⏱️] {registry.stats()[model_path]}")
 
         dummy_input = np.random.rand(*input_shape).astype(np.float32)
         output = model.predict(dummy_input)
@@ -41,7 +48,7 @@ def test_model_with_image(model_path, image_path):
         return
 
     try:
-        model = load_model(model_path, compile=False)
+        model = registry.get(model_path)
         output = model.predict(img_input)
         print(f"[✅] Prediction succeeded. Output shape: {output.shape}")
     except Exception as e:
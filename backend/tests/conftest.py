@@ -0,0 +1,29 @@
+"""
+Unit tests for the services that don't need MySQL, a broker or the
+models. Redis is replaced by fakeredis.
+
+    pip install -r requirements-dev.txt
+    python -m pytest
+"""
+import os
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("MYSQL_PORT", "3306")
+sys.path.insert(0, os.path.join(BASE_DIR, "app"))
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    """
+    A fresh in-memory Redis, returned by redis_client.get_redis().
+    """
+    import fakeredis
+    from services import redis_client
+
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(redis_client, "_client", client)
+    return client
@@ -0,0 +1,112 @@
+import pytest
+
+from config import Config
+from services import admission, redis_client
+from services.scheduler import QuotaExceeded
+from services.admission import LoadEstimator, QueueLoad
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    monkeypatch.setattr(Config, "ADMISSION_MODE", "degrade")
+    monkeypatch.setattr(Config, "ADMISSION_SLO_SECONDS", {"interactive": 30, "bulk": 900})
+    monkeypatch.setattr(Config, "ADMISSION_SHED_FACTOR", 2.0)
+    monkeypatch.setattr(Config, "ADMISSION_WORKER_SLOTS", {"interactive": 4, "bulk": 2})
+    monkeypatch.setattr(Config, "ADMISSION_DEFAULT_JOB_SECONDS", 2.0)
+    monkeypatch.setattr(Config, "ADMISSION_SAMPLES", 5)
+
+
+@pytest.fixture
+def wait(monkeypatch, settings):
+    """
+    Sets the estimated wait of the interactive queue seen by check().
+    """
+    def set_wait(seconds):
+        loads = {"interactive": QueueLoad(10, 1.0, seconds)}
+        monkeypatch.setattr(admission.estimator, "loads", lambda refresh=True: loads)
+    return set_wait
+
+
+def counted(before):
+    after = admission.admission_stats()
+    return {name: after[name] - before[name] for name in after if after[name] != before[name]}
+
+
+def test_estimate_from_queue_depth_and_recent_job_times(redis, settings):
+    redis.rpush("interactive", *["job"] * 6)
+    redis.rpush("interactive:3", *["job"] * 2)  # Celery's list for priority 3
+    for seconds in (1.0, 2.0, 3.0):
+        admission.record_processing_time("interactive", seconds)
+
+    loads = LoadEstimator(refresh=60).loads()
+
+    assert loads["interactive"] == QueueLoad(8, 2.0, 8 * 2.0 / 4)
+    # No samples yet: the default job time
+    assert loads["bulk"] == QueueLoad(0, Config.ADMISSION_DEFAULT_JOB_SECONDS, 0.0)
+
+
+def test_only_recent_job_times_are_kept(redis, settings):
+    for seconds in range(10):
+        admission.record_processing_time("bulk", seconds)
+    admission.record_processing_time(None, 100)  # jobs without a queue aren't recorded
+
+    assert sorted(float(t) for t in redis.lrange("pixelart:job-seconds:bulk", 0, -1)) == [5, 6, 7, 8, 9]
+
+
+def test_estimate_is_read_at_most_once_per_refresh(redis, settings):
+    estimator = LoadEstimator(refresh=60)
+    assert estimator.loads()["interactive"].depth == 0
+    redis.rpush("interactive", "job")
+
+    assert estimator.loads()["interactive"].depth == 0
+    assert estimator.loads(refresh=False)["interactive"].depth == 0
+
+
+def test_no_estimate_without_redis(monkeypatch, settings):
+    monkeypatch.setattr(redis_client, "_client", None)
+    monkeypatch.setattr(Config, "REDIS_URL", None)
+    assert LoadEstimator(refresh=0).loads() == {}
+
+
+def test_admits_within_the_slo(wait):
+    wait(30)
+    before = admission.admission_stats()
+    assert admission.check("interactive", can_degrade=True) is False
+    assert counted(before) == {"admitted": 1}
+
+
+def test_degrades_past_the_slo_and_leaves_counting_to_the_caller(wait):
+    wait(45)
+    before = admission.admission_stats()
+    assert admission.check("interactive", can_degrade=True) is True
+    assert counted(before) == {}
+
+    admission.degraded()
+    assert counted(before) == {"degraded": 1}
+
+
+@pytest.mark.parametrize("mode, can_degrade, wait_seconds", [
+    ("degrade", False, 45),  # nothing cheaper to do
+    ("degrade", True, 61),  # past SLO x ADMISSION_SHED_FACTOR
+    ("reject", True, 45),
+])
+def test_sheds_past_the_slo(monkeypatch, wait, mode, can_degrade, wait_seconds):
+    monkeypatch.setattr(Config, "ADMISSION_MODE", mode)
+    wait(wait_seconds)
+    before = admission.admission_stats()
+
+    with pytest.raises(admission.Overloaded) as e:
+        admission.check("interactive", can_degrade=can_degrade)
+
+    # Answered like any QuotaExceeded: 429 with a Retry-After long enough
+    # for the queue to drain back under its SLO
+    assert isinstance(e.value, QuotaExceeded)
+    assert e.value.retry_after == wait_seconds - 30
+    assert counted(before) == {"rejected": 1}
+
+
+def test_admits_everything_when_off_or_without_an_estimate(monkeypatch, wait):
+    wait(10 ** 6)
+    assert admission.check("unknown-queue") is False  # no SLO for it
+    monkeypatch.setattr(Config, "ADMISSION_MODE", "off")
+    assert admission.check("interactive") is False
@@ -0,0 +1,74 @@
+import json
+import os
+
+import fakeredis
+
+from services.cache import ResultCache, result_key
+
+KEY_A = "aa" + "0" * 62
+KEY_B = "bb" + "0" * 62
+KEY_C = "cc" + "0" * 62
+MANIFEST = {"32x32": ["outputs/ab/abc.png"], "128x128": ["outputs/cd/cde.png"]}
+
+
+def test_result_key_covers_every_parameter():
+    base = ("digest", "8bit", "32x32", "classic", 1, "v1")
+    key = result_key(*base)
+    assert key == result_key(*base)
+    for i, changed in enumerate(("other", "16bit", "64x64", "gameboy", 2, "v2")):
+        assert result_key(*base[:i], changed, *base[i + 1:]) != key
+
+
+def test_put_then_get(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=1 << 20)
+    assert cache.get(KEY_A) is None
+    cache.put(KEY_A, MANIFEST)
+    cache.put(KEY_A, {"32x32": ["ignored"]})  # first write wins
+
+    assert cache.get(KEY_A) == MANIFEST
+    assert os.path.isfile(tmp_path / "aa" / f"{KEY_A}.json")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["puts"]) == (1, 1, 1)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    entry_size = len(json.dumps(MANIFEST).encode("utf-8"))
+    # Trimmed to 90% of the cap: room for two entries after the third arrives
+    cache = ResultCache(str(tmp_path), max_bytes=entry_size * 5 // 2)
+    cache.put(KEY_A, MANIFEST)
+    cache.put(KEY_B, MANIFEST)
+    os.utime(tmp_path / "aa" / f"{KEY_A}.json", (1000, 1000))
+    os.utime(tmp_path / "bb" / f"{KEY_B}.json", (2000, 2000))
+    assert cache.get(KEY_A) == MANIFEST  # now the most recently used
+
+    cache.put(KEY_C, MANIFEST)
+
+    assert cache.get(KEY_B) is None
+    assert cache.get(KEY_A) == MANIFEST
+    assert cache.get(KEY_C) == MANIFEST
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entry_evicted_while_reading_is_a_miss(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path), max_bytes=1 << 20)
+    # Read before the eviction, gone by the time its recency is bumped
+    monkeypatch.setattr(cache, "_local_entry", lambda key: json.dumps(MANIFEST).encode("utf-8"))
+
+    assert cache.get(KEY_A) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_redis_tier_is_shared_between_nodes(tmp_path):
+    server = fakeredis.FakeServer()
+    nodes = []
+    for name in ("one", "two"):
+        cache = ResultCache(str(tmp_path / name), max_bytes=1 << 20, redis_url="redis://fake")
+        cache._redis = fakeredis.FakeRedis(server=server)
+        nodes.append(cache)
+
+    nodes[0].put(KEY_A, MANIFEST)
+
+    assert nodes[1].get(KEY_A) == MANIFEST
+    assert nodes[1].stats()["redis_hits"] == 1
+    # Promoted to the second node's disk
+    assert os.path.isfile(tmp_path / "two" / "aa" / f"{KEY_A}.json")
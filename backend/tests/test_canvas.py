@@ -0,0 +1,99 @@
+import hashlib
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from config import Config
+from services.canvas import MappedSource, PNGStreamWriter, blend_window, render_canvas, tile_origins
+from services.palette import BUILTIN_PALETTES, CompiledPalette
+
+
+def random_image(height, width, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def decode(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+def render(source, **kwargs):
+    out = io.BytesIO()
+    height, width, _ = source.shape
+    cell_size = kwargs.get("cell_size", 1)
+    writer = PNGStreamWriter(out, width * cell_size, height * cell_size)
+    render_canvas(source, lambda tiles: tiles, writer, **kwargs)  # the model as identity
+    writer.close()
+    return decode(out.getvalue())
+
+
+def test_png_stream_round_trip():
+    image = random_image(37, 23)
+    out = io.BytesIO()
+    writer = PNGStreamWriter(out, 23, 37)
+    for top, bottom in [(0, 1), (1, 17), (17, 30), (30, 37)]:
+        writer.write_rows(image[top:bottom])
+    writer.close()
+
+    assert np.array_equal(decode(out.getvalue()), image)
+    assert writer.sha256.hexdigest() == hashlib.sha256(out.getvalue()).hexdigest()
+
+
+def test_png_stream_checks_rows():
+    writer = PNGStreamWriter(io.BytesIO(), 10, 4)
+    with pytest.raises(ValueError, match="Expected rows"):
+        writer.write_rows(np.zeros((2, 11, 3), dtype=np.uint8))
+    writer.write_rows(np.zeros((3, 10, 3), dtype=np.uint8))
+    with pytest.raises(ValueError, match="Wrote 3 of 4 rows"):
+        writer.close()
+
+
+@pytest.mark.parametrize("length, tile, overlap", [(32, 32, 8), (33, 32, 8), (100, 32, 8), (4096, 32, 16)])
+def test_tiles_cover_the_length(length, tile, overlap):
+    origins = tile_origins(length, tile, overlap)
+    assert origins[0] == 0 and origins[-1] + tile == length
+    assert all(b - a <= tile - overlap for a, b in zip(origins, origins[1:]))
+
+
+def test_blend_window_ramps_only_across_the_overlap():
+    window = blend_window(32, 8)
+    assert window.shape == (32, 32)
+    assert window[8:24, 8:24].min() == 1.0
+    assert 0 < window.min() < window[0, 8] < 1.0
+    assert np.array_equal(window, window.T) and np.array_equal(window, window[::-1, ::-1])
+
+
+@pytest.mark.parametrize("height, width", [(32, 32), (90, 70), (129, 33)])
+def test_render_reassembles_the_tiles(height, width):
+    source = random_image(height, width)
+    assert np.array_equal(render(source, batch_size=3), source)
+
+
+def test_render_scales_cells():
+    source = random_image(40, 36)
+    scaled = render(source, cell_size=3)
+    assert np.array_equal(scaled, np.repeat(np.repeat(source, 3, axis=0), 3, axis=1))
+
+
+@pytest.mark.parametrize("dither", ["ordered", "floyd-steinberg"])
+def test_render_dithers_without_band_seams(monkeypatch, dither):
+    # Error diffusion can't cross the bands, so canvases use the ordered matrix
+    monkeypatch.setattr(Config, "PALETTE_DITHER", dither)
+    palette = CompiledPalette(BUILTIN_PALETTES["classic"])
+    source = random_image(150, 64)
+
+    rendered = render(source, palette=palette)
+
+    assert np.array_equal(rendered, palette.quantize(source, "ordered"))
+
+
+def test_render_reads_a_mapped_source(tmp_path):
+    source = random_image(70, 40)
+    path = tmp_path / "source.npy"
+    np.save(path, source)
+    mapped = MappedSource(str(path))
+
+    assert mapped.shape == source.shape
+    assert np.array_equal(mapped[10:20], source[10:20])
+    assert np.array_equal(render(mapped), source)
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from services.storage import FileCache
+
+
+def writer(data):
+    return lambda out: out.write(data)
+
+
+def test_put_then_get(tmp_path):
+    cache = FileCache(str(tmp_path), max_bytes=1 << 20)
+    assert cache.get("ab/abc.png") is None
+
+    path = cache.put("ab/abc.png", writer(b"png"))
+
+    assert cache.get("ab/abc.png") == path
+    with open(path, "rb") as f:
+        assert f.read() == b"png"
+
+
+def test_failed_write_leaves_nothing_behind(tmp_path):
+    cache = FileCache(str(tmp_path), max_bytes=1 << 20)
+
+    def fail(out):
+        out.write(b"partial")
+        raise RuntimeError("encoder failed")
+
+    with pytest.raises(RuntimeError):
+        cache.put("ab/abc.png", fail)
+    assert cache.get("ab/abc.png") is None
+    assert os.listdir(tmp_path / "ab") == []
+
+
+def test_evicts_least_recently_used_but_never_the_new_file(tmp_path):
+    evictions = []
+    cache = FileCache(str(tmp_path), max_bytes=250, on_evict=lambda: evictions.append(1))
+    first = cache.put("a", writer(b"x" * 100))
+    second = cache.put("b", writer(b"x" * 100))
+    os.utime(first, (1000, 1000))
+    os.utime(second, (2000, 2000))
+    cache.get("a")  # now the most recently used
+
+    cache.put("c", writer(b"x" * 100))
+
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+    assert len(evictions) == 1
+
+    # Bigger than the whole cache: everything else goes, the new file stays
+    cache.put("d", writer(b"x" * 300))
+    assert cache.get("d") and not cache.get("a") and not cache.get("c")
+
+
+def test_size_of_existing_files_counts_toward_the_cap(tmp_path):
+    (tmp_path / "old").write_bytes(b"x" * 200)
+    os.utime(tmp_path / "old", (1000, 1000))
+    cache = FileCache(str(tmp_path), max_bytes=250)
+
+    cache.put("new", writer(b"x" * 100))
+
+    assert not (tmp_path / "old").exists()
+    assert cache.get("new")
+
+
+@pytest.mark.parametrize("name", ["../outside", "a/../../outside", "/etc/passwd"])
+def test_names_cannot_escape_the_root(tmp_path, name):
+    cache = FileCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    with pytest.raises(KeyError):
+        cache.get(name)
+    with pytest.raises(KeyError):
+        cache.put(name, writer(b"x"))
+    assert not (tmp_path / "outside").exists()
+
+
+def test_get_keeps_the_modification_time(tmp_path):
+    # Downloads are validated against the mtime (ETag, Last-Modified)
+    cache = FileCache(str(tmp_path), max_bytes=1 << 20)
+    path = cache.put("a", writer(b"x"))
+    os.utime(path, (1000, 1000))
+
+    cache.get("a")
+
+    assert os.stat(path).st_mtime == 1000
+    assert os.stat(path).st_atime > 1000
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from config import Config
+from db.database import db
+from db.models import Generation
+from services.history import _page, _page_params, _page_query, decode_cursor, encode_cursor
+
+START = datetime(2025, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    db.metadata.create_all(engine)
+    # Three rows share each timestamp, so the id has to break the ties
+    rows = [
+        {
+            "id": f"{i:08d}-0000-0000-0000-000000000000",
+            "user_id": None,
+            "status": "completed" if i % 2 else "failed",
+            "created_at": START + timedelta(seconds=i // 3),
+        }
+        for i in range(10)
+    ]
+    with Session(engine) as session:
+        session.execute(insert(Generation), rows)
+        session.commit()
+        yield session
+
+
+def pages(session, filters, limit):
+    cursor, ids = None, []
+    while True:
+        page = _page(session.execute(_page_query(filters, cursor, limit)).all(), limit)
+        assert len(page["generations"]) <= limit
+        ids.extend(item["id"] for item in page["generations"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2025, 3, 4, 5, 6, 7, 890000)
+    assert decode_cursor(encode_cursor(created_at, "some-id")) == (created_at, "some-id")
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "bm8gc2VwYXJhdG9y", encode_cursor(START, "x")[:-4]])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 10, 11])
+def test_pages_cover_every_row_once_newest_first(session, limit):
+    ids = pages(session, {}, limit)
+    expected = sorted(
+        ((START + timedelta(seconds=i // 3), f"{i:08d}-0000-0000-0000-000000000000") for i in range(10)),
+        reverse=True,
+    )
+    assert ids == [generation_id for _, generation_id in expected]
+
+
+def test_pages_apply_filters(session):
+    ids = pages(session, {"status": "failed"}, 2)
+    assert ids == [f"{i:08d}-0000-0000-0000-000000000000" for i in (8, 6, 4, 2, 0)]
+
+
+def test_page_params_limit():
+    assert _page_params(None, None, None, None, None)[0] == Config.HISTORY_PAGE_SIZE
+    assert _page_params(None, None, None, None, 10 ** 6)[0] == Config.HISTORY_MAX_PAGE_SIZE
+    for limit in (0, -1):
+        with pytest.raises(ValueError):
+            _page_params(None, None, None, None, limit)
+
+
+def test_page_params_cache_key_depends_on_the_page():
+    _, _, owner, params = _page_params(7, "completed", None, None, 20)
+    assert owner == 7
+    assert params != _page_params(7, "completed", None, encode_cursor(START, "x"), 20)[3]
+    assert _page_params(None, None, None, None, 20)[2] == "all"
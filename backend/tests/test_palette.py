@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from services.palette import BUILTIN_PALETTES, DITHER_MODES, CompiledPalette, compile_palette, rgb_to_lab
+
+
+@pytest.fixture(scope="module")
+def classic():
+    return CompiledPalette(BUILTIN_PALETTES["classic"])
+
+
+def random_images(shape, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8)
+
+
+def test_rgb_to_lab_reference_points():
+    black, white = rgb_to_lab(np.array([[0, 0, 0], [255, 255, 255]], dtype=np.uint8))
+    assert black == pytest.approx([0, 0, 0], abs=0.1)
+    assert white == pytest.approx([100, 0, 0], abs=0.1)
+
+
+def test_palette_colors_map_to_themselves(classic):
+    assert np.array_equal(classic.quantize(classic.rgb[np.newaxis, np.newaxis]), classic.rgb[np.newaxis, np.newaxis])
+
+
+def test_lookup_table_is_close_to_exact_nearest_color(classic):
+    pixels = random_images((5000, 3))
+    distances = np.sqrt(((rgb_to_lab(pixels)[:, np.newaxis] - classic.lab[np.newaxis]) ** 2).sum(axis=-1))
+    chosen = distances[np.arange(len(pixels)), classic.indices(pixels)]
+
+    # The table is built at cell centers, so it only differs on near-ties
+    assert np.mean(chosen == distances.min(axis=1)) > 0.9
+    assert (chosen - distances.min(axis=1)).max() < 8.0
+
+
+@pytest.mark.parametrize("dither", DITHER_MODES)
+def test_quantize_keeps_shape_and_uses_only_palette_colors(classic, dither):
+    images = random_images((2, 3, 8, 8, 3))
+    out = classic.quantize(images, dither)
+
+    assert out.shape == images.shape and out.dtype == np.uint8
+    palette = {tuple(c) for c in classic.rgb}
+    assert {tuple(c) for c in out.reshape(-1, 3)} <= palette
+
+
+@pytest.mark.parametrize("dither", ["ordered", "floyd-steinberg"])
+def test_dithering_mixes_neighbouring_colors(dither):
+    grayscale = CompiledPalette(BUILTIN_PALETTES["grayscale"])
+    gray = np.full((1, 32, 32, 3), 0x80, dtype=np.uint8)
+
+    assert len(np.unique(grayscale.quantize(gray))) == 1
+    dithered = grayscale.quantize(gray, dither)[..., 0]
+    assert set(np.unique(dithered)) == {0x55, 0xAA}
+    assert dithered.mean() == pytest.approx(0x80, abs=2)
+
+
+def test_compiled_palette_is_reused_until_its_version_changes():
+    colors = BUILTIN_PALETTES["gameboy"]
+    first = compile_palette("test:gameboy", colors, version=1)
+
+    assert compile_palette("test:gameboy", colors, version=1) is first
+    assert compile_palette("test:gameboy", colors, version=2) is not first
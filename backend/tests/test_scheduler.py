@@ -0,0 +1,107 @@
+import pytest
+
+from config import Config
+from services import redis_client, scheduler
+
+
+@pytest.fixture
+def bucket(monkeypatch, redis):
+    # 10 images at once, refilled at one per second, on a clock the test moves
+    monkeypatch.setattr(Config, "USER_BURST", 10)
+    monkeypatch.setattr(Config, "USER_RATE_PER_MINUTE", 60.0)
+    clock = [1000.0]
+    monkeypatch.setattr(scheduler.time, "time", lambda: clock[0])
+    return clock
+
+
+def test_admits_up_to_the_burst(bucket):
+    scheduler.admit(1, 6)
+    scheduler.admit(1, 4)
+    with pytest.raises(scheduler.QuotaExceeded) as e:
+        scheduler.admit(1, 3)
+    assert e.value.retry_after == 3
+
+
+def test_bucket_refills_over_time(bucket):
+    scheduler.admit(1, 10)
+    bucket[0] += 2.5
+    scheduler.admit(1, 2)
+    with pytest.raises(scheduler.QuotaExceeded) as e:
+        scheduler.admit(1, 1)
+    assert e.value.retry_after == 1  # 0.5 tokens left, rounded up
+
+    bucket[0] += 3600
+    scheduler.admit(1, 10)  # never refills past the burst
+    with pytest.raises(scheduler.QuotaExceeded):
+        scheduler.admit(1, 1)
+
+
+def test_subjects_have_their_own_buckets(bucket):
+    scheduler.admit(1, 10)
+    scheduler.admit(2, 10)
+    scheduler.admit("ip:10.0.0.1", 10)
+    with pytest.raises(scheduler.QuotaExceeded):
+        scheduler.admit(1, 1)
+
+
+def test_rejected_request_takes_no_tokens(bucket):
+    scheduler.admit(1, 8)
+    with pytest.raises(scheduler.QuotaExceeded):
+        scheduler.admit(1, 5)
+    scheduler.admit(1, 2)
+
+
+def test_request_larger_than_the_burst_is_never_admitted(bucket, redis):
+    with pytest.raises(scheduler.RequestTooLarge):
+        scheduler.admit(1, 11)
+    assert redis.keys("pixelart:bucket:*") == []
+    assert issubclass(scheduler.RequestTooLarge, ValueError)
+
+
+def test_admits_everything_without_redis(monkeypatch):
+    monkeypatch.setattr(redis_client, "_client", None)
+    monkeypatch.setattr(Config, "REDIS_URL", None)
+    for _ in range(100):
+        scheduler.admit(1, Config.USER_BURST)
+
+
+@pytest.mark.parametrize("resolution, batch_count, bulk, queue", [
+    ("32x32", 1, False, "interactive"),
+    ("64x64", 4, False, "interactive"),
+    ("64x64", 5, False, "bulk"),
+    ("128x128", 1, False, "bulk"),
+    ("16x16", 1, True, "bulk"),
+])
+def test_place_queue(monkeypatch, resolution, batch_count, bulk, queue):
+    monkeypatch.setattr(Config, "INTERACTIVE_MAX_BATCH", 4)
+    monkeypatch.setattr(Config, "INTERACTIVE_MAX_PIXELS", 64 * 64)
+    assert scheduler.place(None, resolution, batch_count, bulk=bulk).queue == queue
+
+
+def test_place_demotes_heavy_users(monkeypatch):
+    monkeypatch.setattr(Config, "FAIR_SHARE_STEP", 100)
+    monkeypatch.setattr(Config, "FAIR_SHARE_MAX_DEMOTION", 3)
+    usage = {1: 0, 2: 250, 3: 10 ** 6}
+    monkeypatch.setattr(scheduler, "recent_usage", lambda user_id: usage[user_id])
+
+    assert scheduler.place(1, "32x32", 1).priority == scheduler.PRIORITIES["normal"]
+    assert scheduler.place(2, "32x32", 1).priority == scheduler.PRIORITIES["normal"] + 2
+    assert scheduler.place(3, "32x32", 1, "low").priority == scheduler.MAX_PRIORITY
+    assert scheduler.place(3, "32x32", 1, "high").priority == scheduler.PRIORITIES["high"] + 3
+
+
+def test_place_rejects_unknown_priority():
+    with pytest.raises(ValueError, match="Unknown priority"):
+        scheduler.place(None, "32x32", 1, "urgent")
+
+
+def test_nothing_queued_takes_no_tokens(bucket, redis):
+    scheduler.admit(1, 0)
+    assert redis.keys("pixelart:bucket:*") == []
+
+
+def test_check_cost(monkeypatch):
+    monkeypatch.setattr(Config, "USER_BURST", 10)
+    scheduler.check_cost(10)
+    with pytest.raises(scheduler.RequestTooLarge):
+        scheduler.check_cost(11)
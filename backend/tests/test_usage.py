@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from sqlalchemy import select
+
+from config import Config
+from db.database import db
+from db.models import ApiUsage, User
+from services import usage
+
+PROCESSING = f"{Config.USAGE_REDIS_KEY}:processing"
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'usage.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def event(user_id=None, endpoint="/generate/text"):
+    return {
+        "user_id": user_id, "endpoint": endpoint, "method": "POST",
+        "ip_address": "10.0.0.1", "user_agent": "pytest", "timestamp": datetime(2025, 1, 1),
+    }
+
+
+def logged():
+    return db.session.execute(select(ApiUsage.user_id, ApiUsage.endpoint).order_by(ApiUsage.id)).all()
+
+
+def test_consume_inserts_pushed_events(app, redis):
+    db.session.add(User(id=1, username="a", email="a@example.com", hashed_password="x"))
+    db.session.commit()
+    usage._push([event(1, "/a"), event(None, "/b"), event(99, "/c")])
+
+    assert usage.consume(batch_size=10, block_seconds=1) == 3
+
+    # The unknown user is logged without a user_id instead of failing the batch
+    assert logged() == [(1, "/a"), (None, "/b"), (None, "/c")]
+    assert redis.llen(Config.USAGE_REDIS_KEY) == 0 and redis.llen(PROCESSING) == 0
+
+
+def test_consume_takes_at_most_a_batch(app, redis):
+    usage._push([event(endpoint=f"/{i}") for i in range(5)])
+
+    assert usage.consume(batch_size=2, block_seconds=1) == 2
+    assert usage.consume(batch_size=2, block_seconds=1) == 2
+    assert usage.consume(batch_size=2, block_seconds=1) == 1
+    assert [endpoint for _, endpoint in logged()] == [f"/{i}" for i in range(5)]
+
+
+def test_failed_batch_is_retried_before_new_events(app, redis, monkeypatch):
+    usage._push([event(endpoint="/first"), event(endpoint="/second")])
+    write_events = usage.write_events
+
+    def fail(events):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(usage, "write_events", fail)
+    with pytest.raises(RuntimeError):
+        usage.consume(batch_size=1, block_seconds=1)
+    assert redis.llen(PROCESSING) == 1 and redis.llen(Config.USAGE_REDIS_KEY) == 1
+
+    monkeypatch.setattr(usage, "write_events", write_events)
+    assert usage.consume(batch_size=10, block_seconds=1) == 1
+    assert [endpoint for _, endpoint in logged()] == ["/first"]
+    assert usage.consume(batch_size=10, block_seconds=1) == 1
+    assert [endpoint for _, endpoint in logged()] == ["/first", "/second"]
+
+
+def test_malformed_events_are_dropped(app, redis):
+    redis.rpush(Config.USAGE_REDIS_KEY, "not json")
+    usage._push([event(endpoint="/ok")])
+
+    assert usage.consume(batch_size=10, block_seconds=1) == 1
+    assert logged() == [(None, "/ok")]
+    assert redis.llen(PROCESSING) == 0
@@ -0,0 +1,55 @@
+"""
+Insert API usage events queued in Redis into api_usage.
+
+With USAGE_SINK=redis the web processes push their buffered usage events
+to a Redis list instead of writing to MySQL themselves; run one of these
+next to them to drain it in bulk.
+
+    python usage_consumer.py
+    python usage_consumer.py --batch-size 2000
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BASE_DIR, "app")
+sys.path.insert(0, APP_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--block-seconds", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ["USAGE_LOG_ENABLED"] = "false"  # this process serves no requests
+    from main import create_app
+    from services.redis_client import get_redis
+    from services.usage import consume
+
+    if get_redis() is None:
+        sys.exit("[❌] REDIS_URL is not set")
+
+    app = create_app(process_type="worker")
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+
+    print(f"[✅] Consuming usage events in batches of {args.batch_size}")
+    written = 0
+    with app.app_context():
+        while not stopping:
+            try:
+                written += consume(args.batch_size, args.block_seconds)
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                print("[❌] Usage consume failed:", e)
+                time.sleep(1)
+    print(f"[✅] Wrote {written} usage events")
+
+
+if __name__ == "__main__":
+    main()